@@ -0,0 +1,37 @@
+"""Embed every note whose embedding is missing or stale (content or embedder changed).
+
+Usage: python scripts/backfill_embeddings.py
+Run it after enabling semantic search or switching EMBEDDINGS_PROVIDER (imported notes are
+embedded like saved ones).
+"""
+import os
+import sys
+import time
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.main import app
+from src.models.note import Note
+from src.models.user import db
+from src import embeddings
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        note_ids = [note_id for (note_id,) in db.session.query(Note.id).order_by(Note.id)]
+        started = time.perf_counter()
+        counts = {}
+        for note_id in note_ids:
+            outcome = embeddings.embed_note(note_id)
+            counts[outcome] = counts.get(outcome, 0) + 1
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{n} {outcome}' for outcome, n in sorted(counts.items())) or 'no notes'
+        print(f'{embeddings.get_embedder().name}: {summary} in {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
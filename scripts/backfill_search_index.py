@@ -0,0 +1,31 @@
+"""Create the full-text search index if needed and backfill it from existing notes.
+
+Usage: python scripts/backfill_search_index.py
+"""
+import os
+import sys
+import time
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.main import app
+from src.models.user import db
+from src.search import rebuild_search_index
+
+
+def main():
+    with app.app_context():
+        started = time.perf_counter()
+        kind = rebuild_search_index(db.engine)
+        elapsed = time.perf_counter() - started
+        if kind is None:
+            print(f'{db.engine.dialect.name} has no native full-text index; search uses LIKE.')
+            sys.exit(1)
+        print(f'Rebuilt {kind} search index in {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Database size and latency of note content storage modes (CONTENT_COMPRESSION).
+
+Seeds one new SQLite database per mode with the benchmark corpus plus --documents large
+"pasted document" notes (10-40 generated notes joined together, 10-60k characters), then
+measures through the test client:
+  write   POST of a new large note
+  read    GET of a large note (full content, decompressed)
+  list    GET /api/notes?limit=50 (previews only)
+  search  GET /api/notes/search
+Modes are off, zlib and, when the zstandard package is installed, zstd; each runs in a
+child process since the mode is read at import time. Sizes are the database file after a
+WAL checkpoint (mostly the full-text index, which stays the same) and the stored content.
+
+Exits 1 when a compressed database is not smaller than the uncompressed one or listing
+got slower than --list-tolerance times the uncompressed run (previews come from the
+plain prefix column and must not pay for decompression).
+
+Usage:
+    python scripts/bench_content_storage.py [--notes 5k] [--documents 300] [--requests 200]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from benchmark import generate_note, parse_count, percentile, search_terms, seed_corpus  # noqa: E402
+
+
+def _document(rng):
+    parts = []
+    while sum(map(len, parts)) < rng.randint(10000, 60000):
+        parts.append(generate_note(rng)['content'])
+    return {'title': f'Pasted document {rng.randrange(10 ** 6)}', 'content': '\n\n'.join(parts)}
+
+
+def _timed(samples, call):
+    t0 = time.perf_counter()
+    response = call()
+    samples.append(time.perf_counter() - t0)
+    if response.status_code not in (200, 201):
+        raise SystemExit(f'request failed with {response.status_code}')
+    return response
+
+
+def measure(args):
+    """Child process: seed, time the requests, print one JSON line."""
+    from sqlalchemy import insert
+    from src.accounts import default_user_id
+    from src.main import app
+    from src.models.note import Note
+    from src.models.user import db
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(args.seed)
+    seed_corpus(app, args.notes, args.seed, 0)
+    with app.app_context(), db.engine.begin() as conn:
+        owner = default_user_id(db.engine)
+        ids = list(conn.execute(insert(Note.__table__).returning(Note.__table__.c.id), [
+            dict(_document(rng), version=1, user_id=owner) for _ in range(args.documents)
+        ]).scalars())
+
+    client, timings = app.test_client(), {name: [] for name in ('write', 'read', 'list', 'search')}
+    terms = search_terms(random.Random(args.seed), 200)
+    for _ in range(args.requests):
+        _timed(timings['write'], lambda: client.post('/api/notes', json=_document(rng)))
+        _timed(timings['read'], lambda: client.get(f'/api/notes/{rng.choice(ids)}'))
+        _timed(timings['list'], lambda: client.get('/api/notes?limit=50'))
+        _timed(timings['search'], lambda: client.get(f'/api/notes/search?q={rng.choice(terms)}&limit=20'))
+
+    with app.app_context(), db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        stored = conn.exec_driver_sql('SELECT sum(length(CAST(content AS BLOB))) FROM note').scalar()
+    result = {'bytes': os.path.getsize(args.database), 'content_bytes': stored}
+    for name, samples in timings.items():
+        samples.sort()
+        result[name] = {'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                        'p95_ms': round(percentile(samples, 95) * 1000, 2)}
+    print(json.dumps(result), flush=True)
+
+
+def run_mode(args, mode, tmp):
+    database = Path(tmp) / f'{mode}.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', AUTO_CREATE_TABLES='1',
+               CONTENT_COMPRESSION=mode, EMBEDDINGS_PROVIDER='hashing', LLM_CACHE_ENABLED='0')
+    cmd = [sys.executable, __file__, '--measure', '--database', str(database), '--notes', str(args.notes),
+           '--documents', str(args.documents), '--requests', str(args.requests), '--seed', str(args.seed)]
+    done = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    if done.returncode:
+        raise SystemExit(f'{mode} run failed')
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=parse_count, default='5k', help='regular notes seeded (default 5k)')
+    parser.add_argument('--documents', type=parse_count, default='300', help='large pasted documents seeded')
+    parser.add_argument('--requests', type=int, default=200, help='requests per operation')
+    parser.add_argument('--list-tolerance', type=float, default=1.5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        return measure(args)
+
+    modes = ['off', 'zlib']
+    try:
+        import zstandard  # noqa: F401
+        modes.append('zstd')
+    except ImportError:
+        print('zstandard is not installed; skipping zstd')
+    with tempfile.TemporaryDirectory(prefix='content-bench-') as tmp:
+        results = {mode: run_mode(args, mode, tmp) for mode in modes}
+
+    print(f'{args.notes} notes + {args.documents} documents, {args.requests} requests per operation')
+    print(f'{"":<6}{"file MB":>9}{"content MB":>12}' + ''.join(f'{name + " p50/p95 ms":>24}' for name in ('write', 'read', 'list', 'search')))
+    for mode, r in results.items():
+        print(f'{mode:<6}{r["bytes"] / 1e6:>9.2f}{r["content_bytes"] / 1e6:>12.2f}' + ''.join(
+            f'{r[name]["p50_ms"]:>15}/{r[name]["p95_ms"]:<8}' for name in ('write', 'read', 'list', 'search')))
+
+    failures = []
+    plain = results['off']
+    for mode in modes[1:]:
+        if results[mode]['bytes'] >= plain['bytes']:
+            failures.append(f'{mode} database is not smaller than the uncompressed one')
+        if results[mode]['list']['p50_ms'] > plain['list']['p50_ms'] * args.list_tolerance:
+            failures.append(f'{mode} listing is slower than uncompressed')
+    for failure in failures:
+        print(f'\nFAIL: {failure}')
+    if not failures:
+        print('\nContent storage check PASSED')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
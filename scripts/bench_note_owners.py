@@ -0,0 +1,173 @@
+"""Per-user note list latency as the total number of notes grows (note ownership).
+
+Seeds one new SQLite database per size with --user-notes notes for the measured user,
+spread evenly among short notes of --users other users up to the total size, then
+measures for that user through the test client (X-User-Id header):
+  list     GET /api/notes?limit=50
+  next     the second page, through the cursor of the first
+  title    GET /api/notes?limit=50&sort=title_asc
+  changes  GET /api/notes/changes since a day ago (about 1/30 of the user's notes)
+  search   GET /api/notes/search (reported only: the full-text match runs over every
+           user's notes before the owner filter)
+Each size runs in a child process so every run starts from a cold, separate database.
+
+Exits 1 when the p50 of list, next, title or changes at the largest size is more than
+--tolerance times the smallest size's plus 1 ms: the owner-scoped indexes should make
+those cost the same however many notes other users have.
+
+Usage:
+    python scripts/bench_note_owners.py [--sizes 10k,100k] [--user-notes 1000] [--requests 200]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from benchmark import generate_note, parse_count, percentile, search_terms  # noqa: E402
+
+GATED = ('list', 'next', 'title', 'changes')
+OPERATIONS = GATED + ('search',)
+SEED_CHUNK = 1000
+
+
+def seed(app, total, user_notes, users, rng):
+    """Insert the users and `total` notes; returns the measured user's id."""
+    from sqlalchemy import insert
+    from src.models.note import Note
+    from src.models.user import User, db
+
+    with app.app_context(), db.engine.begin() as conn:
+        ids = list(conn.execute(insert(User.__table__).returning(User.__table__.c.id), [
+            {'username': f'bench{i}', 'email': f'bench{i}@localhost'} for i in range(users + 1)
+        ]).scalars())
+    measured, others = ids[0], ids[1:]
+    every = max(1, total // user_notes)
+    base = datetime.utcnow() - timedelta(days=30)
+    step = timedelta(days=30) / max(total, 1)
+    with app.app_context():
+        for offset in range(0, total, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(total, offset + SEED_CHUNK)):
+                stamp = base + step * i
+                note = generate_note(rng)
+                if i % every == 0 and i // every < user_notes:
+                    owner = measured
+                else:
+                    owner = rng.choice(others)
+                    note['content'] = note['content'][:200]  # the others only need to exist
+                rows.append(dict(note, created_at=stamp, updated_at=stamp, version=1, user_id=owner))
+            with db.engine.begin() as conn:
+                conn.execute(insert(Note.__table__), rows)
+    return measured
+
+
+def _timed(samples, call):
+    t0 = time.perf_counter()
+    response = call()
+    samples.append(time.perf_counter() - t0)
+    if response.status_code != 200:
+        raise SystemExit(f'request failed with {response.status_code}')
+    return response.get_json()
+
+
+def measure(args):
+    """Child process: seed, time the requests, print one JSON line."""
+    from src.main import app
+    from src.routes.note import _encode_cursor
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    user = seed(app, args.total, args.user_notes, args.users, rng)
+    seeded = time.perf_counter() - started
+
+    client, headers = app.test_client(), {'X-User-Id': str(user)}
+    since = _encode_cursor([(datetime.utcnow() - timedelta(days=1)).isoformat()])
+    terms = search_terms(random.Random(args.seed), 200)
+    timings = {name: [] for name in OPERATIONS}
+    get = lambda url: client.get(url, headers=headers)  # noqa: E731
+    for _ in range(args.requests):
+        page = _timed(timings['list'], lambda: get('/api/notes?limit=50'))
+        _timed(timings['next'], lambda: get(f'/api/notes?limit=50&cursor={page["next_cursor"]}'))
+        _timed(timings['title'], lambda: get('/api/notes?limit=50&sort=title_asc'))
+        changes = _timed(timings['changes'], lambda: get(f'/api/notes/changes?since={since}'))
+        _timed(timings['search'], lambda: get(f'/api/notes/search?q={rng.choice(terms)}&limit=20'))
+    if changes['reset'] or not changes['changed']:
+        raise SystemExit('changes returned no notes of the user')
+
+    result = {'seed_s': round(seeded, 1), 'changed': len(changes['changed'])}
+    for name, samples in timings.items():
+        samples.sort()
+        result[name] = {'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                        'p95_ms': round(percentile(samples, 95) * 1000, 2)}
+    print(json.dumps(result), flush=True)
+
+
+def run_size(args, total, tmp):
+    database = Path(tmp) / f'{total}.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', AUTO_CREATE_TABLES='1',
+               EMBEDDINGS_PROVIDER='hashing', LLM_CACHE_ENABLED='0')
+    cmd = [sys.executable, __file__, '--measure', '--total', str(total), '--user-notes', str(args.user_notes),
+           '--users', str(args.users), '--requests', str(args.requests), '--seed', str(args.seed)]
+    done = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    if done.returncode:
+        raise SystemExit(f'run with {total} notes failed')
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10k,100k', help='total notes per run, comma-separated')
+    parser.add_argument('--user-notes', type=parse_count, default='1000', help="the measured user's notes")
+    parser.add_argument('--users', type=int, default=200, help='other users owning the rest')
+    parser.add_argument('--requests', type=int, default=200, help='requests per operation')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--total', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        return measure(args)
+
+    sizes = sorted(parse_count(s) for s in args.sizes.split(','))
+    if sizes[0] < args.user_notes:
+        parser.error('every size must be at least --user-notes')
+    with tempfile.TemporaryDirectory(prefix='owners-bench-') as tmp:
+        results = {}
+        for total in sizes:
+            print(f'seeding and measuring {total} notes...', flush=True)
+            results[total] = run_size(args, total, tmp)
+
+    print(f'\n{args.user_notes} notes of the measured user, {args.users} other users, '
+          f'{args.requests} requests per operation')
+    print(f'{"notes":>9}{"seed s":>8}' + ''.join(f'{name + " p50/p95 ms":>22}' for name in OPERATIONS))
+    for total, r in results.items():
+        print(f'{total:>9}{r["seed_s"]:>8}' + ''.join(
+            f'{r[name]["p50_ms"]:>13}/{r[name]["p95_ms"]:<8}' for name in OPERATIONS))
+
+    smallest, largest = results[sizes[0]], results[sizes[-1]]
+    failures = [
+        f'{name} p50 grew from {smallest[name]["p50_ms"]} ms to {largest[name]["p50_ms"]} ms'
+        for name in GATED
+        if largest[name]['p50_ms'] > smallest[name]['p50_ms'] * args.tolerance + 1
+    ]
+    for failure in failures:
+        print(f'\nFAIL: {failure}')
+    if not failures:
+        print('\nPer-user list latency check PASSED')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
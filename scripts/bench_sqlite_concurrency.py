@@ -0,0 +1,201 @@
+"""Reader latency under concurrent writes, plain SQLite versus the tuned setup.
+
+Runs the app in each mode as --processes server processes sharing one new SQLite file
+(like gunicorn workers):
+  plain  SQLITE_TUNED=0: rollback journal, one pool for reads and writes
+  tuned  SQLITE_TUNED=1: WAL, pragmas, BEGIN IMMEDIATE writer, read-only reader pool
+(see src/db_engine.py). --writers client threads keep creating, replacing and
+batch-updating notes over HTTP while --readers threads page through the list and
+search; reader latency and failed requests (e.g. "database is locked") are compared.
+
+Exits 1 when the tuned run had failed requests, a worse reader p99 (readers stuck behind
+a writer's lock show up in the tail) or fewer writes per second than plain. Medians are
+not compared: on few cores the many more writes the tuned run completes compete with
+the readers for CPU.
+
+Usage:
+    python scripts/bench_sqlite_concurrency.py [--notes 2k] [--seconds 10] [--readers 8] [--writers 4] [--processes 2]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from benchmark import generate_note, parse_count, percentile, search_terms, seed_corpus  # noqa: E402
+
+MODES = {'plain': '0', 'tuned': '1'}
+
+
+class Client:
+    """One keep-alive connection; request() returns (status, seconds)."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json'} if data else {}
+        t0 = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+            self.conn.request(method, path, body=data, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close:
+                self.conn.close()
+                self.conn = None
+        except (http.client.HTTPException, ConnectionError):
+            if self.conn is not None:
+                self.conn.close()
+            self.conn, status = None, None
+        return status, time.perf_counter() - t0
+
+
+def _writer(port, notes, seed, stop, out):
+    rng, client = random.Random(seed), Client(port)
+    while not stop.is_set():
+        roll = rng.random()
+        if roll < 0.4:
+            status, secs = client.request('POST', '/api/notes', generate_note(rng))
+            ok = status == 201
+        elif roll < 0.8:
+            status, secs = client.request('PUT', f'/api/notes/{rng.randint(1, notes)}', generate_note(rng))
+            ok = status in (200, 409)  # 409: another writer got there first
+        else:
+            ops = [{'op': 'update', 'id': rng.randint(1, notes), 'title': f'w{rng.random():.6f}'} for _ in range(20)]
+            status, secs = client.request('POST', '/api/notes/batch', {'mode': 'best_effort', 'ops': ops})
+            ok = status == 200
+        out.append((secs, ok))
+
+
+def _reader(port, terms, seed, stop, out):
+    rng, client = random.Random(seed), Client(port)
+    while not stop.is_set():
+        if rng.random() < 0.5:
+            status, secs = client.request('GET', '/api/notes?limit=50')
+        else:
+            status, secs = client.request('GET', f'/api/notes/search?q={rng.choice(terms)}&limit=20')
+        out.append((secs, status == 200))
+
+
+def _stats(samples, seconds):
+    latencies = sorted(s for s, _ in samples)
+    ms = lambda v: None if v is None else round(v * 1000, 2)  # noqa: E731
+    return {'requests': len(samples), 'failed': sum(1 for _, ok in samples if not ok),
+            'rps': round(len(samples) / seconds, 1), 'p50_ms': ms(percentile(latencies, 50)),
+            'p95_ms': ms(percentile(latencies, 95)),
+            'p99_ms': ms(percentile(latencies, 99)), 'max_ms': ms(latencies[-1] if latencies else None)}
+
+
+def serve(args):
+    """Child process: seed when asked, then serve the app and print the port."""
+    from werkzeug.serving import make_server
+    from src.main import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    if args.seed_notes:
+        seed_corpus(app, args.seed_notes, args.seed, 0)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def _start_server(env, seed_notes, seed):
+    cmd = [sys.executable, __file__, '--serve', '--seed-notes', str(seed_notes), '--seed', str(seed)]
+    process = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = process.stdout.readline()
+    if not line.strip():
+        process.kill()
+        raise SystemExit('server process failed to start')
+    return process, int(line)
+
+
+def run_mode(args, mode, tmp):
+    """--processes app servers on one new database file (as gunicorn workers would share
+    it), loaded from this process; clients are spread over the servers."""
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{Path(tmp) / (mode + ".db")}', AUTO_CREATE_TABLES='1',
+               SQLITE_TUNED=MODES[mode], EMBEDDINGS_PROVIDER='hashing', LLM_CACHE_ENABLED='0')
+    env.pop('GITHUB_TOKEN', None)
+    env.pop('OPENAI_API_KEY', None)
+    processes = [_start_server(env, args.notes, args.seed)]
+    processes += [_start_server(env, 0, args.seed) for _ in range(args.processes - 1)]
+    ports = [port for _, port in processes]
+    terms = [t for t in search_terms(random.Random(args.seed), 200) if t.isascii()]
+    try:
+        stop, reads, writes, threads = threading.Event(), [], [], []
+        for i in range(args.writers):
+            threads.append(threading.Thread(target=_writer, args=(ports[i % len(ports)], args.notes, i, stop, writes)))
+        for i in range(args.readers):
+            port = ports[(i + 1) % len(ports)]
+            threads.append(threading.Thread(target=_reader, args=(port, terms, 1000 + i, stop, reads)))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        for process, _ in processes:
+            process.kill()
+            process.wait()
+    return {'reads': _stats(reads, args.seconds), 'writes': _stats(writes, args.seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=parse_count, default='2k', help='seeded corpus size (default 2k)')
+    parser.add_argument('--seconds', type=float, default=10.0, help='load duration per mode')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=2, help='app server processes sharing the database')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--seed-notes', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args)
+
+    with tempfile.TemporaryDirectory(prefix='sqlite-bench-') as tmp:
+        results = {mode: run_mode(args, mode, tmp) for mode in MODES}
+
+    print(f'{args.notes} notes, {args.processes} processes, {args.readers} readers, {args.writers} writers, '
+          f'{args.seconds:g}s per mode')
+    print(f'{"":<8}{"":<7}{"requests":>9}{"failed":>8}{"rps":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+    for mode, result in results.items():
+        for kind in ('reads', 'writes'):
+            r = result[kind]
+            print(f'{mode:<8}{kind:<7}{r["requests"]:>9}{r["failed"]:>8}{r["rps"]:>9}'
+                  f'{r["p50_ms"]:>9}{r["p95_ms"]:>9}{r["p99_ms"]:>9}{r["max_ms"]:>9}')
+
+    plain, tuned = results['plain'], results['tuned']
+    failures = []
+    if tuned['reads']['failed'] or tuned['writes']['failed']:
+        failures.append('tuned mode had failed requests')
+    if tuned['reads']['p99_ms'] > plain['reads']['p99_ms']:
+        failures.append('tuned reader p99 is worse than plain')
+    if tuned['writes']['rps'] < plain['writes']['rps']:
+        failures.append('tuned mode completed fewer writes per second than plain')
+    for failure in failures:
+        print(f'\nFAIL: {failure}')
+    if not failures:
+        print('\nSQLite concurrency check PASSED')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,622 @@
+"""Reproducible load and latency benchmark for the notes and AI APIs.
+
+Seeds a throwaway SQLite database with a deterministic corpus (Latin, CJK and mixed
+notes of realistic sizes), points every AI call at scripts/fake_llm_server.py, then
+drives each scenario in two ways:
+  testclient  one thread through Flask's test client: handler + database cost only
+  http        a threaded werkzeug server hit by --concurrency keep-alive connections:
+              adds sockets, thread scheduling and lock/pool contention
+and reports p50/p95/p99 latency and throughput per scenario. Results are written as
+JSON; --baseline compares a run with an earlier one and exits 1 when a scenario's p95
+got more than --tolerance slower.
+
+Usage:
+    python scripts/benchmark.py --notes 10k --out bench.json
+    python scripts/benchmark.py --notes 10k --baseline bench.json
+    python scripts/benchmark.py --notes 100k --mode http --concurrency 16 --scenarios search,semantic
+"""
+import argparse
+import gzip
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import fake_llm_server  # noqa: E402
+
+# --- corpus -------------------------------------------------------------------------
+
+LATIN_WORDS = (
+    'meeting project budget review draft schedule client design release server database '
+    'deploy invoice travel recipe garden weekend research paper summary idea todo reading '
+    'lecture exam grocery workout doctor flight hotel museum concert birthday quarterly '
+    'roadmap feedback interview onboarding migration latency cache index backup retro '
+    'the a of and to in for on with from about before after next last this that we should '
+    'need check update call email share plan fix write read list notes week month year'
+).split()
+CJK_TEXT = (
+    '我们今天讨论了项目进度会议安排预算审核设计发布服务器数据库部署发票旅行食谱花园周末研究论文'
+    '总结想法待办阅读讲座考试购物锻炼医生航班酒店博物馆音乐会生日季度路线图反馈面试入职迁移延迟缓存索引备份'
+    '下周需要检查更新电话邮件分享计划修复写作列表笔记月年的是在和有不这个了一人上中大为'
+)
+# share of notes per script: Latin only, CJK only, both
+SCRIPT_MIX = (('latin', 0.6), ('cjk', 0.3), ('mixed', 0.1))
+SEED_CHUNK = 1000
+
+
+def parse_count(value):
+    """'10k' -> 10000, '1m' -> 1000000, '250' -> 250."""
+    value = value.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value[:-1] if scale > 1 else value) * scale)
+
+
+def _latin(rng, chars):
+    words, size = [], 0
+    while size < chars:
+        word = rng.choice(LATIN_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def _cjk(rng, chars):
+    out, size = [], 0
+    while size < chars:
+        start = rng.randrange(len(CJK_TEXT) - 8)
+        piece = CJK_TEXT[start:start + rng.randint(2, 8)]
+        if rng.random() < 0.15:
+            piece += '，' if rng.random() < 0.7 else '。'
+        out.append(piece)
+        size += len(piece)
+    return ''.join(out)[:chars]
+
+
+def _text(rng, script, chars):
+    if script == 'latin':
+        return _latin(rng, chars)
+    if script == 'cjk':
+        return _cjk(rng, chars)
+    half = chars // 2
+    return f'{_latin(rng, half)} {_cjk(rng, chars - half)}'
+
+
+def _script(rng):
+    r, total = rng.random(), 0.0
+    for script, share in SCRIPT_MIX:
+        total += share
+        if r < total:
+            return script
+    return SCRIPT_MIX[-1][0]
+
+
+def content_size(rng):
+    """Log-normal note sizes: median ~600 characters, a long tail up to 20k."""
+    return max(20, min(20000, int(rng.lognormvariate(math.log(600), 1.0))))
+
+
+def generate_note(rng):
+    script = _script(rng)
+    title = _text(rng, script, rng.randint(8, 30)).strip()[:30]
+    return {'title': title or 'untitled', 'content': _text(rng, script, content_size(rng))}
+
+
+def search_terms(rng, count):
+    """Queries that hit the corpus: Latin words and 2-4 character CJK fragments."""
+    terms = []
+    for _ in range(count):
+        if rng.random() < 0.6:
+            terms.append(rng.choice(LATIN_WORDS[:60]))
+        else:
+            start = rng.randrange(len(CJK_TEXT) - 4)
+            terms.append(CJK_TEXT[start:start + rng.randint(2, 4)])
+    return terms
+
+
+def seed_corpus(app, count, seed, embed_limit):
+    """Insert `count` generated notes, then embeddings for the first `embed_limit`.
+    Returns the seconds spent."""
+    from sqlalchemy import insert, select
+    from src import embeddings
+    from src.accounts import default_user_id
+    from src.models.embedding import NoteEmbedding
+    from src.models.note import Note
+    from src.models.user import db
+
+    rng = random.Random(seed)
+    note = Note.__table__
+    started = time.perf_counter()
+    base = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / max(count, 1)
+    with app.app_context():
+        engine = db.engine
+        owner = default_user_id(engine)  # requests without X-User-Id act for this user
+        for offset in range(0, count, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(count, offset + SEED_CHUNK)):
+                stamp = base + step * i
+                rows.append(dict(generate_note(rng), created_at=stamp, updated_at=stamp, version=1, user_id=owner))
+            with engine.begin() as conn:
+                conn.execute(insert(note), rows)
+            _progress('notes', offset + len(rows), count)
+
+        embedder = embeddings.get_embedder()
+        limit = min(count, embed_limit)
+        done, last_id = 0, 0
+        while done < limit:
+            # keyset chunks, fully read before writing: SQLite cannot commit under an open cursor
+            with engine.connect() as conn:
+                part = conn.execute(
+                    select(note.c.id, note.c.title, note.c.content).where(note.c.id > last_id)
+                    .order_by(note.c.id).limit(min(SEED_CHUNK, limit - done))
+                ).all()
+            if not part:
+                break
+            texts = [embeddings.note_text(r.title, r.content) for r in part]
+            vectors = embedder.embed(texts)
+            now = datetime.utcnow()
+            with engine.begin() as conn:
+                conn.execute(insert(NoteEmbedding.__table__), [
+                    {'note_id': r.id, 'model': embedder.name, 'dim': int(v.shape[0]),
+                     'content_hash': embeddings.content_hash(t), 'vector': v.tobytes(), 'updated_at': now}
+                    for r, t, v in zip(part, texts, vectors)
+                ])
+            done, last_id = done + len(part), part[-1].id
+            _progress('embeddings', done, limit)
+    return time.perf_counter() - started
+
+
+def _progress(what, done, total):
+    end = '\n' if done >= total else ''
+    print(f'\rseeded {done}/{total} {what}', end=end, file=sys.stderr, flush=True)
+
+
+# --- scenarios ----------------------------------------------------------------------
+#
+# A scenario builds one request: make(rng, ctx, send) -> (method, path, body, headers).
+# `send` performs untimed setup requests (e.g. fetching a version to PATCH against) on
+# the same connection. `ok` lists the statuses that count as success; `weight` scales
+# --requests for scenarios that are much heavier than a point read.
+
+class Scenario:
+    def __init__(self, name, make, ok=(200,), weight=1.0, ai=False):
+        self.name, self.make, self.ok, self.weight, self.ai = name, make, ok, weight, ai
+
+    def count(self, requests):
+        return max(3, int(requests * self.weight))
+
+
+def _random_id(rng, ctx):
+    return rng.randint(1, ctx['notes'])
+
+
+def _note_body(rng):
+    return generate_note(rng)
+
+
+def _get_version(send, note_id):
+    status, body = send('GET', f'/api/notes/{note_id}', None, {})
+    return json.loads(body)['version'] if status == 200 else 1
+
+
+def _patch(rng, ctx, send):
+    note_id = _random_id(rng, ctx)
+    version = _get_version(send, note_id)
+    return 'PATCH', f'/api/notes/{note_id}', {'base_version': version, 'ops': [[0, 0, 'edit ']]}, {}
+
+
+def _delete(rng, ctx, send):
+    status, body = send('POST', '/api/notes', _note_body(rng), {})
+    return 'DELETE', f'/api/notes/{json.loads(body)["id"]}', None, {}
+
+
+def _conditional_get(rng, ctx, send):
+    note_id = _random_id(rng, ctx) % 50 + 1  # small hot set, as a client re-polling would
+    etag = ctx['etags'].get(note_id)
+    if etag is None:
+        status, _body, headers = send('GET', f'/api/notes/{note_id}', None, {}, with_headers=True)
+        etag = ctx['etags'][note_id] = headers.get('ETag')
+    return 'GET', f'/api/notes/{note_id}', None, {'If-None-Match': etag} if etag else {}
+
+
+def _batch(rng, ctx, send):
+    ops = [{'op': 'create', **_note_body(rng)} for _ in range(10)]
+    ops += [{'op': 'update', 'id': _random_id(rng, ctx), 'title': f'batch {rng.random():.6f}'} for _ in range(10)]
+    return 'POST', '/api/notes/batch', {'mode': 'best_effort', 'ops': ops}, {}
+
+
+def _import(rng, ctx, send):
+    lines = '\n'.join(json.dumps(_note_body(rng), ensure_ascii=False) for _ in range(100))
+    return 'POST', '/api/notes/import', lines.encode('utf-8'), {'Content-Type': 'application/x-ndjson'}
+
+
+def _query(rng, ctx):
+    return rng.choice(ctx['terms'])
+
+
+SCENARIOS = [
+    Scenario('list_page', lambda r, c, s: ('GET', '/api/notes?limit=50', None, {})),
+    Scenario('list_next_page', lambda r, c, s: ('GET', f'/api/notes?limit=50&cursor={c["next_cursor"]}', None, {})),
+    Scenario('list_all_legacy', lambda r, c, s: ('GET', '/api/notes', None, {}), weight=0.02),
+    Scenario('note_get', lambda r, c, s: ('GET', f'/api/notes/{_random_id(r, c)}', None, {})),
+    Scenario('note_get_conditional', _conditional_get, ok=(200, 304)),
+    Scenario('search', lambda r, c, s: ('GET', f'/api/notes/search?q={_quote(_query(r, c))}&limit=20', None, {})),
+    Scenario('semantic', lambda r, c, s: ('GET', f'/api/notes/semantic?q={_quote(_query(r, c))}', None, {})),
+    Scenario('changes', lambda r, c, s: ('GET', f'/api/notes/changes?since={c["sync_cursor"]}', None, {})),
+    Scenario('note_create', lambda r, c, s: ('POST', '/api/notes', _note_body(r), {}), ok=(201,)),
+    Scenario('note_update', lambda r, c, s: ('PUT', f'/api/notes/{_random_id(r, c)}', _note_body(r), {}),
+             ok=(200, 409)),
+    Scenario('note_patch', _patch, ok=(200, 409)),
+    Scenario('note_delete', _delete, ok=(204,)),
+    Scenario('batch', _batch, weight=0.25),
+    Scenario('export', lambda r, c, s: ('GET', '/api/notes/export', None, {}), weight=0.02),
+    Scenario('import', _import, weight=0.1),
+    Scenario('chat', lambda r, c, s: ('POST', '/api/chat', {'prompt': _latin(r, 200)}, {}), ai=True),
+    Scenario('chat_stream', lambda r, c, s: ('POST', '/api/chat', {'prompt': _latin(r, 200), 'stream': True}, {}),
+             ai=True),
+    Scenario('translate', lambda r, c, s: ('POST', '/api/translate',
+                                           {'note_id': _random_id(r, c), 'target': 'Spanish'}, {}), ai=True),
+    # notes 1-50 have a stored pre-translation (prepare_context): a table lookup, no LLM call
+    Scenario('translate_stored', lambda r, c, s: ('POST', '/api/translate',
+                                                  {'note_id': _random_id(r, c) % 50 + 1, 'target': 'French'}, {})),
+    Scenario('translate_stream', lambda r, c, s: ('POST', '/api/translate',
+                                                  {'text': _cjk(r, 300), 'target': 'English', 'stream': True}, {}),
+             ai=True),
+    Scenario('generate', lambda r, c, s: ('POST', '/api/generate',
+                                          {'prompt': _latin(r, 80), 'language': 'English'}, {}), ai=True),
+]
+
+
+def _quote(value):
+    from urllib.parse import quote
+    return quote(value)
+
+
+# --- drivers ------------------------------------------------------------------------
+
+def _decoded(content, headers):
+    if headers.get('Content-Encoding') == 'gzip':
+        return gzip.decompress(content)
+    return content
+
+
+def _encode(body, headers):
+    if body is None or isinstance(body, bytes):
+        return body, headers
+    return json.dumps(body, ensure_ascii=False).encode('utf-8'), dict(headers, **{'Content-Type': 'application/json'})
+
+
+class TestClientDriver:
+    """Sequential requests through app.test_client(); measures the handler in-process."""
+
+    name = 'testclient'
+
+    def __init__(self, app, accept_encoding):
+        self.client = app.test_client()
+        self.accept_encoding = accept_encoding
+
+    def _request(self, method, path, body, headers):
+        data, headers = _encode(body, headers)
+        if self.accept_encoding:
+            headers = dict(headers, **{'Accept-Encoding': self.accept_encoding})
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        content = response.get_data()  # drains streamed bodies too
+        response.close()
+        return response.status_code, content, response.headers
+
+    def send(self, method, path, body, headers, with_headers=False):
+        status, content, response_headers = self._request(method, path, body, headers)
+        content = _decoded(content, response_headers)
+        return (status, content, response_headers) if with_headers else (status, content)
+
+    def run(self, scenario, ctx, count, rng):
+        samples = []
+        started = time.perf_counter()
+        for _ in range(count):
+            method, path, body, headers = scenario.make(rng, ctx, self.send)
+            t0 = time.perf_counter()
+            try:
+                status, _, _ = self._request(method, path, body, headers)
+            except Exception:
+                status = None
+            samples.append((time.perf_counter() - t0, None, status))
+        return samples, time.perf_counter() - started
+
+
+class HTTPDriver:
+    """--concurrency threads, each with its own keep-alive connection to a threaded
+    werkzeug server running the app; also records time to the response headers."""
+
+    name = 'http'
+
+    def __init__(self, app, accept_encoding, concurrency):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log per request
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.accept_encoding = accept_encoding
+        self.concurrency = concurrency
+        self._local = threading.local()
+        threading.Thread(target=self.server.serve_forever, daemon=True, name='bench-http').start()
+
+    def close(self):
+        self.server.shutdown()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        return conn
+
+    def _request(self, method, path, body, headers):
+        """(status, body, headers, seconds to headers); reconnects once on a dropped connection."""
+        data, headers = _encode(body, headers)
+        if self.accept_encoding:
+            headers = dict(headers, **{'Accept-Encoding': self.accept_encoding})
+        for attempt in (1, 2):
+            conn = self._conn()
+            try:
+                t0 = time.perf_counter()
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                first = time.perf_counter() - t0
+                content = response.read()
+                if response.will_close:
+                    conn.close()
+                    self._local.conn = None
+                return response.status, content, response.headers, first
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+
+    def send(self, method, path, body, headers, with_headers=False):
+        status, content, response_headers, _ = self._request(method, path, body, headers)
+        content = _decoded(content, response_headers)
+        return (status, content, response_headers) if with_headers else (status, content)
+
+    def run(self, scenario, ctx, count, rng):
+        # one request plan per task, built up front so every run draws the same values
+        seeds = [rng.random() for _ in range(count)]
+
+        def task(seed):
+            method, path, body, headers = scenario.make(random.Random(seed), ctx, self.send)
+            t0 = time.perf_counter()
+            try:
+                status, _, _, first = self._request(method, path, body, headers)
+            except Exception:
+                status, first = None, None
+            return time.perf_counter() - t0, first, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='bench') as pool:
+            samples = list(pool.map(task, seeds))
+        return samples, time.perf_counter() - started
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, wall, ok_statuses):
+    latencies = sorted(s[0] for s in samples)
+    firsts = sorted(s[1] for s in samples if s[1] is not None)
+    errors = sum(1 for s in samples if s[2] not in ok_statuses)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    stats = {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / wall, 2) if wall > 0 else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1]) if latencies else None,
+    }
+    if firsts:
+        stats['ttfb_p50_ms'] = ms(percentile(firsts, 50))
+        stats['ttfb_p95_ms'] = ms(percentile(firsts, 95))
+    statuses = {}
+    for s in samples:
+        statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+    stats['statuses'] = statuses
+    return stats
+
+
+def store_translations(app, note_ids, target):
+    """Stored pre-translations for translate_stored (the note text stands in for the translation)."""
+    from sqlalchemy import select
+    from src import pretranslation
+    from src.models.note import Note
+    from src.models.translation import NoteTranslation
+    from src.models.user import db
+    table = NoteTranslation.__table__
+    with app.app_context(), db.engine.begin() as conn:
+        rows = conn.execute(select(Note.id, Note.content).where(Note.id.in_(note_ids))).all()
+        conn.execute(table.delete().where(table.c.note_id.in_(note_ids)))
+        conn.execute(table.insert(), [
+            {'note_id': r.id, 'language': pretranslation.language_key(target), 'translation': r.content,
+             'content_hash': pretranslation.content_hash(r.content), 'model': 'benchmark',
+             'updated_at': datetime.utcnow()} for r in rows
+        ])
+
+
+def prepare_context(app, notes, seed):
+    """Cursors and query terms the scenarios draw from."""
+    store_translations(app, list(range(1, 51)), 'French')
+    client = app.test_client()
+    page = client.get('/api/notes?limit=50').get_json()
+    return {
+        'notes': notes,
+        'next_cursor': page.get('next_cursor') or '',
+        'sync_cursor': page['sync_cursor'],
+        'terms': search_terms(random.Random(seed), 200),
+        'etags': {},
+    }
+
+
+def run_mode(driver, scenarios, ctx, requests, seed):
+    results = {}
+    for scenario in scenarios:
+        count = scenario.count(requests)
+        rng = random.Random(f'{seed}:{scenario.name}')
+        samples, wall = driver.run(scenario, ctx, count, rng)
+        stats = results[scenario.name] = summarize(samples, wall, scenario.ok)
+        print(f'{driver.name:<10} {scenario.name:<22} n={stats["requests"]:<5} err={stats["errors"]:<3} '
+              f'p50={stats["p50_ms"]:>9.2f}ms p95={stats["p95_ms"]:>9.2f}ms p99={stats["p99_ms"]:>9.2f}ms '
+              f'{stats["throughput_rps"]:>8.1f} req/s', flush=True)
+    return results
+
+
+def compare(current, baseline, tolerance, floor_ms):
+    """Print p95 changes against a baseline run; return the regressed (mode, scenario) pairs."""
+    regressions = []
+    print(f'\n{"mode":<10} {"scenario":<22} {"base p95":>10} {"p95":>10} {"change":>8}')
+    for mode, scenarios in current['results'].items():
+        for name, stats in scenarios.items():
+            old = baseline.get('results', {}).get(mode, {}).get(name)
+            if not old or old.get('p95_ms') is None or stats['p95_ms'] is None:
+                continue
+            before, after = old['p95_ms'], stats['p95_ms']
+            change = (after - before) / before if before else 0.0
+            regressed = change > tolerance and after - before > floor_ms
+            if regressed:
+                regressions.append((mode, name))
+            print(f'{mode:<10} {name:<22} {before:>8.2f}ms {after:>8.2f}ms {change:>+7.0%}'
+                  f'{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--notes', default='1k', help='corpus size, e.g. 1k, 10k, 100k (default 1k)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite file to use; an existing file is reused as is (default: temporary)')
+    parser.add_argument('--embed-limit', default='20k', help='notes given an embedding when seeding (default 20k)')
+    parser.add_argument('--mode', choices=('testclient', 'http', 'both'), default='both')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario before weighting')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads in http mode')
+    parser.add_argument('--scenarios', help='comma-separated subset (default: all)')
+    parser.add_argument('--no-ai', action='store_true', help='skip the scenarios that call the LLM')
+    parser.add_argument('--no-gzip', action='store_true', help='do not send Accept-Encoding: gzip')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='fake LLM time to first token (s)')
+    parser.add_argument('--llm-tokens-per-sec', type=float, default=500.0)
+    parser.add_argument('--llm-max-tokens', type=int, default=128)
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown vs baseline (0.2 = 20%%)')
+    parser.add_argument('--floor-ms', type=float, default=1.0, help='ignore p95 changes smaller than this')
+    parser.add_argument('--list', action='store_true', help='list scenarios and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for s in SCENARIOS:
+            print(f'{s.name:<22} weight={s.weight:<5} {"(llm)" if s.ai else ""}')
+        return 0
+    scenarios = SCENARIOS
+    if args.scenarios:
+        wanted = set(args.scenarios.split(','))
+        unknown = wanted - {s.name for s in SCENARIOS}
+        if unknown:
+            parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+        scenarios = [s for s in SCENARIOS if s.name in wanted]
+    if args.no_ai:
+        scenarios = [s for s in scenarios if not s.ai]
+
+    notes = parse_count(args.notes)
+    fake, _ = fake_llm_server.start(latency=args.llm_latency, tokens_per_sec=args.llm_tokens_per_sec,
+                                    max_tokens=args.llm_max_tokens)
+    workdir = tempfile.TemporaryDirectory(prefix='notes-bench-')
+    db_path = Path(args.db).resolve() if args.db else Path(workdir.name) / 'bench.db'
+    reuse = db_path.exists()
+    # must be in place before src.main is imported: it reads them at import time
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'AUTO_CREATE_TABLES': '1',
+        'LLM_ENDPOINT': f'http://127.0.0.1:{fake.server_port}',
+        'GITHUB_TOKEN': 'benchmark',
+        'LLM_CACHE_ENABLED': '0',  # every AI request should reach the (fake) upstream
+        'AI_RATE_PER_MIN': '0',  # all benchmark clients share one address
+        'EMBEDDINGS_PROVIDER': os.environ.get('EMBEDDINGS_PROVIDER', 'hashing'),
+    })
+    os.environ.pop('OPENAI_API_KEY', None)
+    from src.main import app
+
+    seed_seconds = None
+    if reuse:
+        print(f'Reusing {db_path}', file=sys.stderr)
+    else:
+        seed_seconds = seed_corpus(app, notes, args.seed, parse_count(args.embed_limit))
+    ctx = prepare_context(app, notes, args.seed)
+    accept_encoding = None if args.no_gzip else 'gzip'
+
+    report = {
+        'meta': {
+            'notes': notes, 'seed': args.seed, 'embed_limit': parse_count(args.embed_limit),
+            'requests': args.requests, 'concurrency': args.concurrency, 'accept_encoding': accept_encoding,
+            'llm': {'latency': args.llm_latency, 'tokens_per_sec': args.llm_tokens_per_sec,
+                    'max_tokens': args.llm_max_tokens},
+            'seed_seconds': round(seed_seconds, 2) if seed_seconds is not None else None,
+            'git': _git_revision(), 'python': platform.python_version(), 'platform': platform.platform(),
+            'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        },
+        'results': {},
+    }
+    if args.mode in ('testclient', 'both'):
+        report['results']['testclient'] = run_mode(TestClientDriver(app, accept_encoding), scenarios, ctx,
+                                                    args.requests, args.seed)
+    if args.mode in ('http', 'both'):
+        driver = HTTPDriver(app, accept_encoding, args.concurrency)
+        try:
+            report['results']['http'] = run_mode(driver, scenarios, ctx, args.requests, args.seed)
+        finally:
+            driver.close()
+    fake.shutdown()
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        print(f'\nResults written to {args.out}')
+    status = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        if baseline.get('meta', {}).get('notes') != notes:
+            print(f'warning: baseline was run with {baseline.get("meta", {}).get("notes")} notes, this run with {notes}')
+        regressions = compare(report, baseline, args.tolerance, args.floor_ms)
+        if regressions:
+            print(f'\n{len(regressions)} scenario(s) regressed beyond {args.tolerance:.0%}')
+            status = 1
+    workdir.cleanup()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
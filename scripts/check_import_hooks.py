@@ -0,0 +1,78 @@
+"""Check that imported notes get what saved notes get: embeddings and a first revision.
+
+Imports a few notes through POST /api/notes/import into a throwaway SQLite database
+(hashing embedder, embedding jobs on the in-process queue), then waits for semantic
+search to find each of them and checks their revision history. Exits 1 on failure.
+
+Usage: python scripts/check_import_hooks.py [--timeout 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+NOTES = [
+    {'title': 'Walrus migration', 'content': 'walrus colonies migrate along the arctic ice shelf',
+     'created_at': '2020-01-01T00:00:00', 'updated_at': '2020-01-02T00:00:00'},
+    {'title': 'Sourdough starter', 'content': 'feed the sourdough starter with rye flour twice a day',
+     'created_at': '2020-02-01T00:00:00', 'updated_at': '2020-02-02T00:00:00'},
+    {'title': '火山观测', 'content': '火山观测站记录了岩浆活动和地震数据',
+     'created_at': '2020-03-01T00:00:00', 'updated_at': '2020-03-02T00:00:00'},
+]
+
+
+def _semantic_ids(client, query):
+    resp = client.get('/api/notes/semantic', query_string={'q': query, 'limit': 5})
+    return [n['id'] for n in resp.get_json() or []] if resp.status_code == 200 else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timeout', type=float, default=20, help='seconds to wait for the embedding jobs')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='import-check-')
+    os.environ.update(DATABASE_URL=f'sqlite:///{os.path.join(tmp, "notes.db")}', AUTO_CREATE_TABLES='1',
+                      EMBEDDINGS_PROVIDER='hashing', EMBEDDINGS_ASYNC='1', REVISIONS_ENABLED='1')
+    from src.main import app
+
+    client = app.test_client()
+    client.post('/api/notes', json={'title': 'Existing note', 'content': 'written before the import'})
+    body = ''.join(json.dumps(n, ensure_ascii=False) + '\n' for n in NOTES)
+    report = client.post('/api/notes/import', data=body.encode('utf-8')).get_json()
+    if report.get('imported') != len(NOTES):
+        print('FAIL: import report', report)
+        return 1
+    listed = {n['title']: n['id'] for n in client.get('/api/notes').get_json()}
+    imported = {n['title']: listed[n['title']] for n in NOTES}
+
+    failures = []
+    deadline = time.monotonic() + args.timeout
+    missing = dict(imported)
+    while missing and time.monotonic() < deadline:
+        missing = {title: note_id for title, note_id in missing.items()
+                   if note_id not in _semantic_ids(client, title)}
+        if missing:
+            time.sleep(0.5)
+    failures += [f'semantic search does not find imported note {title!r}' for title in missing]
+
+    for title, note_id in imported.items():
+        revisions = client.get(f'/api/notes/{note_id}/revisions').get_json().get('revisions')
+        if not revisions or len(revisions) != 1:
+            failures.append(f'imported note {title!r} has {len(revisions or [])} revisions, expected one')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print(f'Import hooks check PASSED: {len(imported)} imported notes embedded and recorded')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Measure cold-start import time of the app and enforce a budget.
+
+Runs `python -X importtime -c "import src.main"` in fresh interpreters (what a serverless
+cold start pays before the first request), reports the median time to import src.main
+and the slowest modules, and exits 1 when
+  - the median exceeds --budget-ms, or
+  - a module that must load lazily (openai, httpx, numpy, ...) was imported at startup.
+
+Usage:
+    python scripts/check_startup.py [--budget-ms 500] [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# heavy packages that must only be imported on first use
+LAZY_MODULES = ('openai', 'httpx', 'numpy', 'brotli', 'psycopg2', 'pymysql')
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us)] from -X importtime output, in import order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+# prints the modules actually loaded (-X importtime also lists failed optional imports)
+PROBE = 'import sys, src.main; print("\\n".join(sorted(sys.modules)))'
+
+
+def measure(env):
+    """(importtime rows, names of the loaded modules) from one fresh interpreter."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit('Importing src.main failed')
+    return parse_importtime(result.stderr), set(result.stdout.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=500.0, help='allowed median import time of src.main')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='startup-check-') as tmp:
+        env = dict(os.environ)
+        # an empty SQLite file: no network, no driver, and no DDL at import
+        env.update({'DATABASE_URL': f'sqlite:///{Path(tmp) / "startup.db"}', 'AUTO_CREATE_TABLES': '0',
+                    'PYTHONDONTWRITEBYTECODE': '1'})
+        measure(env)  # warm the OS file cache
+        runs = [measure(env) for _ in range(args.runs)]
+
+    totals = [next(cum for name, _, cum in rows if name == 'src.main') / 1000 for rows, _ in runs]
+    median = statistics.median(totals)
+    last, loaded = runs[-1]
+    print(f'import src.main: median {median:.1f} ms over {args.runs} runs '
+          f'(min {min(totals):.1f}, max {max(totals):.1f}); budget {args.budget_ms:.0f} ms')
+
+    print('\nslowest modules by self time (last run):')
+    for name, self_us, cumulative_us in sorted(last, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f'  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}')
+
+    roots = {}
+    for name, _, cumulative_us in last:
+        if '.' not in name or name.startswith('src.') and name.count('.') == 1:
+            roots[name] = max(roots.get(name, 0), cumulative_us)
+    print('\ntop-level imports:')
+    for name, cumulative_us in sorted(roots.items(), key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+
+    failures = []
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    if eager:
+        failures.append(f'imported at startup but should load on first use: {", ".join(eager)}')
+    if median > args.budget_ms:
+        failures.append(f'median import time {median:.1f} ms exceeds the {args.budget_ms:.0f} ms budget')
+    for failure in failures:
+        print(f'\nFAIL: {failure}')
+    if not failures:
+        print('\nStartup check PASSED')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
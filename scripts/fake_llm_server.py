@@ -0,0 +1,166 @@
+"""Local stand-in for an OpenAI-compatible endpoint, for benchmarks and offline development.
+
+Serves POST /chat/completions (plain and stream=True) and POST /embeddings with a
+configurable time to first token and token rate, so the AI paths can be measured
+without network access or an API token.
+
+Usage:
+    python scripts/fake_llm_server.py [--port 8765] [--latency 0.2] [--tokens-per-sec 50]
+then point the app at it:
+    LLM_ENDPOINT=http://127.0.0.1:8765 GITHUB_TOKEN=fake python src/main.py
+
+Replies echo the last user message (up to --max-tokens words); requests with a
+response_format get a {"title", "content"} JSON object. Messages containing
+FAKE_ERROR_<code> are answered with that HTTP status.
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMConfig:
+    def __init__(self, latency=0.2, tokens_per_sec=50.0, max_tokens=256, embedding_dim=64):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.max_tokens = max_tokens
+        self.embedding_dim = embedding_dim
+        self.lock = threading.Lock()
+        self.requests = 0
+
+
+_ERROR = re.compile(r'FAKE_ERROR_(\d{3})')
+
+
+def _reply_words(body, config):
+    messages = body.get('messages') or [{}]
+    prompt = str(messages[-1].get('content', ''))
+    if body.get('response_format'):
+        return None, prompt
+    words = prompt.split() or ['ok']
+    limit = min(config.max_tokens, body.get('max_tokens') or config.max_tokens)
+    return words[:limit], prompt
+
+
+def _embedding(text, dim):
+    seed = hashlib.sha256(text.encode('utf-8')).digest()
+    out = []
+    while len(out) < dim:
+        seed = hashlib.sha256(seed).digest()
+        out.extend((b - 127.5) / 127.5 for b in seed)
+    return out[:dim]
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _chunk(self, data):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            with config.lock:
+                config.requests += 1
+            error = _ERROR.search(json.dumps(body))
+            if error:
+                return self._json(int(error.group(1)), {'error': {'message': 'fake upstream error'}})
+            if self.path.rstrip('/').endswith('/embeddings'):
+                return self._embeddings(body)
+            if self.path.rstrip('/').endswith('/chat/completions'):
+                return self._chat(body)
+            self._json(404, {'error': {'message': f'unknown path {self.path}'}})
+
+        def _embeddings(self, body):
+            inputs = body.get('input')
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+            time.sleep(config.latency)
+            self._json(200, {
+                'object': 'list',
+                'model': body.get('model', 'fake'),
+                'data': [{'object': 'embedding', 'index': i, 'embedding': _embedding(text, config.embedding_dim)}
+                         for i, text in enumerate(inputs)],
+                'usage': {'prompt_tokens': sum(len(t.split()) for t in inputs), 'total_tokens': 0},
+            })
+
+        def _chat(self, body):
+            words, prompt = _reply_words(body, config)
+            if words is None:
+                words = json.dumps({'title': 'Fake note', 'content': prompt[:200]}).split(' ')
+            usage = {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(words),
+                     'total_tokens': len(prompt.split()) + len(words)}
+            per_token = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+            time.sleep(config.latency)
+            model = body.get('model', 'fake')
+            if not body.get('stream'):
+                time.sleep(per_token * len(words))
+                return self._json(200, {
+                    'id': 'fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': ' '.join(words)}}],
+                    'usage': usage,
+                })
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for i, word in enumerate(words):
+                    if i:
+                        time.sleep(per_token)
+                    chunk = {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': model,
+                             'choices': [{'index': 0, 'delta': {'content': word + (' ' if i + 1 < len(words) else '')}}]}
+                    self._chunk(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                self._chunk(b'data: [DONE]\n\n')
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client went away mid-stream
+
+    return Handler
+
+
+def start(host='127.0.0.1', port=0, **config):
+    """Start the server in a daemon thread. Returns (server, config); base URL is
+    f'http://{host}:{server.server_port}'."""
+    cfg = FakeLLMConfig(**config)
+    server = ThreadingHTTPServer((host, port), make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='fake-llm').start()
+    return server, cfg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before the first token')
+    parser.add_argument('--tokens-per-sec', type=float, default=50.0, help='0 = no delay between tokens')
+    parser.add_argument('--max-tokens', type=int, default=256, help='longest reply in words')
+    args = parser.parse_args()
+    server, _ = start(args.host, args.port, latency=args.latency,
+                      tokens_per_sec=args.tokens_per_sec, max_tokens=args.max_tokens)
+    print(f'Fake LLM endpoint on http://{args.host}:{server.server_port} (Ctrl+C to stop)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
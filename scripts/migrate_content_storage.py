@@ -0,0 +1,113 @@
+"""Convert stored note content to the current CONTENT_COMPRESSION mode, in batches.
+
+Usage: python scripts/migrate_content_storage.py [--batch-size 500] [--vacuum] [--pg-lz4]
+
+Rewrites every note whose stored form differs from what the current mode would write
+(compresses large plain content, or decompresses with CONTENT_COMPRESSION=off) and fills
+`content_prefix` for notes saved before it existed. Each batch is its own transaction, so
+the app keeps serving meanwhile and an interrupted run just continues where it is rerun.
+Neither `updated_at` nor `version` changes: the text is the same, clients have nothing to
+sync. See src/content_storage.py.
+
+--vacuum      SQLite: rebuild the file afterwards so the freed pages are returned to the disk
+--pg-lz4      Postgres 14+: store the column with lz4 instead of pglz (applies to rows written
+              from now on; this script only fills the prefix there)
+"""
+import argparse
+import os
+import sys
+import time
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from sqlalchemy import Text, select, type_coerce, update
+
+from src.main import app
+from src.content_storage import MODE, compress, content_prefix, decompress
+from src.models.note import Note
+from src.models.user import db
+from src.schema import upgrade_schema
+from src.search import ensure_search_index
+
+
+def _sqlite_bytes(conn):
+    page_size = conn.exec_driver_sql('PRAGMA page_size').scalar()
+    return conn.exec_driver_sql('PRAGMA page_count').scalar() * page_size
+
+
+def _pending(row, sqlite):
+    """New (content, prefix) values of a row, or None when it is already in the current form."""
+    content = decompress(row.raw)
+    values = {}
+    if sqlite and compress(content) != row.raw:
+        values['content'] = content
+    if row.content_prefix != content_prefix(content):
+        values['content_prefix'] = content_prefix(content)
+    return values or None
+
+
+def migrate(engine, batch_size):
+    note = Note.__table__
+    sqlite = engine.dialect.name == 'sqlite'
+    raw = type_coerce(note.c.content, Text).label('raw')  # as stored: str or marker + bytes
+    last_id, scanned, changed = 0, 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(note.c.id, raw, note.c.content_prefix)
+                .where(note.c.id > last_id).order_by(note.c.id).limit(batch_size)
+            ).all()
+            for row in rows:
+                values = _pending(row, sqlite)
+                if values:
+                    conn.execute(update(note).where(note.c.id == row.id)
+                                 .values(updated_at=note.c.updated_at, **values))
+                    changed += 1
+        if not rows:
+            return scanned, changed
+        scanned += len(rows)
+        last_id = rows[-1].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--vacuum', action='store_true', help='SQLite: reclaim the freed space afterwards')
+    parser.add_argument('--pg-lz4', action='store_true', help='Postgres 14+: compress the column with lz4')
+    args = parser.parse_args()
+
+    with app.app_context():
+        engine = db.engine
+        db.create_all(bind_key=None)
+        upgrade_schema(engine)
+        # the full-text index must decode compressed content before any row is compressed
+        ensure_search_index(engine)
+        sqlite = engine.dialect.name == 'sqlite'
+        if args.pg_lz4 and engine.dialect.name == 'postgresql':
+            with engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE note ALTER COLUMN content SET COMPRESSION lz4')
+            print('note.content now uses lz4 for new values')
+        if sqlite:
+            with engine.connect() as conn:
+                before = _sqlite_bytes(conn)
+
+        started = time.perf_counter()
+        scanned, changed = migrate(engine, args.batch_size)
+        elapsed = time.perf_counter() - started
+        print(f'CONTENT_COMPRESSION={MODE}: {changed} of {scanned} notes rewritten in {elapsed:.2f}s')
+
+        if sqlite:
+            if args.vacuum:
+                with engine.connect() as conn:
+                    conn.exec_driver_sql('VACUUM')
+            with engine.connect() as conn:
+                after = _sqlite_bytes(conn)
+            print(f'database size: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB'
+                  + ('' if args.vacuum else ' (freed pages are reused; --vacuum shrinks the file)'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Add note ownership to an existing database and give every unowned note an owner.
+
+Usage: python scripts/migrate_note_owners.py [--batch-size 1000]
+
+Adds note.user_id, note_tombstone.user_id and the owner-scoped indexes (like
+scripts/upgrade_db.py), then assigns every note without an owner to the default user
+(DEFAULT_USERNAME, created if needed), `--batch-size` notes per transaction so the app
+keeps serving meanwhile. updated_at is kept, so clients see no changes. On Postgres and
+MySQL the foreign key to `user` is added as well (SQLite cannot add constraints to an
+existing table). Safe to rerun. See src/accounts.py.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import AddConstraint
+
+from src.main import app
+from src.models.note import Note
+from src.models.user import db
+from src.schema import upgrade_schema
+from src import accounts
+
+
+def _add_foreign_key(engine):
+    """note.user_id -> user.id, when the column was added by ALTER TABLE (no constraint)."""
+    if engine.dialect.name == 'sqlite':
+        return False
+    existing = inspect(engine).get_foreign_keys('note')
+    if any(fk['constrained_columns'] == ['user_id'] for fk in existing):
+        return False
+    fk = next(iter(Note.__table__.c.user_id.foreign_keys)).constraint  # the model's own
+    with engine.begin() as conn:
+        conn.execute(AddConstraint(fk))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=accounts.BACKFILL_BATCH)
+    args = parser.parse_args()
+    with app.app_context():
+        engine = db.engine
+        db.create_all(bind_key=None)
+        for change in upgrade_schema(engine):
+            print('Applied', change)
+        started = time.perf_counter()
+        owner = accounts.default_user_id(engine)
+        assigned = accounts.assign_unowned_notes(engine, args.batch_size)
+        print(f'{assigned} notes assigned to user {owner} ({accounts.DEFAULT_USERNAME}) '
+              f'in {time.perf_counter() - started:.2f}s')
+        if _add_foreign_key(engine):
+            print('Applied foreign key note.user_id -> user.id')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Export notes to NDJSON or import them from it, straight against the configured database.
+
+Usage:
+    python scripts/notes_transfer.py export [--out notes.ndjson[.gz]] [--batch 500] [--user <id>]
+    python scripts/notes_transfer.py import notes.ndjson[.gz] [--keep-ids] [--chunk 500] [--user <id>]
+
+Files ending in .gz are (de)compressed with gzip. Export writes to stdout without --out.
+Point DATABASE_URL at the source database for export and at the target for import.
+Export writes every user's notes unless --user is given; import assigns the notes to
+--user (default: the default user, see src/accounts.py).
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.main import app
+from src.models.user import db
+from src import note_transfer
+
+
+def _open(path, mode):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+def export(args):
+    started = time.perf_counter()
+    out = _open(args.out, 'wb') if args.out else sys.stdout.buffer
+    count = 0
+    try:
+        for line in note_transfer.iter_ndjson(note_transfer.iter_export(db.engine, batch=args.batch, user_id=args.user)):
+            out.write(line)
+            count += 1
+    finally:
+        if args.out:
+            out.close()
+    seconds = time.perf_counter() - started
+    rate = count / seconds if seconds > 0 else 0
+    print(f'Exported {count} notes in {seconds:.2f}s ({rate:.0f} notes/s)', file=sys.stderr)
+
+
+def import_(args):
+    with _open(args.file, 'rb') as f:
+        report = note_transfer.import_ndjson(db.engine, f, chunk_size=args.chunk, keep_ids=args.keep_ids,
+                                             user_id=args.user)
+    print(f"Imported {report['imported']} notes in {report['seconds']}s "
+          f"({report['notes_per_sec']} notes/s), skipped {report['skipped']}")
+    for err in report['errors']:
+        print(f"  line {err['line']}: {err['error']}")
+    if report['skipped']:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_export = sub.add_parser('export', help='write all notes as NDJSON')
+    p_export.add_argument('--out', help='output file (.gz to compress); default stdout')
+    p_export.add_argument('--batch', type=int, default=note_transfer.EXPORT_BATCH, help='rows fetched per round trip')
+    p_export.add_argument('--user', type=int, help="only this user's notes")
+    p_import = sub.add_parser('import', help='insert notes from an NDJSON file')
+    p_import.add_argument('file')
+    p_import.add_argument('--keep-ids', action='store_true', help='keep exported ids (target should be empty)')
+    p_import.add_argument('--chunk', type=int, default=note_transfer.IMPORT_CHUNK, help='rows per INSERT/transaction')
+    p_import.add_argument('--user', type=int, help='owner of the imported notes (default: the default user)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.command == 'export':
+            export(args)
+        else:
+            import_(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Delete note revisions older than the retention (REVISION_RETENTION_DAYS), in batches.
+
+Usage: python scripts/prune_revisions.py [--days 90] [--batch-size 500]
+The app also prunes on its own while notes are being saved; use this from cron when
+saves are rare or after lowering the retention. Each note's latest revision is kept.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.main import app
+from src.models.user import db
+from src import revisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=float, default=revisions.RETENTION_DAYS, help='retention in days')
+    parser.add_argument('--batch-size', type=int, default=revisions.PRUNE_BATCH)
+    args = parser.parse_args()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        started = time.perf_counter()
+        deleted = revisions.prune_revisions(args.days, args.batch_size)
+        print(f'{deleted} revisions older than {args.days:g} days deleted in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Run AI job workers in their own process.
+
+Set JOBS_INPROCESS=0 for the web processes so they only enqueue, then run:
+    python scripts/run_job_worker.py [--workers N]
+"""
+import argparse
+import os
+import signal
+import sys
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.main import app
+from src import jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=jobs.WORKERS)
+    args = parser.parse_args()
+
+    stop = jobs.start_workers(app, count=args.workers)
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    print(f'Job worker running with {args.workers} threads (Ctrl+C to stop)')
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        stop.set()
+    print('Stopping')
+
+
+if __name__ == '__main__':
+    main()
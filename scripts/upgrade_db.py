@@ -0,0 +1,36 @@
+"""Apply pending schema upgrades (new tables, columns and indexes) to the configured database.
+
+Also creates the full-text search index when it is missing (a backfill over all notes;
+until then search falls back to a LIKE scan).
+
+Usage: python scripts/upgrade_db.py
+"""
+import os
+import sys
+
+# Ensure project root is on sys.path so `src` imports resolve when running from scripts/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.main import app
+from src.models.user import db
+from src.schema import upgrade_schema
+from src.search import ensure_search_index
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        applied = upgrade_schema(db.engine)
+        if ensure_search_index(db.engine):
+            print('Search index is in place')
+        if applied:
+            for change in applied:
+                print('Applied', change)
+        else:
+            print('Schema is up to date')
+
+
+if __name__ == '__main__':
+    main()
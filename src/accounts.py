@@ -0,0 +1,120 @@
+"""Which user a request acts for, and the owner of notes saved before notes had owners.
+
+There is no login yet: a request acts for the user whose id is in the X-User-Id header,
+set by the front end or by an authenticating proxy in front of the app (which must not
+pass the header through from clients). Requests without it act for the default user
+(DEFAULT_USERNAME, created on first use), so a single-user setup works unchanged. An id
+that names no user gets 401.
+
+Note queries are scoped to that user through the composite indexes on
+(user_id, updated_at, id) and (user_id, lower(title)), so one user's lists cost the same
+however many notes others have. Notes without an owner are assigned to the default user
+by assign_unowned_notes() (scripts/migrate_note_owners.py, or at startup with
+AUTO_CREATE_TABLES).
+
+Configuration (environment):
+  DEFAULT_USERNAME    user of requests without X-User-Id and of existing notes (default 'default')
+  DEFAULT_USER_EMAIL  its email when it is created (default '<DEFAULT_USERNAME>@localhost')
+"""
+import logging
+import threading
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+USER_HEADER = 'X-User-Id'
+DEFAULT_USERNAME = config.get('DEFAULT_USERNAME', 'default')
+DEFAULT_USER_EMAIL = config.get('DEFAULT_USER_EMAIL', f'{DEFAULT_USERNAME}@localhost')
+BACKFILL_BATCH = 1000
+
+_default_ids = {}
+_lock = threading.Lock()
+
+
+class UnknownUser(Exception):
+    """The request names a user that does not exist."""
+
+
+def _user_table():
+    from src.models.user import User
+    return User.__table__
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+def default_user_id(engine=None):
+    """Id of the default user, created if it does not exist yet (cached per database)."""
+    engine = engine or _engine()
+    key = str(engine.url)
+    if key in _default_ids:
+        return _default_ids[key]
+    user = _user_table()
+    with _lock:
+        if key not in _default_ids:
+            lookup = select(user.c.id).where(user.c.username == DEFAULT_USERNAME)
+            with engine.connect() as conn:
+                user_id = conn.execute(lookup).scalar()
+            if user_id is None:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(user.insert().values(username=DEFAULT_USERNAME, email=DEFAULT_USER_EMAIL))
+                except IntegrityError:
+                    pass  # another worker created it first
+                with engine.connect() as conn:
+                    user_id = conn.execute(lookup).scalar()
+            _default_ids[key] = user_id
+    return _default_ids[key]
+
+
+def current_user_id():
+    """The user the current request acts for; raises UnknownUser for a bad X-User-Id."""
+    from flask import g, request
+    if 'user_id' in g:
+        return g.user_id
+    raw = request.headers.get(USER_HEADER, '').strip()
+    if not raw:
+        g.user_id = default_user_id()
+        return g.user_id
+    try:
+        user_id = int(raw)
+    except ValueError:
+        raise UnknownUser(f'{USER_HEADER} must be a user id') from None
+    from src.models.user import db
+    user = _user_table()
+    if db.session.execute(select(user.c.id).where(user.c.id == user_id)).scalar() is None:
+        raise UnknownUser(f'user {user_id} does not exist')
+    g.user_id = user_id
+    return user_id
+
+
+def assign_unowned_notes(engine, batch_size=BACKFILL_BATCH):
+    """Give every note without an owner to the default user, `batch_size` rows per
+    transaction, and the tombstones of deleted ones too (delta sync). Returns the number
+    of notes assigned."""
+    from src.models.note import Note, NoteTombstone
+    note, tombstone = Note.__table__, NoteTombstone.__table__
+    owner = default_user_id(engine)
+    with engine.begin() as conn:
+        # a few at most: tombstones are kept for 30 days
+        conn.execute(update(tombstone).where(tombstone.c.user_id.is_(None)).values(user_id=owner))
+    unowned = select(note.c.id).where(note.c.user_id.is_(None)).order_by(note.c.id).limit(batch_size)
+    assigned = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(unowned).scalars().all()
+            if ids:
+                # updated_at stays: the notes did not change for their clients
+                conn.execute(update(note).where(note.c.id.in_(ids))
+                             .values(user_id=owner, updated_at=note.c.updated_at))
+        assigned += len(ids)
+        if len(ids) < batch_size:
+            if assigned:
+                logger.info('Assigned %d notes without an owner to user %s', assigned, owner)
+            return assigned
@@ -0,0 +1,388 @@
+"""Admission control and request coalescing for the LLM endpoints.
+
+Three guards, applied to the POST endpoints of the AI blueprint (src/routes/ai.py):
+  - per-client token buckets: AI_RATE_PER_MIN requests per minute, bursts of AI_RATE_BURST
+  - a global cap on AI requests in flight; over it, requests are shed at once with 429
+    rather than queueing behind the upstream slots of src/llm.py
+  - single-flight coalescing: concurrent identical LLM calls (same model, parameters and
+    whitespace-normalized messages) share one upstream call and its result
+Rejected requests get 429 with Retry-After.
+
+Backends (AI_ADMISSION_BACKEND):
+  memory    per worker process (default)
+  database  buckets and in-flight leases live in tables shared by all workers, and an
+            identical call already running in another worker is awaited through the LLM
+            cache table instead of being sent again. Leases expire, so a crashed worker
+            cannot hold capacity forever. Database errors fail open.
+
+Configuration (environment):
+  AI_ADMISSION_ENABLED   '0' turns the guards off (coalescing stays on)
+  AI_ADMISSION_BACKEND   memory | database (default memory)
+  AI_RATE_PER_MIN        sustained requests per client per minute (default 30; 0 = unlimited)
+  AI_RATE_BURST          bucket size (default 10)
+  AI_MAX_INFLIGHT        AI requests in flight, per process or (database) overall (default 32)
+  AI_TRUST_FORWARDED     '1' identifies clients by the first X-Forwarded-For hop (behind a proxy)
+  AI_LEASE_SECONDS       lifetime of database leases (default 120)
+"""
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+ENABLED = config.get_bool('AI_ADMISSION_ENABLED', True)
+BACKEND = config.get('AI_ADMISSION_BACKEND', 'memory')
+RATE_PER_MIN = config.get_float('AI_RATE_PER_MIN', '30')
+BURST = config.get_float('AI_RATE_BURST', '10')
+MAX_INFLIGHT = config.get_int('AI_MAX_INFLIGHT', '32')
+TRUST_FORWARDED = config.get_bool('AI_TRUST_FORWARDED')
+LEASE_SECONDS = config.get_float('AI_LEASE_SECONDS', '120')
+# Retry-After when shedding for the in-flight cap: work in flight finishes within seconds
+SHED_RETRY_AFTER = 2
+# how often a follower in another worker looks for the leader's result
+FLIGHT_POLL_SECONDS = 0.05
+
+
+class Rejected(Exception):
+    """The request was not admitted; retry_after is in whole seconds."""
+
+    def __init__(self, reason, detail, retry_after):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Stats:
+    """Thread-safe counters of admission decisions and coalesced calls."""
+
+    FIELDS = ('admitted', 'rate_limited', 'shed', 'coalesced', 'coalesced_remote', 'db_errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+stats = Stats()
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+def _tables():
+    from src.models.admission import AILease, AIRateBucket
+    return AIRateBucket.__table__, AILease.__table__
+
+
+def _refill(tokens, updated, now):
+    rate = RATE_PER_MIN / 60.0
+    return min(BURST, tokens + (now - updated) * rate)
+
+
+def _wait_for_token(tokens):
+    return max(1, math.ceil((1 - tokens) / (RATE_PER_MIN / 60.0)))
+
+
+class MemoryBuckets:
+    """Token buckets per client key, in this process."""
+
+    # buckets idle this long are full again and can be forgotten
+    IDLE_SECONDS = 3600
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._next_prune = time.monotonic() + self.IDLE_SECONDS
+
+    def take(self, key):
+        """Take one token. Returns 0 when allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (BURST, now))
+            tokens = _refill(tokens, updated, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return _wait_for_token(tokens)
+            self._buckets[key] = (tokens - 1, now)
+            if now >= self._next_prune:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < self.IDLE_SECONDS}
+        self._next_prune = now + self.IDLE_SECONDS
+
+
+class DatabaseBuckets:
+    """Token buckets in the `ai_rate_bucket` table, shared by all workers. Updates are
+    optimistic (conditional on the timestamp read), retried a few times."""
+
+    ATTEMPTS = 3
+
+    def take(self, key):
+        table, _ = _tables()
+        engine = _engine()
+        for _ in range(self.ATTEMPTS):
+            now = time.time()
+            with engine.connect() as conn:
+                row = conn.execute(select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).first()
+            if row is None:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(table.insert().values(key=key, tokens=BURST - 1, updated_at=now))
+                    return 0
+                except IntegrityError:
+                    continue  # another worker created it first
+            tokens = _refill(row.tokens, row.updated_at, now)
+            allowed = tokens >= 1
+            with engine.begin() as conn:
+                changed = conn.execute(
+                    update(table).where(table.c.key == key, table.c.updated_at == row.updated_at)
+                    .values(tokens=tokens - 1 if allowed else tokens, updated_at=now)
+                ).rowcount
+            if changed:
+                return 0 if allowed else _wait_for_token(tokens)
+        return 0  # heavily contended: let it through rather than spin
+
+
+class MemoryInflight:
+    """Counts AI requests in flight in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def acquire(self):
+        """A release callable, or None when the cap is reached."""
+        with self._lock:
+            if self.count >= MAX_INFLIGHT:
+                return None
+            self.count += 1
+        released = []
+
+        def release():
+            with self._lock:
+                if not released:
+                    released.append(True)
+                    self.count -= 1
+        return release
+
+
+class DatabaseInflight:
+    """One `ai_lease` row per request in flight, across workers; expired leases don't count."""
+
+    KIND = 'inflight'
+
+    def acquire(self):
+        _, table = _tables()
+        lease_id = f'{self.KIND}:{uuid.uuid4().hex}'
+        now = datetime.utcnow()
+        with _engine().begin() as conn:
+            conn.execute(delete(table).where(table.c.kind == self.KIND, table.c.expires_at <= now))
+            count = conn.execute(
+                select(func.count()).select_from(table).where(table.c.kind == self.KIND)
+            ).scalar()
+            if count >= MAX_INFLIGHT:
+                return None
+            conn.execute(table.insert().values(id=lease_id, kind=self.KIND,
+                                               expires_at=now + timedelta(seconds=LEASE_SECONDS)))
+
+        def release():
+            try:
+                with _engine().begin() as conn:
+                    conn.execute(delete(table).where(table.c.id == lease_id))
+            except SQLAlchemyError:
+                stats.incr('db_errors')
+                logger.warning('Releasing AI in-flight lease failed (it expires on its own)', exc_info=True)
+        return release
+
+    @property
+    def count(self):
+        _, table = _tables()
+        with _engine().connect() as conn:
+            return conn.execute(select(func.count()).select_from(table).where(
+                table.c.kind == self.KIND, table.c.expires_at > datetime.utcnow())).scalar()
+
+
+if BACKEND == 'database':
+    buckets, inflight = DatabaseBuckets(), DatabaseInflight()
+else:
+    buckets, inflight = MemoryBuckets(), MemoryInflight()
+
+
+def client_key(req):
+    """Who a request counts against: the peer address, or the first forwarded hop."""
+    if TRUST_FORWARDED:
+        forwarded = req.headers.get('X-Forwarded-For', '')
+        if forwarded.strip():
+            return forwarded.split(',')[0].strip()
+    return req.remote_addr or 'unknown'
+
+
+def admit(key):
+    """Apply the rate limit and the in-flight cap. Returns a release callable to run when
+    the request is done, or raises Rejected."""
+    try:
+        if RATE_PER_MIN > 0:
+            wait = buckets.take(key)
+            if wait:
+                stats.incr('rate_limited')
+                raise Rejected('rate_limited', f'more than {RATE_PER_MIN:g} AI requests per minute', wait)
+        release = inflight.acquire() if MAX_INFLIGHT > 0 else (lambda: None)
+    except SQLAlchemyError:
+        stats.incr('db_errors')
+        logger.warning('AI admission check failed; admitting the request', exc_info=True)
+        return lambda: None
+    if release is None:
+        stats.incr('shed')
+        raise Rejected('shed', f'{MAX_INFLIGHT} AI requests already in flight', SHED_RETRY_AFTER)
+    stats.incr('admitted')
+    return release
+
+
+def _normalized(messages):
+    out = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            message = dict(message, content=' '.join(content.split()))
+        out.append(message)
+    return out
+
+
+def flight_key(model_name, messages, **params):
+    """Identity of an LLM call for coalescing: whitespace differences in the prompt don't count."""
+    payload = json.dumps({'model': model_name, 'messages': _normalized(messages), 'params': params},
+                         sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(key, call):
+    """Run call() once for concurrent callers with the same key; all get its result
+    (or its exception). Nothing is kept once the call returns."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        stats.incr('coalesced')
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = call()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _take_flight_lease(key):
+    """True if this worker now owns the database lease for `key`."""
+    _, table = _tables()
+    lease_id = f'flight:{key}'
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=LEASE_SECONDS)
+    try:
+        with _engine().begin() as conn:
+            conn.execute(table.insert().values(id=lease_id, kind='flight', expires_at=expires))
+        return True
+    except IntegrityError:
+        pass
+    # held by another worker, unless that lease expired (its worker died)
+    with _engine().begin() as conn:
+        return bool(conn.execute(
+            update(table).where(table.c.id == lease_id, table.c.expires_at <= now).values(expires_at=expires)
+        ).rowcount)
+
+
+def _flight_lease_held(key):
+    _, table = _tables()
+    with _engine().connect() as conn:
+        return conn.execute(select(table.c.id).where(
+            table.c.id == f'flight:{key}', table.c.expires_at > datetime.utcnow())).first() is not None
+
+
+def _drop_flight_lease(key):
+    _, table = _tables()
+    with _engine().begin() as conn:
+        conn.execute(delete(table).where(table.c.id == f'flight:{key}'))
+
+
+def shared_flight(key, call, lookup):
+    """Cross-worker single flight for cacheable calls (database backend only): the first
+    worker runs call(), which must store its result where lookup() finds it; the others
+    poll lookup() until the leader's lease goes away, then run call() themselves if
+    nothing was stored (the leader failed)."""
+    if BACKEND != 'database':
+        return call()
+    try:
+        leader = _take_flight_lease(key)
+    except SQLAlchemyError:
+        stats.incr('db_errors')
+        return call()
+    if leader:
+        try:
+            return call()
+        finally:
+            try:
+                _drop_flight_lease(key)
+            except SQLAlchemyError:
+                stats.incr('db_errors')
+    deadline = time.monotonic() + LEASE_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(FLIGHT_POLL_SECONDS)
+        result = lookup()
+        if result is not None:
+            stats.incr('coalesced_remote')
+            return result
+        if not _flight_lease_held(key):
+            break
+    return lookup() or call()
+
+
+def snapshot():
+    data = stats.snapshot()
+    try:
+        data['in_flight'] = inflight.count
+    except SQLAlchemyError:
+        data['in_flight'] = None
+    data.update(enabled=ENABLED, backend=BACKEND, rate_per_min=RATE_PER_MIN, burst=BURST,
+                max_inflight=MAX_INFLIGHT)
+    return data
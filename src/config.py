@@ -0,0 +1,62 @@
+"""Settings from the environment, with the repository-root `.env` loaded exactly once.
+
+Modules read their settings through these helpers into module-level constants at import
+time, so `.env` must be applied before the first of them runs: importing this module
+does that. Real environment variables take precedence over `.env`. python-dotenv is only
+imported when a `.env` file exists, which keeps it off the serverless cold-start path.
+"""
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ENV_FILE = ROOT / '.env'
+DEFAULT_SQLITE_PATH = ROOT / 'database' / 'app.db'
+
+_TRUE = ('1', 'true', 'yes')
+
+
+def _load_env_file():
+    if ENV_FILE.exists():
+        from dotenv import load_dotenv
+        load_dotenv(ENV_FILE)
+
+
+_load_env_file()
+
+
+def get(name, default=None):
+    return os.getenv(name, default)
+
+
+def get_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in _TRUE
+
+
+def get_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def get_float(name, default):
+    return float(os.getenv(name, default))
+
+
+# API token for the OpenAI-compatible endpoint; both common variable names are accepted
+LLM_TOKEN = get('GITHUB_TOKEN') or get('OPENAI_API_KEY')
+
+
+def database_uri():
+    """DATABASE_URL (Heroku/Vercel/Planetscale style) if set, else MySQL from MYSQL_* vars,
+    else the SQLite file database/app.db in the repository root."""
+    database_url = get('DATABASE_URL')
+    if database_url:
+        return database_url
+    mysql_user, mysql_password, mysql_db = get('MYSQL_USER'), get('MYSQL_PASSWORD'), get('MYSQL_DB')
+    if mysql_user and mysql_password and mysql_db:
+        host, port = get('MYSQL_HOST', 'localhost'), get('MYSQL_PORT', '3306')
+        # pymysql driver
+        return f'mysql+pymysql://{mysql_user}:{mysql_password}@{host}:{port}/{mysql_db}?charset=utf8mb4'
+    DEFAULT_SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    return f'sqlite:///{DEFAULT_SQLITE_PATH}'
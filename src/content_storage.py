@@ -0,0 +1,135 @@
+"""Transparent compression of large note content (SQLite).
+
+With CONTENT_COMPRESSION set, note content of at least CONTENT_COMPRESS_MIN_BYTES is
+stored as a BLOB: one marker byte naming the codec, then the compressed UTF-8 text.
+Smaller content stays plain TEXT. The CompressedText column type does both directions,
+so ORM and Core reads always see text and nothing else changes. Old values are read in
+whatever form they were written, so switching the mode (or the codec) needs no rewrite;
+scripts/migrate_content_storage.py converts existing rows in batches.
+
+Only SQLite compresses: it stores values as they are. Postgres already compresses large
+values itself (TOAST; the migration script can switch the column to lz4), and the
+search vector is computed from the plain column there.
+
+Every note also keeps its first PREFIX_CHARS characters in `content_prefix`, so list
+views and previews never read (or decompress) the full content. SQLite connections get
+a note_plain(content) SQL function that decodes either form, for LIKE searches and,
+while compression is on, the full-text index triggers (only the app's connections have
+it: other clients cannot write notes then, see src/search.py).
+
+Configuration (environment):
+  CONTENT_COMPRESSION         off | zlib | zstd (zstd needs the zstandard package; default off)
+  CONTENT_COMPRESS_MIN_BYTES  smallest UTF-8 content that gets compressed (default 4096)
+  CONTENT_COMPRESS_LEVEL      codec level (default: zlib 6, zstd 3)
+"""
+import logging
+import sqlite3
+import zlib
+
+from sqlalchemy import Text, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+ZLIB = b'\x01'
+ZSTD = b'\x02'
+CODECS = {'zlib': ZLIB, 'zstd': ZSTD}
+PREFIX_CHARS = 200
+
+MODE = config.get('CONTENT_COMPRESSION', 'off').strip().lower()
+MIN_BYTES = config.get_int('CONTENT_COMPRESS_MIN_BYTES', '4096')
+LEVEL = config.get('CONTENT_COMPRESS_LEVEL')
+
+
+def _zstd():
+    try:
+        import zstandard  # optional; only loaded when zstd content is written or read
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _codec():
+    """Marker of the codec new content is written with, or None when compression is off."""
+    if MODE == 'zstd' and _zstd() is None:
+        logger.warning('CONTENT_COMPRESSION=zstd but the zstandard package is missing; using zlib')
+        return ZLIB
+    return CODECS.get(MODE)
+
+
+_write_codec = _codec()
+
+
+def compression_enabled():
+    return _write_codec is not None
+
+
+def compress(text, codec=None):
+    """Stored form of `text`: the text itself, or marker + compressed bytes when it is
+    large enough and compression actually saves space."""
+    codec = codec or _write_codec
+    if codec is None or text is None:
+        return text
+    raw = text.encode('utf-8')
+    if len(raw) < MIN_BYTES:
+        return text
+    if codec == ZSTD:
+        packed = _zstd().ZstdCompressor(level=int(LEVEL or 3)).compress(raw)
+    else:
+        packed = zlib.compress(raw, int(LEVEL or 6))
+    if len(packed) + 1 >= len(raw):
+        return text  # incompressible (already compressed data, tiny gain)
+    return codec + packed
+
+
+def decompress(value):
+    """Text of a stored value in either form."""
+    if not isinstance(value, (bytes, memoryview)):
+        return value
+    value = bytes(value)
+    marker, packed = value[:1], value[1:]
+    if marker == ZLIB:
+        return zlib.decompress(packed).decode('utf-8')
+    if marker == ZSTD:
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError('note content is zstd-compressed; install the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(packed).decode('utf-8')
+    raise ValueError(f'unknown content storage marker {marker!r}')
+
+
+def content_prefix(text):
+    return None if text is None else text[:PREFIX_CHARS]
+
+
+def prefix_default(context):
+    """Column default of note.content_prefix: derived from the inserted content."""
+    return content_prefix(context.get_current_parameters().get('content'))
+
+
+class CompressedText(TypeDecorator):
+    """Text column whose large values are compressed on SQLite (see module docstring)."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != 'sqlite':
+            return value
+        return compress(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress(value)
+
+    def coerce_compared_value(self, op, value):
+        # LIKE patterns and comparisons are bound as plain text, never compressed
+        return Text()
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sql_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('note_plain', 1, decompress, deterministic=True)
@@ -0,0 +1,299 @@
+"""Engine profiles: pool, connect arguments and timeouts per deployment shape.
+
+  serverless  Vercel/Lambda: containers freeze between requests and many run at once, so
+              by default no connections are kept (NullPool; put pgbouncer/Supavisor in
+              front of Postgres). DB_POOL_SIZE > 0 keeps a small pre-pinged pool instead.
+  server      long-running workers: a QueuePool (LIFO, so surplus connections go idle and
+              get recycled), pre-ping, recycle before server-side idle timeouts
+  sqlite      local file, tuned for concurrent serving (SQLITE_TUNED, on by default):
+              - pragmas on connect: journal_mode=WAL (readers never wait for the writer),
+                synchronous=NORMAL, busy_timeout, mmap_size, cache_size
+              - writes: the default engine, whose transactions start with BEGIN IMMEDIATE,
+                so writers queue on SQLite's write lock up front (across processes too)
+                instead of failing with "database is locked" when upgrading a read lock
+              - reads: a pool of read-only connections bound as 'read'; db.session sends
+                SELECTs there (RoutingSession) until the transaction writes, so a request
+                still reads its own uncommitted changes
+              WAL needs a local filesystem; SQLITE_TUNED=0 restores the plain setup.
+
+Every profile uses pool classes that report checkout time (waiting for a free
+connection, or opening one) and new connections to src.metrics.
+
+Configuration (environment):
+  DB_PROFILE               serverless | server | sqlite (default: sqlite for SQLite URLs,
+                           serverless when VERCEL or AWS_LAMBDA_FUNCTION_NAME is set, else server)
+  DB_POOL_SIZE             pooled connections (default: serverless 0 = NullPool, server 10)
+  DB_MAX_OVERFLOW          extra connections under bursts (default: serverless 2, server 20)
+  DB_POOL_TIMEOUT          seconds to wait for a free connection (default: serverless 5, server 10)
+  DB_POOL_RECYCLE          seconds before a connection is replaced (default: serverless 300, server 1800)
+  DB_CONNECT_TIMEOUT       seconds to establish a connection (default: serverless 5, server 10)
+  DB_STATEMENT_TIMEOUT_MS  per-statement limit; Postgres statement_timeout, MySQL
+                           max_execution_time (SELECTs) (default: serverless 10000, server 30000;
+                           0 disables; with pgbouncer in transaction mode set it on the role instead)
+  SQLITE_TUNED             '0' disables the SQLite tuning above (default on)
+  SQLITE_READERS           read-only connections (default 4; 0 sends reads to the writer engine)
+  SQLITE_BUSY_TIMEOUT_MS   how long a writer waits for the write lock (default 5000)
+  SQLITE_MMAP_SIZE         bytes of the database file memory-mapped (default 256 MiB)
+  SQLITE_CACHE_KB          page cache per connection (default 65536)
+"""
+import os
+import re
+import time
+from urllib.parse import quote
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql.expression import Select, TextClause
+
+from src import config, metrics
+
+PROFILES = ('serverless', 'server', 'sqlite')
+APPLICATION_NAME = 'notetaking-app'
+
+_DEFAULTS = {
+    'serverless': {'pool_size': 0, 'max_overflow': 2, 'pool_timeout': 5, 'pool_recycle': 300,
+                   'connect_timeout': 5, 'statement_timeout_ms': 10000},
+    'server': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10, 'pool_recycle': 1800,
+               'connect_timeout': 10, 'statement_timeout_ms': 30000},
+    'sqlite': {'connect_timeout': 30},
+}
+
+SQLITE_TUNED = config.get_bool('SQLITE_TUNED', True)
+SQLITE_READERS = config.get_int('SQLITE_READERS', '4')
+SQLITE_BUSY_TIMEOUT_MS = config.get_int('SQLITE_BUSY_TIMEOUT_MS', '5000')
+SQLITE_MMAP_SIZE = config.get_int('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))
+SQLITE_CACHE_KB = config.get_int('SQLITE_CACHE_KB', '65536')
+READ_BIND = 'read'
+
+
+class _TimedCheckout:
+    """Pool mixin: report how long each checkout took (and whether it timed out), and
+    every new connection."""
+
+    label = 'pool'
+
+    def _create_connection(self):
+        metrics.record_connect(self.label)
+        return super()._create_connection()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            conn = super()._do_get()
+            outcome = 'ok'
+            return conn
+        except PoolTimeout:
+            outcome = 'timeout'
+            raise
+        finally:
+            metrics.record_pool_checkout(self.label, time.perf_counter() - started, outcome)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    label = 'queue'
+
+
+class TimedNullPool(_TimedCheckout, NullPool):
+    label = 'null'
+
+
+class SQLiteWriterPool(TimedQueuePool):
+    label = 'sqlite_writer'
+
+
+class SQLiteReaderPool(TimedQueuePool):
+    label = 'sqlite_reader'
+
+
+def _sqlite_pragmas(dbapi_connection, read_only):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only:
+            # persistent in the file; read-only connections cannot change it
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_KB}')
+        if read_only:
+            cursor.execute('PRAGMA query_only=1')
+    finally:
+        cursor.close()
+
+
+@event.listens_for(SQLiteWriterPool, 'connect')
+def _tune_writer(dbapi_connection, connection_record):
+    _sqlite_pragmas(dbapi_connection, read_only=False)
+
+
+@event.listens_for(SQLiteReaderPool, 'connect')
+def _tune_reader(dbapi_connection, connection_record):
+    _sqlite_pragmas(dbapi_connection, read_only=True)
+
+
+def default_profile(url):
+    if url.get_backend_name() == 'sqlite':
+        return 'sqlite'
+    if config.get('VERCEL') or config.get('AWS_LAMBDA_FUNCTION_NAME'):
+        return 'serverless'
+    return 'server'
+
+
+def _setting(profile, name, env, cast):
+    value = config.get(env)
+    return cast(value) if value is not None else _DEFAULTS[profile][name]
+
+
+def _connect_args(backend, driver, connect_timeout, statement_timeout_ms):
+    if backend == 'postgresql' and driver in ('psycopg2', 'psycopg'):
+        args = {'connect_timeout': connect_timeout, 'application_name': APPLICATION_NAME,
+                # notice dead peers (e.g. after a container thaw) instead of hanging
+                'keepalives': 1, 'keepalives_idle': 30, 'keepalives_interval': 10, 'keepalives_count': 3}
+        if statement_timeout_ms:
+            args['options'] = f'-c statement_timeout={statement_timeout_ms}'
+        return args
+    if backend == 'mysql' and driver == 'pymysql':
+        args = {'connect_timeout': connect_timeout}
+        if statement_timeout_ms:
+            args['init_command'] = f'SET SESSION max_execution_time={statement_timeout_ms}'
+        return args
+    return {}
+
+
+def engine_options(uri, profile=None):
+    """(profile, options for SQLALCHEMY_ENGINE_OPTIONS / create_engine) for `uri`."""
+    url = make_url(uri)
+    profile = profile or config.get('DB_PROFILE') or default_profile(url)
+    if profile not in PROFILES:
+        raise ValueError(f"DB_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+    backend, driver = url.get_backend_name(), url.get_driver_name()
+
+    if backend == 'sqlite':
+        options = {'connect_args': {'timeout': _setting('sqlite', 'connect_timeout', 'DB_CONNECT_TIMEOUT', float),
+                                    'check_same_thread': False}}
+        if _is_sqlite_file(url):
+            options['poolclass'] = TimedQueuePool
+            if SQLITE_TUNED:
+                # pysqlite opens a transaction before the first INSERT/UPDATE/DELETE; make it take
+                # the write lock right away (SELECTs outside a write run without a transaction)
+                options['connect_args']['isolation_level'] = 'IMMEDIATE'
+                # writes are serialized by that lock, not by the pool: a request keeps its writer
+                # connection until teardown and post-commit hooks check out another
+                options['poolclass'] = SQLiteWriterPool
+        return 'sqlite', options
+    if profile == 'sqlite':
+        raise ValueError('DB_PROFILE=sqlite needs a SQLite DATABASE_URL')
+
+    setting = lambda name, env, cast: _setting(profile, name, env, cast)  # noqa: E731
+    pool_size = setting('pool_size', 'DB_POOL_SIZE', int)
+    options = {
+        'connect_args': _connect_args(backend, driver, setting('connect_timeout', 'DB_CONNECT_TIMEOUT', int),
+                                      setting('statement_timeout_ms', 'DB_STATEMENT_TIMEOUT_MS', int)),
+    }
+    if pool_size == 0:
+        options['poolclass'] = TimedNullPool
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=setting('max_overflow', 'DB_MAX_OVERFLOW', int),
+            pool_timeout=setting('pool_timeout', 'DB_POOL_TIMEOUT', float),
+            pool_recycle=setting('pool_recycle', 'DB_POOL_RECYCLE', int),
+            pool_pre_ping=True,
+            pool_use_lifo=True,
+        )
+    return profile, options
+
+
+def pool_status(engine):
+    """{size, checked_out, idle, overflow} of a QueuePool; {} for pools without counters."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {'size': pool.size(), 'checked_out': pool.checkedout(), 'idle': pool.checkedin(),
+            'overflow': max(0, pool.overflow())}
+
+
+def _is_sqlite_file(url):
+    return bool(url.database) and url.database != ':memory:' and not url.query.get('uri')
+
+
+def _sqlite_read_bind(url, app):
+    """Engine options of the read-only bind for the SQLite file behind `url`."""
+    path = url.database
+    if not os.path.isabs(path):
+        # same resolution as Flask-SQLAlchemy applies to the main URL
+        path = os.path.join(app.instance_path, path)
+    return {
+        'url': f'sqlite:///file:{quote(path)}?mode=ro&uri=true',
+        'poolclass': SQLiteReaderPool,
+        'pool_size': SQLITE_READERS,
+        'max_overflow': SQLITE_READERS,
+        'connect_args': {'check_same_thread': False, 'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+
+
+def configure(app):
+    """Apply the engine profile to `app` before db.init_app(); returns the profile name.
+    Tuned SQLite also gets the read-only 'read' bind."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    profile, options = engine_options(uri)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    url = make_url(uri)
+    if profile == 'sqlite' and SQLITE_TUNED and SQLITE_READERS > 0 and _is_sqlite_file(url):
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds[READ_BIND] = _sqlite_read_bind(url, app)
+    return profile
+
+
+def prepare(app):
+    """With a read bind, open one writer connection first: it creates a new database file,
+    switches it to WAL and, by staying in the pool, keeps the -wal/-shm files that
+    read-only connections cannot create themselves."""
+    if READ_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+        from src.models.user import db
+        with app.app_context(), db.engine.connect():
+            pass
+
+
+def read_engine():
+    """Engine for read-only Core queries: the SQLite read pool when configured, else db.engine."""
+    from src.models.user import db
+    return db.engines.get(READ_BIND) or db.engine
+
+
+_READ_SQL = re.compile(r'\s*(select|with)\b', re.I)
+_WROTE = 'db_engine_wrote'
+
+
+def _is_read(clause):
+    if isinstance(clause, Select):
+        return clause._for_update_arg is None
+    if isinstance(clause, TextClause):
+        return bool(_READ_SQL.match(clause.text))
+    return False
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads to the 'read' bind when one exists.
+    Flushes and other statements go to the writer; after the first of them the rest of
+    the transaction stays on the writer, so it sees its own changes."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            reader = self._db.engines.get(READ_BIND)
+            if reader is not None:
+                if not self._flushing and not self.info.get(_WROTE) and _is_read(clause):
+                    return reader
+                self.info[_WROTE] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _reset_routing(session):
+    session.info.pop(_WROTE, None)
@@ -0,0 +1,396 @@
+"""Semantic note search: note embeddings plus an in-memory NumPy index.
+
+Each note's title + content is embedded once per content hash and stored in the
+`note_embedding` table. Every worker keeps the vectors of the active embedder in one
+float32 matrix (rows L2-normalized), so a query is a single matrix-vector product
+followed by a top-k partition. The matrix follows the table incrementally: new or
+re-embedded rows are fetched by updated_at, and a row-count mismatch (deleted notes)
+triggers a full reload.
+
+Embeddings are computed after commit on the job queue ('embed_note' jobs keyed by note
+id and version, one job for all notes of a batch or import chunk); the job skips notes
+whose content hash has not changed.
+
+Embedders are pluggable (register_embedder); EMBEDDINGS_PROVIDER picks one:
+  hashing   deterministic, offline signed feature hashing (tests, no API token)
+  openai    the OpenAI-compatible embeddings endpoint (EMBEDDINGS_MODEL)
+Default: 'openai' when an API token is configured, otherwise 'hashing'.
+
+Configuration (environment):
+  EMBEDDINGS_PROVIDER   see above
+  EMBEDDINGS_MODEL      model for the openai provider (default openai/text-embedding-3-small)
+  EMBEDDINGS_DIM        vector size of the hashing embedder (default 256)
+  EMBEDDINGS_ASYNC      '0' embeds in the saving request instead of on the job queue
+"""
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from src import config, note_events
+from src.db_engine import read_engine
+
+logger = logging.getLogger(__name__)
+
+PROVIDER = config.get('EMBEDDINGS_PROVIDER')  # None: chosen on first use, see get_embedder()
+MODEL = config.get('EMBEDDINGS_MODEL', 'openai/text-embedding-3-small')
+HASHING_DIM = config.get_int('EMBEDDINGS_DIM', '256')
+ASYNC = config.get_bool('EMBEDDINGS_ASYNC', True)
+# characters of title + content sent to the embedder
+MAX_CHARS = 8000
+# texts per embedder call when several notes are embedded together
+EMBED_BATCH = 100
+MAX_RESULTS = 50
+# refreshes re-read rows this far behind the newest one seen, for writers that commit late
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def _np():
+    import numpy as np  # heavy; only loaded once semantic search is used
+    return np
+
+
+def _default_provider():
+    return 'openai' if config.LLM_TOKEN else 'hashing'
+
+
+def note_text(title, content):
+    return f'{title or ""}\n\n{content or ""}'[:MAX_CHARS]
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _normalize(matrix):
+    np = _np()
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _is_cjk(ch):
+    return '぀' <= ch <= 'ヿ' or '㐀' <= ch <= '鿿' or '가' <= ch <= '힯'
+
+
+class HashingEmbedder:
+    """Deterministic offline embedder: signed hashing of words and character n-grams
+    (trigrams for alphabetic words, unigrams and bigrams for CJK runs) into `dim` buckets.
+    It only captures surface overlap, but needs no network and is stable across runs.
+    """
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    @staticmethod
+    def _features(text):
+        text = unicodedata.normalize('NFKC', text).lower()
+        for token in _TOKEN.findall(text):
+            if any(_is_cjk(ch) for ch in token):
+                for i, ch in enumerate(token):
+                    yield ch
+                    if i + 1 < len(token):
+                        yield token[i:i + 2]
+            else:
+                yield 'w:' + token
+                padded = f'#{token}#'
+                for i in range(len(padded) - 2):
+                    yield padded[i:i + 3]
+
+    def embed(self, texts):
+        np = _np()
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+                matrix[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        return _normalize(matrix)
+
+
+class OpenAIEmbedder:
+    """Embeddings from the configured OpenAI-compatible endpoint (shares the LLM client and slots)."""
+
+    def __init__(self, model=MODEL):
+        self.model = model
+        self.name = model
+
+    def embed(self, texts):
+        from src.llm import embed_texts
+        np = _np()
+        return _normalize(np.asarray(embed_texts(self.model, texts), dtype=np.float32))
+
+
+_factories = {'hashing': HashingEmbedder, 'openai': OpenAIEmbedder}
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def register_embedder(name, factory):
+    """Make factory() -> embedder (with .name and .embed(texts) -> normalized float32 matrix)
+    selectable as EMBEDDINGS_PROVIDER=name."""
+    _factories[name] = factory
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                provider = PROVIDER or _default_provider()
+                if provider not in _factories:
+                    raise ValueError(f'Unknown EMBEDDINGS_PROVIDER {provider!r}')
+                _embedder = _factories[provider]()
+    return _embedder
+
+
+def set_embedder(embedder):
+    """Swap the active embedder (tests, benchmarks); the index reloads for it on next use."""
+    global _embedder
+    with _embedder_lock:
+        _embedder = embedder
+    _query_vector.cache_clear()
+    index.clear()
+
+
+def _table():
+    from src.models.embedding import NoteEmbedding
+    return NoteEmbedding.__table__
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+class VectorIndex:
+    """Memory-resident matrix of one embedder's vectors, kept in step with the table."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.model = None
+        self._reset()
+
+    def _reset(self):
+        self.ids = []
+        self._pos = {}
+        self.matrix = None
+        self.loaded_through = None
+
+    def clear(self):
+        with self._lock:
+            self.model = None
+            self._reset()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load_rows(self, rows, dim):
+        np = _np()
+        new_ids, new_vectors = [], []
+        for row in rows:
+            vec = np.frombuffer(row.vector, dtype=np.float32)
+            if vec.shape[0] != dim:
+                continue
+            pos = self._pos.get(row.note_id)
+            if pos is None:
+                self._pos[row.note_id] = len(self.ids) + len(new_ids)
+                new_ids.append(row.note_id)
+                new_vectors.append(vec)
+            else:
+                self.matrix[pos] = vec
+            if self.loaded_through is None or row.updated_at > self.loaded_through:
+                self.loaded_through = row.updated_at
+        if new_vectors:
+            block = np.vstack(new_vectors)
+            self.matrix = block if self.matrix is None else np.vstack([self.matrix, block])
+            self.ids.extend(new_ids)
+
+    def refresh(self, model, dim):
+        """Pull rows written since the last refresh (by any worker); reload on deletions."""
+        table = _table()
+        with read_engine().connect() as conn:
+            count, latest = conn.execute(
+                select(func.count(), func.max(table.c.updated_at)).where(table.c.model == model)
+            ).one()
+            with self._lock:
+                if self.model != model:
+                    self._reset()
+                    self.model = model
+                if latest is not None and (self.loaded_through is None or latest > self.loaded_through):
+                    stmt = select(table.c.note_id, table.c.vector, table.c.updated_at).where(table.c.model == model)
+                    if self.loaded_through is not None:
+                        stmt = stmt.where(table.c.updated_at > self.loaded_through - REFRESH_OVERLAP)
+                    self._load_rows(conn.execute(stmt), dim)
+                if count != len(self.ids):
+                    # rows were deleted elsewhere: start over
+                    self._reset()
+                    stmt = select(table.c.note_id, table.c.vector, table.c.updated_at).where(table.c.model == model)
+                    self._load_rows(conn.execute(stmt), dim)
+
+    def remove(self, note_ids):
+        np = _np()
+        with self._lock:
+            keep = [i for i, note_id in enumerate(self.ids) if note_id not in note_ids]
+            if len(keep) == len(self.ids):
+                return
+            self.ids = [self.ids[i] for i in keep]
+            self._pos = {note_id: i for i, note_id in enumerate(self.ids)}
+            self.matrix = self.matrix[np.asarray(keep, dtype=np.intp)] if keep else None
+
+    def top_k(self, query_vector, k, note_ids=None):
+        """[(note_id, score)] of the k most similar notes (among `note_ids`, if given), best first."""
+        np = _np()
+        with self._lock:
+            if self.matrix is None or not self.ids:
+                return []
+            if note_ids is None:
+                scores = self.matrix @ query_vector
+                ids = self.ids
+            else:
+                ids = [i for i in note_ids if i in self._pos]
+                if not ids:
+                    return []
+                # only the candidates' rows: cost follows their number, not the index size
+                scores = self.matrix[np.asarray([self._pos[i] for i in ids], dtype=np.intp)] @ query_vector
+        k = min(k, len(ids))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(ids[i], float(scores[i])) for i in best]
+
+
+index = VectorIndex()
+
+
+@lru_cache(maxsize=256)
+def _query_vector(model, query):
+    return get_embedder().embed([query])[0]
+
+
+def _user_note_ids(user_id):
+    from src.models.note import Note
+    note_table = Note.__table__
+    with read_engine().connect() as conn:
+        return conn.execute(select(note_table.c.id).where(note_table.c.user_id == user_id)).scalars().all()
+
+
+def search(query, limit=10, user_id=None):
+    """[(note_id, score)] for the notes (of `user_id`, if given) closest in meaning to `query`."""
+    embedder = get_embedder()
+    vector = _query_vector(embedder.name, query)
+    index.refresh(embedder.name, vector.shape[0])
+    candidates = None if user_id is None else _user_note_ids(user_id)
+    return [(note_id, score) for note_id, score in index.top_k(vector, limit, candidates) if score > 0]
+
+
+def embed_notes(note_ids):
+    """(Re)compute the embeddings of the notes whose text changed, EMBED_BATCH texts per
+    embedder call. Returns {'embedded': n, 'unchanged': n, 'missing': n}."""
+    from src.models.note import Note
+    embedder = get_embedder()
+    table = _table()
+    note_table = Note.__table__
+    ids = sorted(set(note_ids))
+    with _engine().connect() as conn:
+        notes = conn.execute(
+            select(note_table.c.id, note_table.c.title, note_table.c.content).where(note_table.c.id.in_(ids))
+        ).all()
+        current = {r.note_id: r for r in conn.execute(
+            select(table.c.note_id, table.c.model, table.c.content_hash).where(table.c.note_id.in_(ids))
+        )}
+    counts = {'embedded': 0, 'unchanged': 0, 'missing': len(ids) - len(notes)}
+    stale = []
+    for note in notes:
+        text = note_text(note.title, note.content)
+        digest = content_hash(text)
+        row = current.get(note.id)
+        if row is not None and row.model == embedder.name and row.content_hash == digest:
+            counts['unchanged'] += 1
+        else:
+            stale.append((note.id, text, digest))
+    for offset in range(0, len(stale), EMBED_BATCH):
+        part = stale[offset:offset + EMBED_BATCH]
+        vectors = embedder.embed([text for _, text, _ in part])
+        for (note_id, _, digest), vector in zip(part, vectors):
+            _store(table, note_id, dict(model=embedder.name, dim=int(vector.shape[0]), content_hash=digest,
+                                        vector=vector.tobytes(), updated_at=datetime.utcnow()))
+        counts['embedded'] += len(part)
+    return counts
+
+
+def embed_note(note_id):
+    """(Re)compute one note's embedding if its text changed. Returns 'embedded', 'unchanged' or 'missing'."""
+    counts = embed_notes([note_id])
+    return next(outcome for outcome, n in counts.items() if n)
+
+
+def _store(table, note_id, values):
+    update = table.update().where(table.c.note_id == note_id).values(**values)
+    try:
+        with _engine().begin() as conn:
+            # update first: a job for an older version of the note may have inserted the row meanwhile
+            if conn.execute(update).rowcount == 0:
+                conn.execute(table.insert().values(note_id=note_id, **values))
+    except IntegrityError:
+        # another job inserted it between our update and insert (Postgres/MySQL; SQLite's
+        # BEGIN IMMEDIATE serializes the two): the row exists now
+        with _engine().begin() as conn:
+            conn.execute(update)
+
+
+def delete_embeddings(note_ids):
+    table = _table()
+    with _engine().begin() as conn:
+        conn.execute(table.delete().where(table.c.note_id.in_(list(note_ids))))
+    index.remove(set(note_ids))
+
+
+def run_embed_job(payload):
+    """Job handler for 'embed_note': one note, or several saved together ('note_ids')."""
+    if 'note_ids' in payload:
+        return {'note_ids': payload['note_ids'], 'result': embed_notes(payload['note_ids'])}, 200
+    return {'note_id': payload['note_id'], 'result': embed_note(payload['note_id'])}, 200
+
+
+@note_events.on_saved
+def _schedule(versions):
+    """Queue an embedding refresh for the saved notes: one job per save, keyed by the ids
+    and versions so repeats dedupe (a batch or import chunk is one job, not hundreds)."""
+    if not ASYNC:
+        embed_notes(versions)
+        return
+    from flask import current_app
+    from src import jobs
+    jobs.ensure_workers(current_app._get_current_object())
+    if len(versions) == 1:
+        [(note_id, version)] = versions.items()
+        payload = {'note_id': note_id, 'version': version}
+    else:
+        ids = sorted(versions)
+        payload = {'note_ids': ids, 'versions': [versions[i] for i in ids]}
+    try:
+        jobs.enqueue('embed_note', payload)
+    except jobs.QueueFull:
+        logger.warning('Job queue full; notes %s will be embedded by the next save or backfill', sorted(versions))
+
+
+@note_events.on_deleted
+def _forget(note_ids):
+    delete_embeddings(note_ids)
+
+
+def _register_jobs():
+    from src import jobs
+    jobs.register('embed_note', run_embed_job)
+
+
+_register_jobs()
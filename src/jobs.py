@@ -0,0 +1,355 @@
+"""Database-backed job queue for slow AI work.
+
+Requests enqueue a job row and return immediately; a pool of worker threads (in the
+web process, or in a separate process via scripts/run_job_worker.py) claims queued
+rows with a conditional UPDATE, runs the registered handler and stores its response.
+The queue lives in the `ai_job` table, so no Redis or broker is needed.
+
+enqueue(..., debounce=seconds) delays a job; enqueueing the same job again while it
+waits pushes it back, so a burst of triggers (autosaves) runs it once, after the last.
+
+Configuration (environment):
+  JOBS_WORKERS           worker threads per process (default 2)
+  JOBS_INPROCESS         '0' = the web process only enqueues; run scripts/run_job_worker.py
+  JOBS_MAX_QUEUE         queued jobs allowed before enqueue is refused with 429 (default 100)
+  JOBS_POLL_INTERVAL     seconds between queue polls when idle (default 0.5)
+  JOBS_DEDUPE_SECONDS    finished jobs are reused for identical requests this long (default 600)
+  JOBS_STALE_SECONDS     running jobs older than this are requeued (worker died; checked this
+                         often; default 300)
+  JOBS_RETENTION_SECONDS finished jobs are deleted this long after finishing (hourly, by the
+                         workers; default 86400, at least JOBS_DEDUPE_SECONDS)
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select, update
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+WORKERS = config.get_int('JOBS_WORKERS', '2')
+IN_PROCESS = config.get_bool('JOBS_INPROCESS', True)
+MAX_QUEUE = config.get_int('JOBS_MAX_QUEUE', '100')
+POLL_INTERVAL = config.get_float('JOBS_POLL_INTERVAL', '0.5')
+DEDUPE_SECONDS = config.get_int('JOBS_DEDUPE_SECONDS', '600')
+STALE_SECONDS = config.get_int('JOBS_STALE_SECONDS', '300')
+# finished jobs must outlive the dedupe window, or identical requests would not find them
+RETENTION_SECONDS = max(DEDUPE_SECONDS, config.get_int('JOBS_RETENTION_SECONDS', '86400'))
+MAX_ATTEMPTS = 3
+PURGE_BATCH = 500
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class QueueFull(Exception):
+    """The queue already holds MAX_QUEUE jobs."""
+
+
+_handlers = {}
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_next_sweep = 0.0
+_next_purge = 0.0
+
+
+def register(kind, handler):
+    """Register handler(payload) -> (body, status[, headers]) for a job kind."""
+    _handlers[kind] = handler
+
+
+class LatencyStats:
+    """Count/mean/max and recent percentiles of queue wait and run time, per job kind."""
+
+    WINDOW = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._totals = {}
+
+    def record(self, kind, queue_ms, run_ms, ok):
+        with self._lock:
+            samples = self._samples.setdefault(kind, {'queue_ms': deque(maxlen=self.WINDOW),
+                                                      'run_ms': deque(maxlen=self.WINDOW)})
+            samples['queue_ms'].append(queue_ms)
+            samples['run_ms'].append(run_ms)
+            totals = self._totals.setdefault(kind, {'completed': 0, 'failed': 0})
+            totals['completed' if ok else 'failed'] += 1
+
+    @staticmethod
+    def _summary(values):
+        if not values:
+            return None
+        ordered = sorted(values)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {'count': len(ordered), 'mean': round(sum(ordered) / len(ordered), 1),
+                'p50': pick(0.50), 'p95': pick(0.95), 'max': ordered[-1]}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                kind: dict(self._totals[kind],
+                           queue_ms=self._summary(list(s['queue_ms'])),
+                           run_ms=self._summary(list(s['run_ms'])))
+                for kind, s in self._samples.items()
+            }
+
+
+latency = LatencyStats()
+
+
+def _table():
+    from src.models.job import AIJob
+    return AIJob.__table__
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+def dedupe_key(kind, payload):
+    raw = json.dumps({'kind': kind, 'payload': payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_job(job_id):
+    table = _table()
+    with _engine().connect() as conn:
+        return conn.execute(select(table).where(table.c.id == job_id)).first()
+
+
+def enqueue(kind, payload, debounce=None):
+    """Queue a job, or return an identical pending/recent one. Returns (row, created).
+    With `debounce` seconds the job waits that long; an identical job still waiting is
+    postponed instead (a running or finished one does not count: the new trigger may
+    have changed what it would do)."""
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    if debounce is not None:
+        return _enqueue_debounced(kind, payload, debounce)
+    table = _table()
+    key = dedupe_key(kind, payload)
+    now = datetime.utcnow()
+    with _engine().begin() as conn:
+        existing = conn.execute(
+            select(table).where(
+                table.c.dedupe_key == key,
+                or_(
+                    table.c.status.in_(('queued', 'running')),
+                    and_(table.c.status == 'done', table.c.finished_at >= now - timedelta(seconds=DEDUPE_SECONDS)),
+                ),
+            ).order_by(table.c.created_at.desc()).limit(1)
+        ).first()
+        if existing is not None:
+            return existing, False
+        row = _insert(conn, kind, payload, key, now)
+    _wakeup.set()
+    return row, True
+
+
+def _insert(conn, kind, payload, key, now, run_after=None):
+    table = _table()
+    depth = conn.execute(select(func.count()).select_from(table).where(table.c.status == 'queued')).scalar()
+    if depth >= MAX_QUEUE:
+        raise QueueFull(f'{depth} jobs queued (limit {MAX_QUEUE})')
+    job_id = uuid.uuid4().hex
+    conn.execute(table.insert().values(
+        id=job_id, kind=kind, payload=json.dumps(payload, ensure_ascii=False),
+        dedupe_key=key, status='queued', attempts=0, created_at=now, run_after=run_after,
+    ))
+    return conn.execute(select(table).where(table.c.id == job_id)).first()
+
+
+def _enqueue_debounced(kind, payload, debounce):
+    table = _table()
+    key = dedupe_key(kind, payload)
+    now = datetime.utcnow()
+    run_after = now + timedelta(seconds=debounce)
+    with _engine().begin() as conn:
+        waiting = conn.execute(
+            select(table.c.id).where(table.c.dedupe_key == key, table.c.status == 'queued')
+            .order_by(table.c.created_at.desc()).limit(1)
+        ).scalar()
+        # conditional: a worker may claim it in between, then a new job is needed after all
+        if waiting is not None and conn.execute(
+            update(table).where(table.c.id == waiting, table.c.status == 'queued').values(run_after=run_after)
+        ).rowcount:
+            return conn.execute(select(table).where(table.c.id == waiting)).first(), False
+        return _insert(conn, kind, payload, key, now, run_after), True
+
+
+def _requeue_stale():
+    """Jobs left running by a dead worker go back to the queue, up to MAX_ATTEMPTS tries.
+    Runs at most once per STALE_SECONDS per process, and only writes when it finds some."""
+    global _next_sweep
+    if time.monotonic() < _next_sweep:
+        return
+    _next_sweep = time.monotonic() + STALE_SECONDS
+    table = _table()
+    now = datetime.utcnow()
+    stale = and_(table.c.status == 'running', table.c.started_at < now - timedelta(seconds=STALE_SECONDS))
+    with _engine().connect() as conn:
+        if conn.execute(select(table.c.id).where(stale).limit(1)).first() is None:
+            return
+    with _engine().begin() as conn:
+        conn.execute(update(table).where(stale, table.c.attempts < MAX_ATTEMPTS).values(status='queued', worker=None))
+        conn.execute(update(table).where(stale, table.c.attempts >= MAX_ATTEMPTS).values(
+            status='failed', http_status=500, finished_at=now,
+            result=json.dumps({'error': 'Job failed', 'detail': f'worker lost {MAX_ATTEMPTS} times'}),
+        ))
+
+
+def purge_finished(retention_seconds=None, batch_size=PURGE_BATCH):
+    """Delete done and failed jobs that finished more than the retention ago, in batches
+    of `batch_size` (one short transaction each). Returns the number deleted."""
+    table = _table()
+    retention = RETENTION_SECONDS if retention_seconds is None else retention_seconds
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    old = select(table.c.id).where(
+        table.c.status.in_(('done', 'failed')), table.c.finished_at < cutoff
+    ).order_by(table.c.finished_at).limit(batch_size)
+    deleted = 0
+    while True:
+        with _engine().connect() as conn:
+            ids = conn.execute(old).scalars().all()
+        if ids:
+            with _engine().begin() as conn:
+                conn.execute(table.delete().where(table.c.id.in_(ids)))
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+
+
+def _purge_due():
+    global _next_purge
+    if time.monotonic() < _next_purge:
+        return
+    _next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+    deleted = purge_finished()
+    if deleted:
+        logger.info('Purged %d finished jobs', deleted)
+
+
+def claim_next(worker_name):
+    """Atomically take the oldest queued job. Returns the claimed row or None.
+    An idle poll only reads: the write transaction (the SQLite write lock) is taken
+    when a due job was found."""
+    _requeue_stale()
+    _purge_due()
+    table = _table()
+    due = or_(table.c.run_after.is_(None), table.c.run_after <= datetime.utcnow())
+    with _engine().connect() as conn:
+        candidates = conn.execute(
+            select(table.c.id).where(table.c.status == 'queued', due).order_by(table.c.created_at).limit(5)
+        ).scalars().all()
+    if not candidates:
+        return None
+    with _engine().begin() as conn:
+        for job_id in candidates:
+            # only one worker can flip a given row from queued to running
+            claimed = conn.execute(
+                update(table)
+                .where(table.c.id == job_id, table.c.status == 'queued')
+                .values(status='running', started_at=datetime.utcnow(), worker=worker_name,
+                        attempts=table.c.attempts + 1)
+            ).rowcount
+            if claimed:
+                return conn.execute(select(table).where(table.c.id == job_id)).first()
+    return None
+
+
+def _finish(job_id, body, status):
+    table = _table()
+    with _engine().begin() as conn:
+        conn.execute(update(table).where(table.c.id == job_id).values(
+            status='done' if status < 400 else 'failed',
+            result=json.dumps(body, ensure_ascii=False),
+            http_status=status,
+            finished_at=datetime.utcnow(),
+        ))
+
+
+def run_job(row):
+    """Execute one claimed job and store its outcome."""
+    handler = _handlers.get(row.kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise ValueError(f'No handler registered for job kind {row.kind!r}')
+        outcome = handler(json.loads(row.payload))
+        body, status = outcome[0], outcome[1]
+    except Exception as e:
+        logger.exception('Job %s (%s) crashed', row.id, row.kind)
+        body, status = {'error': 'Job failed', 'detail': str(e)}, 500
+    _finish(row.id, body, status)
+    run_ms = (time.perf_counter() - started) * 1000
+    # a debounced job only starts waiting for a worker once it is due
+    due_at = row.run_after or row.created_at
+    queue_ms = max(0.0, (row.started_at - due_at).total_seconds() * 1000) if row.started_at else 0.0
+    latency.record(row.kind, round(queue_ms, 1), round(run_ms, 1), status < 400)
+
+
+def _worker_loop(app, name, stop):
+    from src.models.user import db
+    while not stop.is_set():
+        try:
+            with app.app_context():
+                row = claim_next(name)
+                if row is not None:
+                    try:
+                        run_job(row)
+                    finally:
+                        db.session.remove()
+                    continue
+        except Exception:
+            logger.exception('Job worker %s failed to poll the queue', name)
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(app, count=None, stop=None):
+    """Start worker threads for this process (once). Returns the stop event."""
+    stop = stop or threading.Event()
+    with _workers_lock:
+        if _workers:
+            return stop
+        prefix = f'{socket.gethostname()}-{os.getpid()}'
+        for i in range(count or WORKERS):
+            t = threading.Thread(target=_worker_loop, args=(app, f'{prefix}-{i}', stop),
+                                 name=f'job-worker-{i}', daemon=True)
+            t.start()
+            _workers.append(t)
+    return stop
+
+
+def ensure_workers(app):
+    """Start in-process workers on first use unless a separate worker process is configured."""
+    if IN_PROCESS and not _workers:
+        start_workers(app)
+
+
+def queue_depth():
+    table = _table()
+    with _engine().connect() as conn:
+        rows = conn.execute(select(table.c.status, func.count()).group_by(table.c.status)).all()
+    return {status: count for status, count in rows}
+
+
+def metrics():
+    return {
+        'depth': queue_depth(),
+        'max_queue': MAX_QUEUE,
+        'workers': len(_workers),
+        'in_process': IN_PROCESS,
+        'latency': latency.snapshot(),
+    }
@@ -1,36 +1,199 @@
-import os
-from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI
-
-# 尝试在项目根加载 .env（确保无论 cwd 在哪都能找到）
-ROOT = Path(__file__).resolve().parent.parent
-env_path = ROOT / '.env'
-if env_path.exists():
-    load_dotenv(dotenv_path=str(env_path))
-else:
-    # 仍然尝试默认位置
-    load_dotenv()
-
-# 优先兼容两个常见变量名
-token = os.getenv("GITHUB_TOKEN") or os.getenv("OPENAI_API_KEY")
+import logging
+import random
+import threading
+import time
+
+from src import admission, config, metrics
+
+logger = logging.getLogger(__name__)
+
+# openai and httpx are imported in get_client(): together they take ~0.35s to import,
+# which every cold start would otherwise pay before serving a single request
+
+token = config.LLM_TOKEN
 if not token:
-    print("Missing API token. Set GITHUB_TOKEN or OPENAI_API_KEY in your environment or create a .env in project root.")
-    raise SystemExit(1)
+    # don't take the whole app down; AI endpoints report the problem when called
+    logger.warning("Missing API token. Set GITHUB_TOKEN or OPENAI_API_KEY in your environment or create a .env in project root.")
 
-endpoint = "https://models.github.ai/inference"
+endpoint = config.get("LLM_ENDPOINT", "https://models.github.ai/inference")
 model = "openai/gpt-4.1-mini"
 
+# Upstream connection settings (seconds unless noted)
+CONNECT_TIMEOUT = config.get_float("LLM_CONNECT_TIMEOUT", "5")
+READ_TIMEOUT = config.get_float("LLM_READ_TIMEOUT", "60")
+MAX_RETRIES = config.get_int("LLM_MAX_RETRIES", "3")
+BACKOFF_BASE = config.get_float("LLM_BACKOFF_BASE", "0.5")
+BACKOFF_MAX = config.get_float("LLM_BACKOFF_MAX", "8")
+# in-flight upstream calls allowed per worker process, and how long to wait for a slot
+MAX_CONCURRENCY = config.get_int("LLM_MAX_CONCURRENCY", "8")
+SLOT_TIMEOUT = config.get_float("LLM_SLOT_TIMEOUT", "30")
+
+
+class LLMConfigError(RuntimeError):
+    """No API token is configured."""
+
+
+class LLMBusyError(RuntimeError):
+    """Every upstream slot stayed taken for SLOT_TIMEOUT seconds."""
+
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+
+def get_client():
+    """Process-wide OpenAI client; its HTTP pool keeps connections (and TLS sessions) alive."""
+    global _client
+    if _client is None:
+        if not token:
+            raise LLMConfigError("Missing API token. Set GITHUB_TOKEN or OPENAI_API_KEY.")
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+                http_client = httpx.Client(
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONCURRENCY * 2,
+                        max_keepalive_connections=MAX_CONCURRENCY,
+                        keepalive_expiry=60,
+                    ),
+                )
+                # retries are handled here (see _with_retries) so they respect the slot limit
+                _client = OpenAI(base_url=endpoint, api_key=token, http_client=http_client, max_retries=0)
+    return _client
+
+
+def _status_code(exc):
+    return getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+
+
+def _is_retryable(exc):
+    from openai import APIConnectionError, APITimeoutError
+    if isinstance(exc, (APIConnectionError, APITimeoutError)):
+        return True
+    status = _status_code(exc)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def _retry_after(exc):
+    response = getattr(exc, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(value), BACKOFF_MAX) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _backoff(attempt):
+    # exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _with_retries(send, keep_slot=False):
+    """Run send() inside an upstream slot, retrying 429/5xx/connection errors.
+    With keep_slot=True the slot stays taken after a successful send(); the caller releases it.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if not _slots.acquire(timeout=SLOT_TIMEOUT):
+            raise LLMBusyError(f"No free LLM slot after {SLOT_TIMEOUT:.0f}s ({MAX_CONCURRENCY} calls in flight)")
+        release = True
+        try:
+            result = send()
+            release = not keep_slot
+            return result
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = max(_backoff(attempt), _retry_after(e))
+            metrics.record_llm_retry(str(_status_code(e) or type(e).__name__))
+            logger.warning("LLM call failed (%s), retry %d/%d in %.2fs", e, attempt + 1, MAX_RETRIES, delay)
+        finally:
+            if release:
+                _slots.release()
+        # sleep outside the slot so waiting retries don't block other callers
+        time.sleep(delay)
+
+
 # A function to call an LLM model and return the response
-def call_llm_model(model_name, messages, temperature=1.0, top_p=1.0):
-    client = OpenAI(base_url=endpoint, api_key=token)
-    response = client.chat.completions.create(
-        messages=messages,
-        temperature=temperature,
-        top_p=top_p,
-        model=model_name
-    )
+def call_llm_model(model_name, messages, temperature=1.0, top_p=1.0, **params):
+    """Concurrent identical calls (double-clicks, client retries) share one upstream request."""
+    key = admission.flight_key(model_name, messages, temperature=temperature, top_p=top_p, **params)
+    return admission.single_flight(key, lambda: _call_llm_model(model_name, messages, temperature, top_p, **params))
+
+
+def _call_llm_model(model_name, messages, temperature, top_p, **params):
+    client = get_client()
+    started = time.perf_counter()
+    try:
+        response = _with_retries(lambda: client.chat.completions.create(
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            model=model_name,
+            **params
+        ))
+    except Exception:
+        metrics.record_llm_call('chat', model_name, time.perf_counter() - started, outcome='error')
+        raise
+    metrics.record_llm_call('chat', model_name, time.perf_counter() - started, usage=response.usage)
     return response.choices[0].message.content
 
+
+def embed_texts(model_name, texts):
+    """Embedding vectors (lists of floats) for `texts`, in input order."""
+    client = get_client()
+    started = time.perf_counter()
+    try:
+        response = _with_retries(lambda: client.embeddings.create(model=model_name, input=list(texts)))
+    except Exception:
+        metrics.record_llm_call('embedding', model_name, time.perf_counter() - started, outcome='error')
+        raise
+    metrics.record_llm_call('embedding', model_name, time.perf_counter() - started, usage=response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def stream_llm_model(model_name, messages, temperature=1.0, top_p=1.0, **params):
+    """Yield completion text as the model produces it (OpenAI stream=True).
+    Only opening the stream is retried. The upstream slot is held until the stream ends;
+    closing the generator early (e.g. the HTTP client went away) aborts the upstream request.
+    """
+    client = get_client()
+    started = time.perf_counter()
+    try:
+        stream = _with_retries(lambda: client.chat.completions.create(
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            model=model_name,
+            stream=True,
+            **params
+        ), keep_slot=True)
+    except Exception:
+        metrics.record_llm_call('stream', model_name, time.perf_counter() - started, outcome='error')
+        raise
+    outcome, first = 'cancelled', True
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first:
+                    metrics.record_first_token(model_name, time.perf_counter() - started)
+                    first = False
+                yield delta
+        outcome = 'ok'
+    except GeneratorExit:
+        raise
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        stream.close()
+        _slots.release()
+        metrics.record_llm_call('stream', model_name, time.perf_counter() - started, outcome=outcome)
+
 if __name__ == "__main__":
-    print("LLM module loaded. Token present:", "yes")
\ No newline at end of file
+    print("LLM module loaded. Token present:", "yes" if token else "no")
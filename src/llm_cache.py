@@ -0,0 +1,250 @@
+"""Content-addressed cache for LLM completions.
+
+Two tiers, both keyed on sha256(model, messages, temperature, top_p):
+  - an in-process LRU with a size cap and TTL, for repeats within one worker
+  - the `llm_cache` table, shared by all workers and surviving restarts / cold starts;
+    lookups only read it, its per-entry `hits` are added in batches
+
+Configuration (environment):
+  LLM_CACHE_ENABLED      '0' disables caching entirely (default on)
+  LLM_CACHE_MAX_ENTRIES  in-process LRU size (default 512)
+  LLM_CACHE_TTL          seconds an entry stays valid in either tier (default 7 days)
+  LLM_CACHE_DB           '0' turns off the database tier (default on)
+"""
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from src import config
+from src.db_engine import read_engine
+
+logger = logging.getLogger(__name__)
+
+
+ENABLED = config.get_bool('LLM_CACHE_ENABLED', True)
+MAX_ENTRIES = config.get_int('LLM_CACHE_MAX_ENTRIES', '512')
+TTL_SECONDS = config.get_int('LLM_CACHE_TTL', str(7 * 24 * 3600))
+DB_TIER = config.get_bool('LLM_CACHE_DB', True)
+# expired rows are purged from the table every this many writes
+PURGE_EVERY = 200
+# database hits are counted in memory and added to `hits` with the next write, or after
+# this many (a cache lookup must not take the write lock; SQLite has only one)
+HIT_FLUSH_EVERY = 50
+
+
+class Stats:
+    """Thread-safe counters for both tiers."""
+
+    FIELDS = ('memory_hits', 'db_hits', 'misses', 'stores', 'evictions', 'expirations', 'db_errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class LRUCache:
+    """Bounded in-process LRU whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl, stats):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = stats
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                self.stats.incr('expirations')
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+stats = Stats()
+memory = LRUCache(MAX_ENTRIES, TTL_SECONDS, stats)
+_writes = itertools.count(1)
+_pending_hits = {}
+_hits_lock = threading.Lock()
+
+
+def cache_key(model_name, messages, temperature=1.0, top_p=1.0, **params):
+    """Extra request params (e.g. response_format) are part of the key when given."""
+    fields = {'model': model_name, 'messages': messages, 'temperature': temperature, 'top_p': top_p}
+    if params:
+        fields['params'] = params
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _table():
+    from src.models.llm_cache import LLMCacheEntry
+    return LLMCacheEntry.__table__
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+def _db_get(key):
+    """A read only: the hit is counted in memory and written later by _flush_hits()."""
+    table = _table()
+    now = datetime.utcnow()
+    try:
+        with read_engine().connect() as conn:
+            row = conn.execute(
+                select(table.c.response, table.c.expires_at).where(table.c.key == key)
+            ).first()
+        if row is None or row.expires_at <= now:
+            return None, None
+        with _hits_lock:
+            _pending_hits[key] = _pending_hits.get(key, 0) + 1
+            due = sum(_pending_hits.values()) >= HIT_FLUSH_EVERY
+        if due:
+            _flush_hits()
+        return row.response, (row.expires_at - now).total_seconds()
+    except SQLAlchemyError:
+        stats.incr('db_errors')
+        logger.warning('LLM cache read failed', exc_info=True)
+        return None, None
+
+
+def _flush_hits():
+    """Add the hits counted since the last flush to the table, in one transaction."""
+    with _hits_lock:
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+    if not pending:
+        return
+    table = _table()
+    with _engine().begin() as conn:
+        conn.execute(update(table).where(table.c.key == bindparam('k')).values(hits=table.c.hits + bindparam('n')),
+                     [{'k': key, 'n': n} for key, n in pending.items()])
+
+
+def _db_put(key, model_name, response):
+    table = _table()
+    now = datetime.utcnow()
+    values = {'model': model_name, 'response': response, 'created_at': now,
+              'expires_at': now + timedelta(seconds=TTL_SECONDS), 'hits': 0}
+    try:
+        engine = _engine()
+        try:
+            with engine.begin() as conn:
+                conn.execute(table.insert().values(key=key, **values))
+        except IntegrityError:
+            # another worker stored the same key first; refresh it
+            with engine.begin() as conn:
+                conn.execute(update(table).where(table.c.key == key).values(**values))
+        _flush_hits()  # a write anyway
+        if next(_writes) % PURGE_EVERY == 0:
+            purge_expired()
+    except SQLAlchemyError:
+        stats.incr('db_errors')
+        logger.warning('LLM cache write failed', exc_info=True)
+
+
+def purge_expired():
+    """Delete expired rows from the database tier. Returns the number removed."""
+    table = _table()
+    with _engine().begin() as conn:
+        removed = conn.execute(delete(table).where(table.c.expires_at <= datetime.utcnow())).rowcount
+    if removed:
+        stats.incr('expirations', removed)
+    return removed
+
+
+def get(key):
+    """Look a key up in memory, then the database. Returns the cached text or None."""
+    if not ENABLED:
+        return None
+    value = memory.get(key)
+    if value is not None:
+        stats.incr('memory_hits')
+        return value
+    if DB_TIER:
+        value, remaining = _db_get(key)
+        if value is not None:
+            stats.incr('db_hits')
+            memory.put(key, value, ttl=min(remaining, TTL_SECONDS))
+            return value
+    stats.incr('misses')
+    return None
+
+
+def put(key, model_name, response):
+    if not ENABLED or not response:
+        return
+    memory.put(key, response)
+    stats.incr('stores')
+    if DB_TIER:
+        _db_put(key, model_name, response)
+
+
+def cached_call_llm_model(model_name, messages, temperature=1.0, top_p=1.0, **params):
+    """Drop-in for llm.call_llm_model that serves repeats from the cache."""
+    key = cache_key(model_name, messages, temperature, top_p, **params)
+    cached = get(key)
+    if cached is not None:
+        return cached
+    from src import admission
+    from src import llm as llm_module
+
+    def call():
+        response = llm_module.call_llm_model(model_name, messages, temperature=temperature, top_p=top_p, **params)
+        put(key, model_name, response)
+        return response
+    if not (ENABLED and DB_TIER):
+        return call()
+    # with the database admission backend, an identical call running in another worker is awaited
+    return admission.shared_flight(key, call, lambda: _db_get(key)[0])
+
+
+def snapshot():
+    data = stats.snapshot()
+    lookups = data['memory_hits'] + data['db_hits'] + data['misses']
+    data['hit_ratio'] = round((data['memory_hits'] + data['db_hits']) / lookups, 4) if lookups else None
+    data['memory_entries'] = len(memory)
+    data['memory_max_entries'] = MAX_ENTRIES
+    data['ttl_seconds'] = TTL_SECONDS
+    data['enabled'] = ENABLED
+    data['db_tier'] = DB_TIER
+    return data
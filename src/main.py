@@ -1,16 +1,33 @@
 import os
 import sys
-from dotenv import load_dotenv
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+# first: loads .env before any module reads its settings
+from src import config
+
+from flask import Flask, request, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.note import note_bp
 from src.routes.ai import bp as ai_bp
-from src.models.note import Note
+from src.routes.jobs import jobs_bp
+from src.routes.metrics import metrics_bp
+from src.models.note import Note, NoteTombstone
+from src.models.llm_cache import LLMCacheEntry
+from src.models.job import AIJob
+from src.models.embedding import NoteEmbedding
+from src.models.translation import NoteTranslation
+from src.models.revision import NoteRevision
+from src.models.admission import AILease, AIRateBucket
+from src.search import ensure_search_index, match_content_storage
+from src.schema import upgrade_schema
+from src import accounts, db_engine
+from src.serialization import compress_response
+from src import metrics
+# registers the note event hooks and job handler of background translation
+from src import pretranslation
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -22,56 +39,51 @@ CORS(app)
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(note_bp, url_prefix='/api')
 app.register_blueprint(ai_bp, url_prefix='/api')
-
-# configure database to use repository-root `database/app.db`
-ROOT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-env_path = os.path.join(ROOT_DIR, '.env')
-if os.path.exists(env_path):
-    load_dotenv(env_path)
-
-# Try MySQL first; fall back to SQLite if MySQL vars missing
-mysql_user = os.getenv('MYSQL_USER')
-mysql_password = os.getenv('MYSQL_PASSWORD')
-mysql_host = os.getenv('MYSQL_HOST', 'localhost')
-mysql_port = os.getenv('MYSQL_PORT', '3306')
-mysql_db = os.getenv('MYSQL_DB')
-
-# Prefer a single DATABASE_URL (used by Heroku/Vercel/Planetscale). If present, use it.
-database_url = os.getenv('DATABASE_URL')
-
-if database_url:
-    # DATABASE_URL is preferred for cloud deployments (Vercel/Planetscale)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-elif mysql_user and mysql_password and mysql_db:
-    # 使用 pymysql 驱动
-    app.config['SQLALCHEMY_DATABASE_URI'] = (
-        f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db}?charset=utf8mb4"
-    )
-else:
-    # configure database to use repository-root `database/app.db`
-    DB_PATH = os.path.join(ROOT_DIR, 'database', 'app.db')
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{DB_PATH}"
-
+app.register_blueprint(jobs_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp, url_prefix='/api')
+metrics.init_app(app)
+
+# DATABASE_URL, then MySQL (MYSQL_* vars), then repository-root `database/app.db`
+app.config['SQLALCHEMY_DATABASE_URI'] = config.database_uri()
+# pool and timeouts for serverless / long-running server / SQLite (DB_PROFILE);
+# tuned SQLite also gets a read-only 'read' bind
+DB_PROFILE = db_engine.configure(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
+db_engine.prepare(app)
 
 # IMPORTANT: creating tables automatically in production (Planetscale) is unsafe because
 # Planetscale recommends using deploy requests / schema migration tooling for DDL.
 # Only auto-create tables when in debug/development or when explicitly allowed.
-AUTO_CREATE = os.getenv('AUTO_CREATE_TABLES', 'false').lower() in ('1', 'true', 'yes')
+AUTO_CREATE = config.get_bool('AUTO_CREATE_TABLES')
 if app.debug or AUTO_CREATE:
     with app.app_context():
-        db.create_all()
+        db.create_all(bind_key=None)  # never the read-only bind
+        upgrade_schema(db.engine)
+        ensure_search_index(db.engine)
+        # notes saved before notes had owners go to the default user
+        accounts.assign_unowned_notes(db.engine)
+# cheap (no rebuild), and must happen before compressed content reaches the search index
+with app.app_context():
+    match_content_storage(db.engine)
 
 
 @app.after_request
-def add_dev_no_cache_headers(response):
-    # During development, avoid aggressive browser caching of index.html/js
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
+def add_cache_headers(response):
+    if app.debug:
+        # During development, avoid aggressive browser caching of index.html/js
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+    elif 'Cache-Control' not in response.headers:
+        # Browsers may keep responses but must revalidate; ETags turn that into a 304
+        response.headers['Cache-Control'] = 'no-cache'
     return response
 
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -0,0 +1,247 @@
+"""Request, SQL and LLM instrumentation, exposed in Prometheus text format (/api/metrics).
+
+- per-route latency histograms and request counts (Flask before/after_request)
+- SQL statement count and time, overall and per request (SQLAlchemy cursor events)
+- connection pool checkout wait and new connections (reported by src/db_engine.py)
+- LLM upstream latency, retries and prompt/completion tokens (called from src/llm.py)
+- optional Server-Timing header (app, db, llm) for browser devtools
+
+Other modules add gauges with register_collector(); no prometheus_client dependency.
+
+Configuration (environment):
+  METRICS_ENABLED   '0' turns instrumentation off (default on)
+  SERVER_TIMING     '1' adds a Server-Timing header to every response (default off)
+"""
+import threading
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src import config
+
+ENABLED = config.get_bool('METRICS_ENABLED', True)
+SERVER_TIMING = config.get_bool('SERVER_TIMING')
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=HTTP_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", "+Inf")])} {series[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(round(series[-2], 6))}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {series[-1]}')
+        return lines
+
+
+http_duration = Histogram('http_request_duration_seconds', 'Time to produce a response (streamed bodies excluded)',
+                          ('method', 'route', 'status'))
+http_db_queries = Histogram('http_request_db_queries', 'SQL statements executed per request', ('route',),
+                            buckets=COUNT_BUCKETS)
+db_duration = Histogram('db_query_duration_seconds', 'SQL statement execution time', ('operation',),
+                        buckets=DB_BUCKETS)
+db_pool_wait = Histogram('db_pool_checkout_seconds', 'Time to get a pooled connection (waiting for one or opening one)',
+                         ('pool', 'outcome'), buckets=DB_BUCKETS)
+db_connects = Counter('db_connections_opened_total', 'New database connections (handshakes)', ('pool',))
+llm_duration = Histogram('llm_request_duration_seconds', 'Upstream LLM call time (streams: until the last token)',
+                         ('kind', 'model', 'outcome'), buckets=LLM_BUCKETS)
+llm_first_token = Histogram('llm_time_to_first_token_seconds', 'Time to the first streamed token', ('model',),
+                            buckets=LLM_BUCKETS)
+llm_retries = Counter('llm_retries_total', 'Upstream LLM attempts that were retried', ('reason',))
+llm_tokens = Counter('llm_tokens_total', 'Tokens reported by the upstream', ('model', 'type'))
+
+_metrics = [http_duration, http_db_queries, db_duration, db_pool_wait, db_connects,
+            llm_duration, llm_first_token, llm_retries, llm_tokens]
+_collectors = []
+
+
+def register_collector(collect):
+    """collect() -> iterable of (name, type, help, [(labels_dict, value), ...]) rendered on each scrape."""
+    _collectors.append(collect)
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                if value is None:
+                    continue
+                names = tuple(labels)
+                lines.append(f'{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _request_timings():
+    """Per-request accumulators, or None outside a request's app context."""
+    if not has_app_context():
+        return None
+    return g.get('_timings')
+
+
+def _operation(statement):
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return word if word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH') else 'OTHER'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    db_duration.observe(elapsed, operation=_operation(statement))
+    timings = _request_timings()
+    if timings is not None:
+        timings['db'] += elapsed
+        timings['db_count'] += 1
+
+
+def record_pool_checkout(pool, seconds, outcome='ok'):
+    """Called by the pool classes of src/db_engine.py on every checkout."""
+    if not ENABLED:
+        return
+    db_pool_wait.observe(seconds, pool=pool, outcome=outcome)
+    timings = _request_timings()
+    if timings is not None:
+        timings['pool'] += seconds
+
+
+def record_connect(pool):
+    if ENABLED:
+        db_connects.inc(pool=pool)
+
+
+def record_llm_call(kind, model, seconds, outcome='ok', usage=None):
+    """Called by src/llm.py after each upstream call (after retries)."""
+    if not ENABLED:
+        return
+    llm_duration.observe(seconds, kind=kind, model=model, outcome=outcome)
+    if usage is not None:
+        for field in ('prompt_tokens', 'completion_tokens'):
+            tokens = getattr(usage, field, None)
+            if tokens:
+                llm_tokens.inc(tokens, model=model, type=field.split('_')[0])
+    timings = _request_timings()
+    if timings is not None:
+        timings['llm'] += seconds
+        timings['llm_count'] += 1
+
+
+def record_llm_retry(reason):
+    if ENABLED:
+        llm_retries.inc(reason=reason)
+
+
+def record_first_token(model, seconds):
+    if ENABLED:
+        llm_first_token.observe(seconds, model=model)
+
+
+def _before_request():
+    g._timings = {'start': time.perf_counter(), 'db': 0.0, 'db_count': 0, 'pool': 0.0, 'llm': 0.0, 'llm_count': 0}
+
+
+def _after_request(response):
+    timings = g.get('_timings')
+    if timings is None:
+        return response
+    elapsed = time.perf_counter() - timings['start']
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_duration.observe(elapsed, method=request.method, route=route, status=str(response.status_code))
+    http_db_queries.observe(timings['db_count'], route=route)
+    if SERVER_TIMING:
+        parts = [f'app;dur={elapsed * 1000:.1f}',
+                 f'db;dur={timings["db"] * 1000:.1f};desc="{timings["db_count"]} queries"',
+                 f'pool;dur={timings["pool"] * 1000:.1f};desc="connection checkout"']
+        if timings['llm_count']:
+            parts.append(f'llm;dur={timings["llm"] * 1000:.1f};desc="{timings["llm_count"]} calls"')
+        response.headers['Server-Timing'] = ', '.join(parts)
+    return response
+
+
+_installed = False
+
+
+def init_app(app):
+    """Hook request timing into `app` and SQL timing into every engine (once per process)."""
+    global _installed
+    if not ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
@@ -0,0 +1,30 @@
+from datetime import datetime
+from src.models.user import db
+
+class AIRateBucket(db.Model):
+    """Token bucket of one client, for the database admission backend (see src/admission.py)."""
+    __tablename__ = 'ai_rate_bucket'
+
+    key = db.Column(db.String(128), primary_key=True)  # client address
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time of the last refill
+
+    def __repr__(self):
+        return f'<AIRateBucket {self.key} {self.tokens:.2f}>'
+
+
+class AILease(db.Model):
+    """An AI request in flight ('inflight') or an LLM call being made for others ('flight')."""
+    __tablename__ = 'ai_lease'
+
+    id = db.Column(db.String(80), primary_key=True)  # 'inflight:<uuid>' or 'flight:<call key>'
+    kind = db.Column(db.String(16), nullable=False)
+    expires_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # the in-flight count only looks at unexpired leases of one kind
+    __table_args__ = (
+        db.Index('ix_ai_lease_kind_expires_at', 'kind', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<AILease {self.id}>'
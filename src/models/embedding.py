@@ -0,0 +1,16 @@
+from datetime import datetime
+from src.models.user import db
+
+class NoteEmbedding(db.Model):
+    """Vector of a note's title + content for semantic search (see src/embeddings.py)."""
+    __tablename__ = 'note_embedding'
+
+    note_id = db.Column(db.Integer, primary_key=True)
+    model = db.Column(db.String(100), nullable=False)  # embedder name; rows of other embedders are stale
+    dim = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the embedded text
+    vector = db.Column(db.LargeBinary, nullable=False)  # float32, L2-normalized
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<NoteEmbedding {self.note_id} {self.model}>'
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+from src.models.user import db
+
+class AIJob(db.Model):
+    """A queued AI request (see src/jobs.py)."""
+    __tablename__ = 'ai_job'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    dedupe_key = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued | running | done | failed
+    result = db.Column(db.Text)  # JSON response body
+    http_status = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    run_after = db.Column(db.DateTime)  # not claimed before this time (debounced jobs)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # workers claim the oldest queued job first; old finished ones are purged
+    __table_args__ = (
+        db.Index('ix_ai_job_status_created_at', 'status', 'created_at'),
+        db.Index('ix_ai_job_status_finished_at', 'status', 'finished_at'),
+    )
+
+    def __repr__(self):
+        return f'<AIJob {self.id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        return job_to_dict(self)
+
+
+def _ms(later, earlier):
+    if not later or not earlier:
+        return None
+    return round((later - earlier).total_seconds() * 1000, 1)
+
+
+def job_to_dict(row):
+    """Serialize a job row (ORM object or Core row) for the API."""
+    return {
+        'id': row.id,
+        'kind': row.kind,
+        'status': row.status,
+        'result': json.loads(row.result) if row.result else None,
+        'http_status': row.http_status,
+        'attempts': row.attempts,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'started_at': row.started_at.isoformat() if row.started_at else None,
+        'finished_at': row.finished_at.isoformat() if row.finished_at else None,
+        'queue_ms': _ms(row.started_at, row.created_at),
+        'run_ms': _ms(row.finished_at, row.started_at),
+    }
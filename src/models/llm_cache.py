@@ -0,0 +1,16 @@
+from datetime import datetime
+from src.models.user import db
+
+class LLMCacheEntry(db.Model):
+    """Shared tier of the LLM response cache (see src/llm_cache.py)."""
+    __tablename__ = 'llm_cache'
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of model/messages/sampling params
+    model = db.Column(db.String(100), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LLMCacheEntry {self.key[:12]} {self.model}>'
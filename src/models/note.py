@@ -1,23 +1,70 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import validates
+from src.content_storage import CompressedText, content_prefix, prefix_default
 from src.models.user import db
 
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    # owner (src/accounts.py); NULL only for notes saved before notes had owners
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    # large content is stored compressed on SQLite (src/content_storage.py)
+    content = db.Column(CompressedText, nullable=False)
+    # first characters of content, plain, for list views; Core updates of content set it too
+    content_prefix = db.Column(db.String(200), default=prefix_default)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
+    # bumped by every ORM update; a flush against a stale version raises StaleDataError
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # keyset pagination walks (updated_at, id) newest first
+    __table_args__ = (
+        db.Index('ix_note_updated_at_id', 'updated_at', 'id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<Note {self.title}>'
+
+    @validates('content')
+    def _keep_prefix(self, key, value):
+        self.content_prefix = content_prefix(value)
+        return value
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_content=True):
+        d = {
             'id': self.id,
             'title': self.title,
             'content': self.content,
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if not include_content:
+            del d['content']
+        return d
+
+
+# every note query is scoped to one user: lists walk (updated_at, id) newest first,
+# sort=title_asc walks lower(title)
+db.Index('ix_note_user_id_updated_at_id', Note.user_id, Note.updated_at.desc(), Note.id.desc())
+db.Index('ix_note_user_id_title', Note.user_id, func.lower(Note.title))
 
+
+class NoteTombstone(db.Model):
+    """Marks a deleted note so clients can sync deletions (GET /api/notes/changes)."""
+    __tablename__ = 'note_tombstone'
+
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer)  # owner of the deleted note
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index('ix_note_tombstone_user_id_deleted_at', 'user_id', 'deleted_at'),
+    )
+
+    def __repr__(self):
+        return f'<NoteTombstone {self.note_id}>'
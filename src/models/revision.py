@@ -0,0 +1,27 @@
+from datetime import datetime
+from src.content_storage import CompressedText
+from src.models.user import db
+
+class NoteRevision(db.Model):
+    """One saved state of a note (see src/revisions.py). Keyframes and the latest revision
+    hold the full content; the others only a reverse delta to the next newer revision."""
+    __tablename__ = 'note_revision'
+
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, nullable=False)
+    number = db.Column(db.Integer, nullable=False)  # 1, 2, ... per note
+    version = db.Column(db.Integer, nullable=False)  # Note.version this revision was taken at
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(CompressedText)
+    delta = db.Column(db.Text)  # JSON splices turning revision number + 1 into this one
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('note_id', 'number', name='uq_note_revision_note_id_number'),
+        # retention pruning walks old revisions by age
+        db.Index('ix_note_revision_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<NoteRevision {self.note_id}#{self.number}>'
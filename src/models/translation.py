@@ -0,0 +1,16 @@
+from datetime import datetime
+from src.models.user import db
+
+class NoteTranslation(db.Model):
+    """A note's content translated ahead of time (see src/pretranslation.py)."""
+    __tablename__ = 'note_translation'
+
+    note_id = db.Column(db.Integer, primary_key=True)
+    language = db.Column(db.String(64), primary_key=True)  # normalized target, see pretranslation.language_key
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the translated content; stale when it differs
+    translation = db.Column(db.Text, nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NoteTranslation {self.note_id} {self.language}>'
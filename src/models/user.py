@@ -1,11 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from src.db_engine import RoutingSession
+
+# reads go to the SQLite read pool when there is one (src/db_engine.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    # comma-separated targets notes are translated into in the background (src/pretranslation.py)
+    translate_languages = db.Column(db.String(500))
+    # last bulk import of notes, which keep their own timestamps: delta sync cursors from
+    # before it are answered with reset (src/note_transfer.py)
+    notes_imported_at = db.Column(db.DateTime)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -14,5 +22,13 @@ class User(db.Model):
         return {
             'id': self.id,
             'username': self.username,
-            'email': self.email
+            'email': self.email,
+            'translate_languages': split_languages(self.translate_languages)
         }
+
+
+def split_languages(value):
+    """'Chinese, Japanese' or ['Chinese', 'Japanese'] -> ['Chinese', 'Japanese']."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [v.strip() for v in value or () if isinstance(v, str) and v.strip()]
@@ -0,0 +1,215 @@
+"""Apply many note creates/updates/deletes in one transaction (POST /api/notes/batch).
+
+Operations are validated up front, the referenced notes are read with one SELECT, and
+each kind of write goes to the database as a single executemany:
+  - creates: one INSERT ... RETURNING id (insertmanyvalues), or one INSERT per row
+    on dialects that cannot return ids in parameter order (MySQL)
+  - updates: one UPDATE ... WHERE id = ? AND version = ? per set of changed fields;
+    the version check makes them compare-and-set, like ORM updates of Note
+  - deletes: one DELETE ... WHERE id IN (...) plus the tombstones for delta sync
+
+mode='atomic' applies everything or nothing; mode='best_effort' applies every operation
+that is valid and reports the rest. With a user_id, creates belong to that user and
+updates/deletes of other users' notes fail with 404, like missing notes.
+"""
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, select, update
+
+from src import note_events
+from src.content_storage import content_prefix
+
+MAX_OPS = 500
+MODES = ('atomic', 'best_effort')
+MAX_TITLE = 30
+
+
+class BatchError(Exception):
+    """The request itself is malformed (not a list of operations, too large, unknown mode)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _tables():
+    from src.models.note import Note, NoteTombstone
+    return Note.__table__, NoteTombstone.__table__
+
+
+def _fail(result, status, error):
+    result.update(ok=False, status=status, error=error)
+    return result
+
+
+def _clean_title(value):
+    if not isinstance(value, str):
+        raise ValueError('title must be a string')
+    title = value.strip()
+    if len(title) > MAX_TITLE:
+        raise ValueError('Title should be less than 30 characters')
+    return title
+
+
+def _validate(index, op, seen_ids):
+    """Normalize one operation. Returns (result, spec); spec is None when the op is invalid."""
+    kind = op.get('op') if isinstance(op, dict) else None
+    result = {'index': index, 'op': kind}
+    if kind not in ('create', 'update', 'delete'):
+        return _fail(result, 400, "op must be 'create', 'update' or 'delete'"), None
+    spec = {'kind': kind}
+    try:
+        if kind == 'create':
+            if not isinstance(op.get('content'), str) or 'title' not in op:
+                raise ValueError('Title and content are required')
+            spec.update(title=_clean_title(op['title']) or 'Untitled', content=op['content'])
+            return result, spec
+
+        note_id = op.get('id')
+        if not isinstance(note_id, int) or isinstance(note_id, bool):
+            raise ValueError('id must be an integer')
+        if note_id in seen_ids:
+            raise ValueError(f'note {note_id} appears more than once in the batch')
+        seen_ids.add(note_id)
+        result['id'] = spec['id'] = note_id
+        base_version = op.get('base_version')
+        if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+            raise ValueError('base_version must be an integer')
+        spec['base_version'] = base_version
+        if kind == 'update':
+            values = {}
+            if op.get('title') is not None:
+                title = _clean_title(op['title'])
+                if title:
+                    values['title'] = title
+            if 'content' in op:
+                if not isinstance(op['content'], str):
+                    raise ValueError('content must be a string')
+                values['content'] = op['content']
+                values['content_prefix'] = content_prefix(op['content'])
+            if not values:
+                raise ValueError('update needs title or content')
+            spec['values'] = values
+    except ValueError as e:
+        return _fail(result, 400, str(e)), None
+    return result, spec
+
+
+def _insert_notes(conn, note, specs, now, user_id):
+    rows = [{'title': s['title'], 'content': s['content'], 'created_at': now, 'updated_at': now, 'version': 1,
+             'user_id': user_id} for s in specs]
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(note).returning(note.c.id, sort_by_parameter_order=True)
+        return list(conn.execute(stmt, rows).scalars())
+    # no ordered RETURNING for executemany (MySQL): one INSERT per row, still one transaction
+    return [conn.execute(insert(note).values(**row)).inserted_primary_key[0] for row in rows]
+
+
+def _update_notes(conn, note, specs, now):
+    """Run the updates; returns the ids whose version check failed (changed concurrently)."""
+    groups = {}
+    for s in specs:
+        groups.setdefault(tuple(sorted(s['values'])), []).append(s)
+    lost = []
+    for fields, group in groups.items():
+        stmt = (
+            update(note)
+            .where(note.c.id == bindparam('b_id'), note.c.version == bindparam('b_version'))
+            .values(updated_at=now, version=note.c.version + 1,
+                    **{f: bindparam(f'b_{f}') for f in fields})
+        )
+        params = [dict({'b_id': s['id'], 'b_version': s['current_version']},
+                       **{f'b_{f}': s['values'][f] for f in fields}) for s in group]
+        matched = conn.execute(stmt, params).rowcount
+        if matched == len(params) and conn.dialect.supports_sane_multi_rowcount:
+            continue
+        # someone else won a race on at least one row; ours are the rows carrying our stamp
+        ids = [s['id'] for s in group]
+        mine = set(conn.execute(select(note.c.id).where(note.c.id.in_(ids), note.c.updated_at == now)).scalars())
+        lost.extend(i for i in ids if i not in mine)
+    return lost
+
+
+def apply_batch(engine, ops, mode='atomic', user_id=None):
+    """Validate and apply `ops`. Returns (results, applied_count).
+    Raises BatchError when the batch as a whole is unacceptable.
+    """
+    if mode not in MODES:
+        raise BatchError(f"mode must be one of {', '.join(MODES)}")
+    if not isinstance(ops, list) or not ops:
+        raise BatchError('ops must be a non-empty list')
+    if len(ops) > MAX_OPS:
+        raise BatchError(f'at most {MAX_OPS} operations per batch', status=413)
+
+    note, tombstone = _tables()
+    seen_ids = set()
+    results, specs = [], []
+    for i, op in enumerate(ops):
+        result, spec = _validate(i, op, seen_ids)
+        results.append(result)
+        specs.append(spec)
+
+    with engine.begin() as conn:
+        ids = [s['id'] for s in specs if s and 'id' in s]
+        lookup = select(note.c.id, note.c.version).where(note.c.id.in_(ids))
+        if user_id is not None:
+            lookup = lookup.where(note.c.user_id == user_id)
+        versions = dict(conn.execute(lookup).all()) if ids else {}
+        for result, spec in zip(results, specs):
+            if spec is None or 'id' not in spec:
+                continue
+            current = versions.get(spec['id'])
+            if current is None:
+                _fail(result, 404, 'Note not found')
+            elif spec['base_version'] is not None and spec['base_version'] != current:
+                _fail(result, 409, 'Version conflict')
+                result['version'] = current
+            else:
+                spec['current_version'] = current
+
+        def runnable(kind):
+            return [(r, s) for r, s in zip(results, specs)
+                    if s and s['kind'] == kind and 'error' not in r]
+
+        if mode == 'atomic' and any('error' in r for r in results):
+            conn.rollback()
+            return _rolled_back(results), 0
+
+        now = datetime.utcnow()
+        if conn.dialect.name == 'mysql':
+            now = now.replace(microsecond=0)  # DATETIME keeps whole seconds; _update_notes compares it
+        stamp = now.isoformat()
+        creates, updates, deletes = runnable('create'), runnable('update'), runnable('delete')
+        if creates:
+            for (result, _), new_id in zip(creates, _insert_notes(conn, note, [s for _, s in creates], now, user_id)):
+                result.update(ok=True, status=201, id=new_id, version=1, updated_at=stamp)
+        if updates:
+            lost = set(_update_notes(conn, note, [s for _, s in updates], now))
+            for result, spec in updates:
+                if spec['id'] in lost:
+                    _fail(result, 409, 'Version conflict')
+                else:
+                    result.update(ok=True, status=200, version=spec['current_version'] + 1, updated_at=stamp)
+        if deletes:
+            delete_ids = [s['id'] for _, s in deletes]
+            conn.execute(note.delete().where(note.c.id.in_(delete_ids)))
+            conn.execute(insert(tombstone), [{'note_id': i, 'user_id': user_id, 'deleted_at': now} for i in delete_ids])
+            for result, _ in deletes:
+                result.update(ok=True, status=204)
+
+        if mode == 'atomic' and any('error' in r for r in results):
+            conn.rollback()
+            return _rolled_back(results), 0
+    # committed: tell listeners (search embeddings, pre-translation) what changed
+    note_events.notify_deleted({r['id'] for r in results if r.get('ok') and r['op'] == 'delete'})
+    note_events.notify_saved({r['id']: r['version'] for r in results if r.get('ok') and r['op'] != 'delete'})
+    return results, sum(1 for r in results if r.get('ok'))
+
+
+def _rolled_back(results):
+    for r in results:
+        if 'error' not in r:
+            r.update(ok=False, status=None, error='not applied: batch rolled back')
+            r.pop('version', None)
+            r.pop('updated_at', None)
+    return results
@@ -0,0 +1,80 @@
+"""Post-commit notifications for note changes.
+
+Listeners registered with on_saved() / on_deleted() run after the transaction that changed
+the notes has committed, never for rolled-back work. ORM writes through a session are
+picked up automatically; code that writes notes with Core statements (batch endpoint)
+calls notify_saved() / notify_deleted() itself.
+
+on_saved listeners get {note_id: version}; on_deleted listeners get a set of note ids.
+Listener errors are logged and never reach the request that saved the note.
+"""
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_saved_listeners = []
+_deleted_listeners = []
+
+
+def on_saved(listener):
+    _saved_listeners.append(listener)
+    return listener
+
+
+def on_deleted(listener):
+    _deleted_listeners.append(listener)
+    return listener
+
+
+def _dispatch(listeners, arg):
+    for listener in listeners:
+        try:
+            listener(arg)
+        except Exception:
+            logger.exception('Note event listener %s failed', getattr(listener, '__name__', listener))
+
+
+def notify_saved(versions):
+    if versions:
+        _dispatch(_saved_listeners, dict(versions))
+
+
+def notify_deleted(note_ids):
+    if note_ids:
+        _dispatch(_deleted_listeners, set(note_ids))
+
+
+def _pending(session):
+    return session.info.setdefault('note_events', {'saved': {}, 'deleted': set()})
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+    from src.models.note import Note
+    pending = None
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Note) and (obj in session.new or session.is_modified(obj)):
+            pending = pending or _pending(session)
+            pending['saved'][obj.id] = obj.version
+            pending['deleted'].discard(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            pending = pending or _pending(session)
+            pending['saved'].pop(obj.id, None)
+            pending['deleted'].add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _flush_events(session):
+    pending = session.info.pop('note_events', None)
+    if pending:
+        notify_deleted(pending['deleted'])
+        notify_saved(pending['saved'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_events(session):
+    session.info.pop('note_events', None)
@@ -0,0 +1,175 @@
+"""Streaming NDJSON export and chunked bulk import of notes.
+
+Export reads the `note` table with a server-side cursor (`yield_per`), so memory stays
+flat however many notes there are; each note becomes one JSON line:
+    {"id": 1, "title": "...", "content": "...", "created_at": "...", "updated_at": "...", "version": 1}
+Import consumes such lines in chunks and writes each chunk with one executemany INSERT,
+keeping created_at/updated_at (and optionally ids) so the data can move between the
+SQLite fallback and Postgres/MySQL unchanged. Both work on one user's notes: export
+reads that user's, import assigns the notes to that user. Since imported notes keep
+their updated_at, delta sync cannot find them by time; each chunk stamps the user's
+`notes_imported_at` instead, and GET /api/notes/changes answers reset for older cursors.
+After each chunk commits, the note_events listeners run for its notes like for any save
+(embeddings, pre-translation, revisions), each with one job for the whole chunk.
+"""
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, text, update
+
+from src import note_events
+from src.serialization import dumps
+
+EXPORT_BATCH = 500
+IMPORT_CHUNK = 500
+
+
+def _note_table():
+    from src.models.note import Note
+    return Note.__table__
+
+
+def _user_table():
+    from src.models.user import User
+    return User.__table__
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def iter_export(engine, batch=EXPORT_BATCH, user_id=None):
+    """Yield one dict per note (of `user_id`, or everyone's) in id order, fetching `batch` rows at a time."""
+    note = _note_table()
+    stmt = select(note.c.id, note.c.title, note.c.content, note.c.created_at,
+                  note.c.updated_at, note.c.version).order_by(note.c.id)
+    if user_id is not None:
+        stmt = stmt.where(note.c.user_id == user_id)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch).execute(stmt)
+        for row in result:
+            yield {
+                'id': row.id,
+                'title': row.title,
+                'content': row.content,
+                'created_at': _iso(row.created_at),
+                'updated_at': _iso(row.updated_at),
+                'version': row.version,
+            }
+
+
+def iter_ndjson(records):
+    for record in records:
+        yield dumps(record) + b'\n'
+
+
+def _parse_time(value, fallback):
+    if not value:
+        return fallback
+    return datetime.fromisoformat(value)
+
+
+def _row(record, keep_ids, now, user_id):
+    if not isinstance(record, dict):
+        raise ValueError('line is not a JSON object')
+    title, content = record.get('title'), record.get('content')
+    if not isinstance(title, str) or not isinstance(content, str):
+        raise ValueError('title and content must be strings')
+    created_at = _parse_time(record.get('created_at'), now)
+    row = {
+        'title': title,
+        'content': content,
+        'created_at': created_at,
+        'updated_at': _parse_time(record.get('updated_at'), created_at),
+        'version': record.get('version') if isinstance(record.get('version'), int) else 1,
+        'user_id': user_id,
+    }
+    if keep_ids:
+        if not isinstance(record.get('id'), int):
+            raise ValueError('id must be an integer when keeping ids')
+        row['id'] = record['id']
+    return row
+
+
+def _sync_sequence(conn):
+    """After inserting explicit ids, move Postgres' id sequence past them."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('note', 'id'), (SELECT COALESCE(MAX(id), 1) FROM note))"
+        ))
+
+
+def _insert_rows(conn, note, rows, keep_ids, user_id):
+    """Insert one chunk; returns {id: version} of the new notes."""
+    if keep_ids:
+        conn.execute(insert(note), rows)
+        return {row['id']: row['version'] for row in rows}
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(note).returning(note.c.id, sort_by_parameter_order=True)
+        return dict(zip(conn.execute(stmt, rows).scalars(), (row['version'] for row in rows)))
+    # no ordered RETURNING for executemany (MySQL): the user's notes above the previous
+    # highest id (a note the user saved meanwhile may be among them; listeners don't mind)
+    last_id = conn.execute(select(func.max(note.c.id))).scalar() or 0
+    conn.execute(insert(note), rows)
+    return dict(conn.execute(
+        select(note.c.id, note.c.version).where(note.c.user_id == user_id, note.c.id > last_id)
+    ).all())
+
+
+def import_ndjson(engine, lines, chunk_size=IMPORT_CHUNK, keep_ids=False, user_id=None):
+    """Insert notes from NDJSON lines (str or bytes) as notes of `user_id` (default: the
+    default user, see src/accounts.py), one transaction per chunk.
+    Returns {imported, skipped, errors, seconds, notes_per_sec}; `errors` lists the first
+    bad lines as {line, error}. Blank lines are ignored.
+    """
+    note, user = _note_table(), _user_table()
+    if user_id is None:
+        from src.accounts import default_user_id
+        user_id = default_user_id(engine)
+    started = time.perf_counter()
+    imported, errors, skipped = 0, [], 0
+    pending = []
+    now = datetime.utcnow()
+
+    def flush():
+        nonlocal imported
+        if not pending:
+            return
+        with engine.begin() as conn:
+            ids = _insert_rows(conn, note, pending, keep_ids, user_id)
+            if keep_ids:
+                _sync_sequence(conn)
+        # stamped after the commit: a cursor taken after the stamp already saw the notes
+        with engine.begin() as conn:
+            conn.execute(update(user).where(user.c.id == user_id).values(notes_imported_at=datetime.utcnow()))
+        # embeddings, pre-translations and first revisions, as for notes saved one by one
+        note_events.notify_saved(ids)
+        imported += len(pending)
+        pending.clear()
+
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            pending.append(_row(json.loads(line), keep_ids, now, user_id))
+        except ValueError as e:  # includes JSONDecodeError
+            skipped += 1
+            if len(errors) < 20:
+                errors.append({'line': number, 'error': str(e)})
+            continue
+        if len(pending) >= chunk_size:
+            flush()
+    flush()
+
+    seconds = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'skipped': skipped,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'notes_per_sec': round(imported / seconds, 1) if seconds > 0 else None,
+    }
+
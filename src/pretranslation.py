@@ -0,0 +1,207 @@
+"""Background pre-translation of notes, so translating a saved note is a table lookup.
+
+After a note is created or updated, a 'pretranslate_note' job is queued with a debounce:
+autosaves while the user is still typing keep postponing it, and only the settled
+content is translated. The job translates the content into every configured language
+(TRANSLATE_LANGUAGES plus the note owner's User.translate_languages) through the chunked
+pipeline of src/translation.py and stores the results in `note_translation` together
+with the sha256 of the translated content. /api/translate answers from that table when
+the hash still matches the note; otherwise it translates live as before.
+
+Languages that already have a translation of the current content are skipped, and
+partial translations (some chunks failed) are not stored, so a later save retries them.
+
+Configuration (environment):
+  TRANSLATE_LANGUAGES        comma-separated targets every note is translated into (default none)
+  TRANSLATE_DEBOUNCE_SECONDS quiet time after the last save before translating (default 30)
+"""
+import hashlib
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src import config, note_events
+from src.db_engine import read_engine
+from src.models.user import split_languages
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGES = split_languages(config.get('TRANSLATE_LANGUAGES', ''))
+DEBOUNCE_SECONDS = config.get_float('TRANSLATE_DEBOUNCE_SECONDS', '30')
+# a job for many notes (batch, import) hands the rest to a new job after this long
+GROUP_SECONDS = 60
+
+
+def language_key(target):
+    """Targets are free text ('Chinese', 'chinese '); one stored row per normalized form."""
+    return ' '.join(target.split()).casefold()[:64]
+
+
+def content_hash(content):
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+def _table():
+    from src.models.translation import NoteTranslation
+    return NoteTranslation.__table__
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+def languages(user_id=None):
+    """Targets of a note owned by `user_id`: TRANSLATE_LANGUAGES plus the owner's
+    User.translate_languages, de-duplicated."""
+    from src.models.user import User
+    user = User.__table__
+    rows = []
+    if user_id is not None:
+        with _engine().connect() as conn:
+            rows = conn.execute(select(user.c.translate_languages).where(user.c.id == user_id)).scalars().all()
+    seen, out = set(), []
+    for target in DEFAULT_LANGUAGES + [t for row in rows for t in split_languages(row)]:
+        if language_key(target) not in seen:
+            seen.add(language_key(target))
+            out.append(target)
+    return out
+
+
+def stored_translation(note_id, target, content):
+    """The stored translation of `content` into `target`, or None if missing or stale."""
+    table = _table()
+    with read_engine().connect() as conn:
+        return conn.execute(
+            select(table.c.translation).where(
+                table.c.note_id == note_id,
+                table.c.language == language_key(target),
+                table.c.content_hash == content_hash(content),
+            )
+        ).scalar()
+
+
+def _store(note_id, target, digest, text, model_name):
+    table = _table()
+    values = {'content_hash': digest, 'translation': text, 'model': model_name, 'updated_at': datetime.utcnow()}
+    key = (table.c.note_id == note_id) & (table.c.language == language_key(target))
+    with _engine().begin() as conn:
+        if conn.execute(table.update().where(key).values(**values)).rowcount == 0:
+            conn.execute(table.insert().values(note_id=note_id, language=language_key(target), **values))
+
+
+def pretranslate_note(note_id):
+    """Translate one note into every configured language whose stored translation is stale.
+    Returns {'translated': [...], 'unchanged': [...], 'failed': [...]}, or None if the note is gone."""
+    from src import llm as llm_module
+    from src import translation
+    from src.models.note import Note
+    note_table, table = Note.__table__, _table()
+    with _engine().connect() as conn:
+        note = conn.execute(
+            select(note_table.c.content, note_table.c.user_id).where(note_table.c.id == note_id)
+        ).first()
+        if note is None:
+            return None
+        content = note.content
+        digest = content_hash(content)
+        current = set(conn.execute(
+            select(table.c.language).where(table.c.note_id == note_id, table.c.content_hash == digest)
+        ).scalars())
+    report = {'translated': [], 'unchanged': [], 'failed': []}
+    if not content.strip():
+        return report
+    for target in languages(note.user_id):
+        if language_key(target) in current:
+            report['unchanged'].append(target)
+            continue
+        try:
+            result = translation.translate_text(content, target)
+        except Exception as e:
+            logger.warning('Pre-translation of note %s into %s failed: %s', note_id, target, e)
+            report['failed'].append(target)
+            continue
+        if result.partial:
+            report['failed'].append(target)
+            continue
+        _store(note_id, target, digest, result.text, llm_module.model)
+        report['translated'].append(target)
+    return report
+
+
+def run_pretranslate_job(payload):
+    """Job handler for 'pretranslate_note': one note, or several saved together ('note_ids')."""
+    if 'note_ids' in payload:
+        return _pretranslate_many(payload['note_ids'])
+    report = pretranslate_note(payload['note_id'])
+    if report is None:
+        return {'note_id': payload['note_id'], 'result': 'missing'}, 200
+    return dict(report, note_id=payload['note_id']), 200
+
+
+def _pretranslate_many(note_ids):
+    """Translate notes in order for up to GROUP_SECONDS, then queue the rest as a new job,
+    so a long run is never mistaken for one of a dead worker (JOBS_STALE_SECONDS)."""
+    from src import jobs
+    started = time.monotonic()
+    done = 0
+    for note_id in note_ids:
+        if done and time.monotonic() - started > GROUP_SECONDS:
+            break
+        pretranslate_note(note_id)
+        done += 1
+    rest = note_ids[done:]
+    if rest:
+        try:
+            jobs.enqueue('pretranslate_note', {'note_ids': rest})
+        except jobs.QueueFull:
+            logger.warning('Job queue full; %d notes will be pre-translated on their next save', len(rest))
+    return {'note_ids': note_ids[:done], 'continued': len(rest)}, 200
+
+
+def delete_translations(note_ids):
+    table = _table()
+    with _engine().begin() as conn:
+        conn.execute(table.delete().where(table.c.note_id.in_(list(note_ids))))
+
+
+@note_events.on_saved
+def _schedule(versions):
+    """Queue a debounced pre-translation of the saved notes (keyed by note ids only, so
+    later saves postpone the waiting job instead of adding one)."""
+    if not config.LLM_TOKEN:
+        return
+    from flask import current_app
+    from src import jobs
+    from src.models.note import Note
+    note_table = Note.__table__
+    with _engine().connect() as conn:
+        owners = dict(conn.execute(
+            select(note_table.c.id, note_table.c.user_id).where(note_table.c.id.in_(list(versions)))
+        ).all())
+    wanted = {user_id: bool(languages(user_id)) for user_id in set(owners.values())}
+    note_ids = [note_id for note_id, user_id in owners.items() if wanted[user_id]]
+    if not note_ids:
+        return
+    jobs.ensure_workers(current_app._get_current_object())
+    # a batch or import chunk is one job working through all of its notes
+    payload = {'note_id': note_ids[0]} if len(note_ids) == 1 else {'note_ids': sorted(note_ids)}
+    try:
+        jobs.enqueue('pretranslate_note', payload, debounce=DEBOUNCE_SECONDS)
+    except jobs.QueueFull:
+        logger.warning('Job queue full; notes %s will be pre-translated on their next save', payload)
+
+
+@note_events.on_deleted
+def _forget(note_ids):
+    delete_translations(note_ids)
+
+
+def _register_jobs():
+    from src import jobs
+    jobs.register('pretranslate_note', run_pretranslate_job)
+
+
+_register_jobs()
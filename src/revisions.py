@@ -0,0 +1,234 @@
+"""Note revision history stored as reverse deltas.
+
+After a note is saved, its title and content are recorded in `note_revision`. The latest
+revision of a note holds the full content; when a newer one is recorded, it is replaced
+by the splices (src/text_diff.py) that turn the newer content back into it, so history
+costs about the size of the edits. Every REVISION_KEYFRAME_INTERVAL-th revision keeps its
+full content as well: rebuilding any revision starts at the nearest newer full one and
+applies fewer than that many deltas. So does a revision whose diff would be too costly to
+compute during the save (more than DIFF_MAX_LINES changed lines).
+
+Saves within REVISION_WINDOW_SECONDS of the start of the latest revision are folded into
+it, so a typing session with autosaves every few seconds becomes one revision per window.
+
+Revisions older than REVISION_RETENTION_DAYS are deleted by prune_revisions() in small
+batches that only touch `note_revision` (never the notes themselves); the latest revision
+of a note is always kept. It runs as a 'prune_revisions' job at most hourly per process
+while notes are being saved, or from scripts/prune_revisions.py.
+
+Configuration (environment):
+  REVISIONS_ENABLED            record revisions on save (default on)
+  REVISION_WINDOW_SECONDS      saves this close to a revision's start are folded into it (default 300)
+  REVISION_KEYFRAME_INTERVAL   keep the full content of every n-th revision (default 20)
+  REVISION_RETENTION_DAYS      revisions older than this are pruned (default 90; 0 keeps all)
+"""
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.exc import IntegrityError
+
+from src import config, note_events, text_diff
+from src.db_engine import read_engine
+
+logger = logging.getLogger(__name__)
+
+ENABLED = config.get_bool('REVISIONS_ENABLED', True)
+WINDOW_SECONDS = config.get_float('REVISION_WINDOW_SECONDS', '300')
+KEYFRAME_INTERVAL = max(1, config.get_int('REVISION_KEYFRAME_INTERVAL', '20'))
+RETENTION_DAYS = config.get_float('REVISION_RETENTION_DAYS', '90')
+PRUNE_BATCH = 500
+# saves run the diff (difflib, quadratic at worst): beyond this many changed lines a
+# revision keeps its full content instead (about 30 ms at worst)
+DIFF_MAX_LINES = 1000
+PRUNE_INTERVAL_SECONDS = 3600
+
+_next_prune = 0.0
+
+
+def _table():
+    from src.models.revision import NoteRevision
+    return NoteRevision.__table__
+
+
+def _engine():
+    from src.models.user import db
+    return db.engine
+
+
+def is_keyframe(number):
+    return (number - 1) % KEYFRAME_INTERVAL == 0
+
+
+def _delta(newer, older):
+    """Reverse delta from `newer` to `older`, or None when too many lines changed to diff
+    within the saving request (the revision keeps its full content then)."""
+    ops = text_diff.diff_splices(newer, older, max_lines=DIFF_MAX_LINES)
+    return None if ops is None else json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def _apply(text, delta):
+    return text_diff.apply_splices(text, json.loads(delta))
+
+
+def _record(conn, table, note, head, now):
+    """Fold the note's current state into its latest revision or start a new one.
+    Returns 'new', 'folded' or None (already recorded)."""
+    if head is not None and head.version == note.version:
+        return None
+    if head is not None and (now - head.created_at).total_seconds() < WINDOW_SECONDS:
+        if head.number > 1:
+            previous = conn.execute(select(table.c.id, table.c.delta).where(
+                table.c.note_id == note.id, table.c.number == head.number - 1)).first()
+            if previous is not None and previous.delta is not None:
+                # its delta leads back from the head content, which is about to change
+                older = _apply(head.content, previous.delta)
+                delta = _delta(note.content, older)
+                conn.execute(table.update().where(table.c.id == previous.id)
+                             .values(delta=delta, content=older if delta is None else None))
+        conn.execute(table.update().where(table.c.id == head.id).values(
+            version=note.version, title=note.title, content=note.content, updated_at=now))
+        return 'folded'
+    if head is not None and not is_keyframe(head.number):
+        delta = _delta(note.content, head.content)
+        if delta is not None:
+            conn.execute(table.update().where(table.c.id == head.id).values(content=None, delta=delta))
+    conn.execute(table.insert().values(
+        note_id=note.id, number=head.number + 1 if head is not None else 1, version=note.version,
+        title=note.title, content=note.content, created_at=now, updated_at=now))
+    return 'new'
+
+
+def record_revisions(note_ids):
+    """Record the current state of the given notes in one transaction.
+    Returns {'new': n, 'folded': n, 'unchanged': n}."""
+    from src.models.note import Note
+    note, table = Note.__table__, _table()
+    ids = sorted(set(note_ids))
+    counts = {'new': 0, 'folded': 0, 'unchanged': 0}
+    now = datetime.utcnow()
+    latest = (select(table.c.note_id, func.max(table.c.number).label('number'))
+              .where(table.c.note_id.in_(ids)).group_by(table.c.note_id).subquery())
+    try:
+        with _engine().begin() as conn:
+            notes = conn.execute(select(note.c.id, note.c.title, note.c.content, note.c.version)
+                                 .where(note.c.id.in_(ids))).all()
+            heads = {r.note_id: r for r in conn.execute(
+                select(table).join(latest, and_(table.c.note_id == latest.c.note_id,
+                                                table.c.number == latest.c.number))
+                .with_for_update(of=table)
+            )}
+            for row in notes:
+                outcome = _record(conn, table, row, heads.get(row.id), now)
+                counts[outcome or 'unchanged'] += 1
+    except IntegrityError:
+        # another process recorded the same revision number first; its save is the newer one
+        logger.info('Revision of notes %s recorded concurrently; skipped', ids)
+    return counts
+
+
+def list_revisions(note_id, limit, before=None):
+    """Revisions of a note, newest first, without content; `before` is a revision number."""
+    table = _table()
+    query = select(table.c.number, table.c.version, table.c.title, table.c.created_at, table.c.updated_at,
+                   table.c.content.isnot(None).label('full')).where(table.c.note_id == note_id)
+    if before is not None:
+        query = query.where(table.c.number < before)
+    with read_engine().connect() as conn:
+        return conn.execute(query.order_by(table.c.number.desc()).limit(limit)).all()
+
+
+def get_revision(note_id, number):
+    """A revision with its content rebuilt, as a row-like dict, or None if it does not exist."""
+    table = _table()
+    with read_engine().connect() as conn:
+        base = conn.execute(select(func.min(table.c.number)).where(
+            table.c.note_id == note_id, table.c.number >= number, table.c.content.isnot(None))).scalar()
+        if base is None:
+            return None
+        rows = conn.execute(
+            select(table).where(table.c.note_id == note_id, table.c.number.between(number, base))
+            .order_by(table.c.number.desc())
+        ).all()
+    if rows[-1].number != number:
+        return None
+    content = rows[0].content
+    for row in rows[1:]:
+        content = _apply(content, row.delta)
+    target = rows[-1]
+    return {'number': target.number, 'version': target.version, 'title': target.title, 'content': content,
+            'created_at': target.created_at, 'updated_at': target.updated_at}
+
+
+def prune_revisions(retention_days=None, batch_size=PRUNE_BATCH):
+    """Delete revisions older than the retention, except each note's latest, in batches
+    of `batch_size` (one short transaction each). Returns the number deleted."""
+    days = RETENTION_DAYS if retention_days is None else retention_days
+    if days <= 0:
+        return 0
+    table = _table()
+    newer = table.alias('newer')
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    # older revisions are only ever needed to rebuild even older ones, so deleting from
+    # the old end never breaks a revision that is kept
+    stale = select(table.c.id).where(
+        table.c.created_at < cutoff,
+        exists().where(newer.c.note_id == table.c.note_id, newer.c.number > table.c.number),
+    ).order_by(table.c.id).limit(batch_size)
+    deleted = 0
+    while True:
+        with _engine().begin() as conn:
+            ids = conn.execute(stale).scalars().all()
+            if ids:
+                conn.execute(table.delete().where(table.c.id.in_(ids)))
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+
+
+def run_prune_job(payload):
+    """Job handler for 'prune_revisions'."""
+    return {'deleted': prune_revisions(payload.get('retention_days'))}, 200
+
+
+def delete_revisions(note_ids):
+    table = _table()
+    with _engine().begin() as conn:
+        conn.execute(table.delete().where(table.c.note_id.in_(list(note_ids))))
+
+
+def _schedule_prune():
+    global _next_prune
+    if RETENTION_DAYS <= 0 or time.monotonic() < _next_prune:
+        return
+    _next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+    from flask import current_app
+    from src import jobs
+    jobs.ensure_workers(current_app._get_current_object())
+    try:
+        jobs.enqueue('prune_revisions', {})  # identical to a recent run in another process: reused
+    except jobs.QueueFull:
+        logger.warning('Job queue full; revision pruning postponed')
+
+
+@note_events.on_saved
+def _record_saved(versions):
+    if not ENABLED:
+        return
+    record_revisions(versions)
+    _schedule_prune()
+
+
+@note_events.on_deleted
+def _forget(note_ids):
+    delete_revisions(note_ids)
+
+
+def _register_jobs():
+    from src import jobs
+    jobs.register('prune_revisions', run_prune_job)
+
+
+_register_jobs()
@@ -1,72 +1,238 @@
-from flask import Blueprint, request, jsonify, current_app
-import os
+from flask import Blueprint, Response, g, request, jsonify, current_app, stream_with_context
+import json
+import time
+
+from src import config
 
 bp = Blueprint('ai', __name__, url_prefix='/ai')
 
+CHAT_MODEL = config.get('LLM_CHAT_MODEL', 'openai/gpt-4.1')
+
+
+@bp.before_request
+def _admit():
+    """Rate limit and in-flight cap for the POST (LLM) endpoints; see src/admission.py."""
+    from src import admission
+    if request.method != 'POST' or not admission.ENABLED:
+        return None
+    try:
+        g.ai_release = admission.admit(admission.client_key(request))
+    except admission.Rejected as e:
+        body = {'error': 'Too many AI requests, please retry later', 'detail': str(e), 'reason': e.reason}
+        return jsonify(body), 429, {'Retry-After': str(e.retry_after)}
+    return None
+
+
+@bp.teardown_request
+def _release(exc):
+    # streamed responses keep the request context (stream_with_context) until the stream ends
+    release = g.pop('ai_release', None)
+    if release is not None:
+        release()
+
+
+def _llm_error(e, action):
+    """Classify an exception from the LLM layer as (body, status, headers).
+    Content-filter rejections become 422 so the frontend can show a friendly message;
+    a saturated or unconfigured upstream becomes 503.
+    """
+    msg = str(e)
+    if 'content_filter' in msg or 'ResponsibleAIPolicyViolation' in msg or 'content_filter_result' in msg:
+        return {'error': f'{action} blocked by model content filter', 'detail': msg}, 422, {}
+    from src.llm import LLMBusyError, LLMConfigError
+    if isinstance(e, LLMBusyError):
+        return {'error': 'AI service is busy, please retry shortly', 'detail': msg}, 503, {'Retry-After': '5'}
+    if isinstance(e, LLMConfigError):
+        return {'error': 'AI service is not configured on server', 'detail': msg}, 503, {}
+    return {'error': f'{action} failed', 'detail': msg}, 500, {}
+
+
+def _llm_error_response(e, action):
+    """Map an exception from the LLM layer to a JSON error response."""
+    body, status, headers = _llm_error(e, action)
+    return jsonify(body), status, headers
+
+
+def _wants_stream(data):
+    return data.get('stream') is True or request.args.get('stream', '').lower() in ('1', 'true')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_completion(model_name, messages, action, result_field, temperature=1.0, top_p=1.0, cache=False, **params):
+    """Stream a completion as Server-Sent Events.
+    Events: `token` {text} as the model produces output, then `done`
+    {<result_field>, ttft_ms, total_ms, cached} or `error` {error, detail, status}.
+    When the client disconnects the WSGI server closes this generator, which closes the
+    upstream stream. With cache=True hits are replayed and the assembled result is stored.
+    """
+    from src import llm as llm_module
+    from src import llm_cache
+    key = llm_cache.cache_key(model_name, messages, temperature, top_p) if cache else None
+    logger = current_app.logger
+
+    def generate():
+        started = time.perf_counter()
+        cached = llm_cache.get(key) if cache else None
+        if cached is not None:
+            yield _sse('token', {'text': cached})
+            elapsed = round((time.perf_counter() - started) * 1000, 1)
+            yield _sse('done', {result_field: cached, 'ttft_ms': elapsed, 'total_ms': elapsed, 'cached': True})
+            return
+
+        parts = []
+        ttft_ms = None
+        tokens = llm_module.stream_llm_model(model_name, messages, temperature=temperature, top_p=top_p, **params)
+        completed = False
+        try:
+            for delta in tokens:
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(delta)
+                yield _sse('token', {'text': delta})
+            completed = True
+        except Exception as e:
+            logger.exception('LLM %s stream failed', action.lower())
+            body, status, _ = _llm_error(e, action)
+            yield _sse('error', dict(body, status=status))
+            return
+        finally:
+            tokens.close()
+            if not completed:
+                logger.info('LLM %s stream ended early after %d chunks (ttft_ms=%s)', action.lower(), len(parts), ttft_ms)
+
+        result = ''.join(parts)
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info('LLM %s stream: ttft_ms=%s total_ms=%s', action.lower(), ttft_ms, total_ms)
+        if cache:
+            llm_cache.put(key, model_name, result)
+        yield _sse('done', {result_field: result, 'ttft_ms': ttft_ms, 'total_ms': total_ms, 'cached': False})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 
 @bp.route('/chat', methods=['POST'])
 def chat():
-    """Proxy a simple chat request to OpenAI using model 'gpt-4.1'.
-    Expects JSON: {"prompt": "..."}
-    Returns JSON: {"reply": "..."} or {"error": "..."}
+    """Send a simple chat prompt to the chat model (default 'openai/gpt-4.1').
+    Expects JSON: {"prompt": "...", "stream": bool (optional)}
+    Returns JSON: {"reply": "..."} or {"error": "..."};
+    with stream=true (or ?stream=1) an SSE stream of `token` events ending in `done` {reply}.
     """
     data = request.get_json() or {}
     prompt = data.get('prompt')
     if not prompt or not isinstance(prompt, str):
         return jsonify({'error': 'Missing or invalid prompt'}), 400
 
-    api_key = os.environ.get('OPENAI_API_KEY')
-    if not api_key:
-        return jsonify({'error': 'OpenAI API key not configured on server'}), 500
+    messages = [{'role': 'user', 'content': prompt}]
+    if _wants_stream(data):
+        return _sse_completion(CHAT_MODEL, messages, 'Chat', 'reply', max_tokens=512)
 
-    # Import here to keep dependency optional until runtime
     try:
-        import openai
+        from src import llm as llm_module
+        reply = llm_module.call_llm_model(CHAT_MODEL, messages, max_tokens=512)
     except Exception as e:
-        current_app.logger.error('OpenAI package not available: %s', e)
-        return jsonify({'error': 'OpenAI client library not installed on server'}), 500
+        current_app.logger.exception('LLM chat failed')
+        return _llm_error_response(e, 'Chat')
 
-    try:
-        openai.api_key = api_key
-        # Simple completion-style call; adjust per OpenAI SDK version if needed
-        resp = openai.ChatCompletion.create(
-            model='gpt-4.1',
-            messages=[{'role': 'user', 'content': prompt}],
-            max_tokens=512,
-        )
-        # Navigate the response safely
-        reply = None
-        if isinstance(resp, dict):
-            choices = resp.get('choices')
-            if choices and isinstance(choices, list):
-                first = choices[0]
-                reply = first.get('message', {}).get('content') if isinstance(first, dict) else None
-        # Fallback string representation
-        if not reply:
-            reply = str(resp)
-
-        return jsonify({'reply': reply})
-    except Exception as e:
-        current_app.logger.exception('OpenAI request failed')
-        return jsonify({'error': 'OpenAI request failed', 'detail': str(e)}), 500
+    return jsonify({'reply': reply})
 
 
-@bp.route('/translate', methods=['POST'])
-def translate():
-    """Translate a note or arbitrary text.
-    JSON body options:
-      - note_id: integer (optional) — translate content of the note with this id
-      - text: string (optional) — direct text to translate
-      - target: string (optional) — target language or style (default: 'Chinese')
-    Returns: { translation: '...' }
+def _sse_chunked_translation(text, target):
+    """Stream a multi-chunk translation: one `token` event per chunk, in document order,
+    then `done` {translation, partial, failed_chunks, chunks, ttft_ms, total_ms}.
     """
-    data = request.get_json() or {}
+    from src import translation
+
+    def generate():
+        started = time.perf_counter()
+        parts = []
+        failed = []
+        first_error = None
+        ttft_ms = None
+        chunks = translation.iter_translated_chunks(text, target)
+        try:
+            for i, piece, error in chunks:
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(piece)
+                if error is not None:
+                    failed.append(i)
+                    first_error = first_error or error
+                yield _sse('token', {'text': piece, 'chunk': i, 'failed': error is not None})
+        finally:
+            chunks.close()
+        if failed and len(failed) == len(parts):
+            body, status, _ = _llm_error(first_error, 'Translation')
+            yield _sse('error', dict(body, status=status))
+            return
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        yield _sse('done', {
+            'translation': ''.join(parts), 'partial': bool(failed), 'failed_chunks': failed,
+            'chunks': len(parts), 'ttft_ms': ttft_ms, 'total_ms': total_ms,
+        })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _sse_stored_translation(text):
+    """A stored translation in the event format of a live one: one `token`, then `done`."""
+    def generate():
+        yield _sse('token', {'text': text})
+        yield _sse('done', {'translation': text, 'stored': True, 'ttft_ms': 0.0, 'total_ms': 0.0})
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _wants_async(data):
+    return data.get('async') is True or request.args.get('async', '').lower() in ('1', 'true')
+
+
+def _enqueue_job(kind, data):
+    """Queue `data` as a background job and answer 202 with where to poll for the result."""
+    from src import jobs
+    payload = {k: v for k, v in data.items() if k not in ('async', 'stream')}
+    try:
+        row, created = jobs.enqueue(kind, payload)
+    except jobs.QueueFull as e:
+        return jsonify({'error': 'Too many queued AI jobs, please retry later', 'detail': str(e)}), 429, {'Retry-After': '10'}
+    jobs.ensure_workers(current_app._get_current_object())
+    status_url = f'/api/jobs/{row.id}'
+    return jsonify({
+        'job_id': row.id,
+        'status': row.status,
+        'deduplicated': not created,
+        'status_url': status_url,
+        'events_url': f'{status_url}/events',
+    }), 202, {'Location': status_url}
+
+
+def _note_version(note_id, user_id):
+    """Version of the user's note, or None. Part of a job's payload, so a translation
+    finished before an edit is not reused for the edited note."""
+    from src.models.note import Note
+    from src.models.user import db
+    return db.session.query(Note.version).filter_by(id=note_id, user_id=user_id).scalar()
+
+
+def _translate_source(data):
+    """Resolve (text, target) for a translate request, or an error as (body, status, headers)."""
     note_id = data.get('note_id')
     text = data.get('text')
     target = data.get('target', 'Chinese')
 
     if not text and not note_id:
-        return jsonify({'error': 'Provide either note_id or text to translate'}), 400
+        return None, None, ({'error': 'Provide either note_id or text to translate'}, 400, {})
 
     # Lazily import models to avoid circular imports at module load time
     try:
@@ -74,56 +240,161 @@ def translate():
         from src.models.user import db
     except Exception as e:
         current_app.logger.exception('Failed to import Note model')
-        return jsonify({'error': 'Server configuration error', 'detail': str(e)}), 500
+        return None, None, ({'error': 'Server configuration error', 'detail': str(e)}, 500, {})
 
     if note_id:
-        note = Note.query.get(note_id)
+        # user_id is set by the route from the request's user, never taken from the client
+        note = Note.query.filter_by(id=note_id, user_id=data.get('user_id')).first()
         if not note:
-            return jsonify({'error': 'Note not found'}), 404
+            return None, None, ({'error': 'Note not found'}, 404, {})
         text = note.content
+    return text, target, None
 
-    # Build a concise prompt for translation
-    system_prompt = f"You are a helpful translator. Translate the user's text into {target}. Preserve meaning and formatting. Return only the translated text without commentary."
-    messages = [
-        {'role': 'system', 'content': system_prompt},
-        {'role': 'user', 'content': text}
-    ]
 
-    # Use the project's LLM wrapper if available
+def _stored_translation(data, text, target):
+    """The background pre-translation of the requested note, if it matches its current content."""
+    if not data.get('note_id'):
+        return None
+    from src import pretranslation
+    return pretranslation.stored_translation(data['note_id'], target, text)
+
+
+def run_translate(data):
+    """Translate as /api/translate does, without HTTP. Returns (body, status, headers)."""
+    text, target, error = _translate_source(data)
+    if error:
+        return error
+    stored = _stored_translation(data, text, target)
+    if stored is not None:
+        return {'translation': stored, 'stored': True}, 200, {}
+
+    from src import translation
+    # Long texts are split into chunks translated in parallel; every chunk goes through the cache
     try:
-        from src import llm as llm_module
-        translated = llm_module.call_llm_model(llm_module.model, messages)
+        result = translation.translate_text(text, target)
     except Exception as e:
-        # Detect common content-filtering / policy errors surfaced by LLM clients
-        msg = str(e)
         current_app.logger.exception('LLM translate failed')
-        if 'content_filter' in msg or 'ResponsibleAIPolicyViolation' in msg or 'content_filter_result' in msg:
-            # Return unprocessable entity so frontend can show a friendly message
-            return jsonify({'error': 'Translation blocked by model content filter', 'detail': msg}), 422
-        # Fallback: internal server error for other exceptions
-        return jsonify({'error': 'Translation failed', 'detail': msg}), 500
+        return _llm_error(e, 'Translation')
 
-    return jsonify({'translation': translated})
+    resp = {'translation': result.text}
+    if result.chunks > 1:
+        resp['chunks'] = result.chunks
+    if result.partial:
+        resp['partial'] = True
+        resp['failed_chunks'] = result.failed
+    return resp, 200, {}
 
 
-@bp.route('/generate', methods=['POST'])
-def generate_note():
-    """Generate a note (title + content) from a natural language prompt.
-    Expects JSON: { prompt: string, language: string }
-    Returns: { title: string, content: string }
+@bp.route('/translate', methods=['POST'])
+def translate():
+    """Translate a note or arbitrary text.
+    JSON body options:
+      - note_id: integer (optional) — translate content of the note with this id (one of
+        the requesting user's, see src/accounts.py)
+      - text: string (optional) — direct text to translate
+      - target: string (optional) — target language or style (default: 'Chinese')
+      - stream: bool (optional) — respond with Server-Sent Events instead of JSON (also ?stream=1)
+      - async: bool (optional) — queue a background job and return 202 {job_id} (also ?async=1)
+    Returns: { translation: '...' }; streaming ends with a `done` event carrying `translation`.
+    Long texts are translated in chunks; if some chunks fail the response carries
+    partial=true and failed_chunks (those chunks keep their original text).
+    A note whose current content was already translated in the background
+    (src/pretranslation.py) is answered from the stored copy, with stored=true.
     """
     data = request.get_json() or {}
+    if not data.get('text') and not data.get('note_id'):
+        return jsonify({'error': 'Provide either note_id or text to translate'}), 400
+    if data.get('note_id'):
+        from src import accounts
+        try:
+            data['user_id'] = accounts.current_user_id()
+        except accounts.UnknownUser as e:
+            return jsonify({'error': 'Unknown user', 'detail': str(e)}), 401
+    if _wants_async(data):
+        if data.get('note_id'):
+            data['note_version'] = _note_version(data['note_id'], data['user_id'])
+        return _enqueue_job('translate', data)
+
+    if _wants_stream(data):
+        text, target, error = _translate_source(data)
+        if error:
+            body, status, headers = error
+            return jsonify(body), status, headers
+        stored = _stored_translation(data, text, target)
+        if stored is not None:
+            return _sse_stored_translation(stored)
+        from src import llm as llm_module
+        from src import translation
+        if len(translation.split_text(text)) > 1:
+            return _sse_chunked_translation(text, target)
+        messages = translation.translation_messages(text.strip(), target)
+        return _sse_completion(llm_module.model, messages, 'Translation', 'translation', cache=True)
+
+    body, status, headers = run_translate(data)
+    return jsonify(body), status, headers
+
+
+# Models that rejected response_format=json_schema; they get the prompt-only path from then on
+_NO_SCHEMA_MODELS = set()
+STRUCTURED_OUTPUT = config.get_bool('LLM_STRUCTURED_OUTPUT', True)
+
+
+def _schema_unsupported(e):
+    """True if the upstream rejected the request because of response_format."""
+    status = getattr(e, 'status_code', None)
+    msg = str(e).lower()
+    return status in (400, 422) and ('response_format' in msg or 'json_schema' in msg)
+
+
+def _generate_raw(model_name, messages):
+    """One generation call: JSON-schema structured output when the model supports it."""
+    from src.llm_cache import cached_call_llm_model
+    from src.structured_output import note_response_format, stats
+    if STRUCTURED_OUTPUT and model_name not in _NO_SCHEMA_MODELS:
+        try:
+            raw = cached_call_llm_model(model_name, messages, temperature=0.2, top_p=1.0,
+                                        response_format=note_response_format())
+            stats.incr('schema_calls')
+            return raw
+        except Exception as e:
+            if not _schema_unsupported(e):
+                raise
+            current_app.logger.warning('Model %s rejected json_schema output; using prompt-only JSON', model_name)
+            _NO_SCHEMA_MODELS.add(model_name)
+            stats.incr('schema_unsupported')
+    stats.incr('prompt_calls')
+    # lower temperature for more deterministic, language-following replies
+    return cached_call_llm_model(model_name, messages, temperature=0.2, top_p=1.0)
+
+
+def _parse_note(raw):
+    """Pull (title, content) out of model output."""
+    from src.structured_output import extract_json_object
+    txt = (raw or '').strip()
+    obj = extract_json_object(txt)
+    if obj is not None:
+        return str(obj.get('title', '') or ''), str(obj.get('content', '') or '')
+    # fallback: split by newline — first line title, rest content
+    parts = txt.splitlines()
+    if not parts:
+        return '', ''
+    return parts[0].strip()[:30], '\n'.join(parts[1:]).strip()
+
+
+def run_generate(data):
+    """Generate as /api/generate does, without HTTP. Returns (body, status, headers)."""
     prompt = data.get('prompt')
     language = data.get('language', 'English')
 
     if not prompt or not isinstance(prompt, str):
-        return jsonify({'error': 'Missing or invalid prompt'}), 400
+        return {'error': 'Missing or invalid prompt'}, 400, {}
 
     # Build a focused prompt for title & content generation
     # Stronger instruction to ensure response language and JSON-only output.
     system = (
         "You are a helpful assistant that creates concise note titles and a short note body. "
         "IMPORTANT: The user requests the output language: " + language + "."
+        " Write both the title and the content in " + language + ", whatever language the request is written in."
         " You MUST return ONLY a single JSON object (no surrounding markdown or commentary) with exactly two string fields: \"title\" and \"content\"."
         " The title should be short (<=30 characters). The content should be 1-4 sentences suitable for a quick note."
         " Example output: {\"title\": \"Lunch with Alex\", \"content\": \"Have lunch at 12:30pm tomorrow at the cafe.\"}"
@@ -134,50 +405,20 @@ def generate_note():
         {'role': 'user', 'content': prompt}
     ]
 
+    from src import llm as llm_module
     try:
-        from src import llm as llm_module
-        # lower temperature for more deterministic, language-following replies
-        raw = llm_module.call_llm_model(llm_module.model, messages, temperature=0.2, top_p=1.0)
+        raw = _generate_raw(llm_module.model, messages)
     except Exception as e:
         current_app.logger.exception('LLM generate failed')
-        msg = str(e)
-        if 'content_filter' in msg or 'ResponsibleAIPolicyViolation' in msg or 'content_filter_result' in msg:
-            return jsonify({'error': 'Generation blocked by model content filter', 'detail': msg}), 422
-        return jsonify({'error': 'LLM generation failed', 'detail': msg}), 500
-
-    # Try to parse JSON out of LLM output
-    title = ''
-    content = ''
-    try:
-        import json
-        # Some models may return code blocks or markdown; try to extract first JSON object
-        txt = raw.strip()
-        # attempt to find a JSON substring
-        start = txt.find('{')
-        end = txt.rfind('}')
-        if start != -1 and end != -1 and end > start:
-            candidate = txt[start:end+1]
-            obj = json.loads(candidate)
-            title = obj.get('title', '')
-            content = obj.get('content', '')
-        else:
-            # fallback: split by newline — first line title, rest content
-            parts = txt.splitlines()
-            if parts:
-                title = parts[0].strip()[:30]
-                content = '\n'.join(parts[1:]).strip()
-    except Exception:
-        # If parsing fails, just return the raw text in content and empty title
-        content = raw
+        return _llm_error(e, 'Generation')
 
-    # sanitize lengths
-    if title and len(title) > 30:
-        title = title[:30]
+    title, content = _parse_note(raw)
 
-    # If user requested a non-English language, ensure we return the final result in that language.
-    try:
-        if language and language.lower() != 'english':
-            # Build a translation prompt that requests JSON output for title and content
+    # Fallback: only when the output is detectably in the wrong language, translate it.
+    from src.structured_output import language_mismatch, stats
+    if language_mismatch(title + '\n' + content, language):
+        started = time.perf_counter()
+        try:
             trans_system = (
                 "You are a translator. Translate the provided title and content into the target language: " + language + ". "
                 "Return ONLY a JSON object with two fields: \"title\" and \"content\". Do not include any commentary or markdown."
@@ -186,32 +427,65 @@ def generate_note():
                 {'role': 'system', 'content': trans_system},
                 {'role': 'user', 'content': f"Title: {title}\n\nContent: {content}"}
             ]
-            from src import llm as llm_module
-            translated_raw = llm_module.call_llm_model(llm_module.model, trans_messages, temperature=0.2, top_p=1.0)
-
-            # Attempt to parse returned JSON
-            import json
-            txt = translated_raw.strip()
-            start = txt.find('{')
-            end = txt.rfind('}')
-            if start != -1 and end != -1 and end > start:
-                candidate = txt[start:end+1]
-                try:
-                    obj = json.loads(candidate)
-                    title = obj.get('title', title)
-                    content = obj.get('content', content)
-                except Exception:
-                    # fallback: use raw translation as content
-                    content = translated_raw
-            else:
-                # fallback: put raw translation into content
-                content = translated_raw
-    except Exception as e:
-        current_app.logger.exception('Translation-after-generate failed')
-        # If content filter detected, surface 422 so frontend can show friendly message
-        msg = str(e)
-        if 'content_filter' in msg or 'ResponsibleAIPolicyViolation' in msg or 'content_filter_result' in msg:
-            return jsonify({'error': 'Generation blocked by model content filter', 'detail': msg}), 422
-        # otherwise ignore and return best-effort generated text
-
-    return jsonify({'title': title, 'content': content})
+            translated_raw = _generate_raw(llm_module.model, trans_messages)
+            new_title, new_content = _parse_note(translated_raw)
+            title = new_title or title
+            content = new_content or content
+        except Exception as e:
+            current_app.logger.exception('Translation-after-generate failed')
+            body, status, headers = _llm_error(e, 'Generation')
+            # If content filter detected, surface 422 so frontend can show friendly message
+            if status == 422:
+                return body, status, headers
+            # otherwise ignore and return best-effort generated text
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats.incr('language_fallbacks')
+            stats.incr('language_fallback_ms', elapsed_ms)
+            current_app.logger.info('Generate output was not in %s; translate fallback took %.0f ms', language, elapsed_ms)
+
+    # sanitize lengths
+    if title and len(title) > 30:
+        title = title[:30]
+
+    return {'title': title, 'content': content}, 200, {}
+
+
+@bp.route('/generate', methods=['POST'])
+def generate_note():
+    """Generate a note (title + content) from a natural language prompt.
+    Expects JSON: { prompt: string, language: string, async: bool (optional, also ?async=1) }
+    Returns: { title: string, content: string }, or 202 { job_id } when queued.
+    The note is produced directly in the requested language in one call (JSON-schema
+    output where supported). A translate pass only runs if the output is detectably
+    in the wrong writing system.
+    """
+    data = request.get_json() or {}
+    prompt = data.get('prompt')
+    if not prompt or not isinstance(prompt, str):
+        return jsonify({'error': 'Missing or invalid prompt'}), 400
+    if _wants_async(data):
+        return _enqueue_job('generate', data)
+
+    body, status, headers = run_generate(data)
+    return jsonify(body), status, headers
+
+
+@bp.route('/llm/cache', methods=['GET'])
+def llm_cache_stats():
+    """Hit / miss / eviction counters of the LLM response cache."""
+    from src import admission, llm_cache
+    from src.structured_output import stats
+    data = llm_cache.snapshot()
+    data['generate'] = stats.snapshot()
+    data['admission'] = admission.snapshot()
+    return jsonify(data)
+
+
+def _register_jobs():
+    from src import jobs
+    jobs.register('translate', run_translate)
+    jobs.register('generate', run_generate)
+
+
+_register_jobs()
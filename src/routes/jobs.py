@@ -0,0 +1,61 @@
+import json
+import time
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from src import jobs
+from src.models.job import job_to_dict
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# how long an events stream waits for a job to finish before giving up
+EVENTS_TIMEOUT = 300
+
+
+@jobs_bp.route('/jobs/metrics', methods=['GET'])
+def job_metrics():
+    """Queue depth per status, worker count and queue/run latency per job kind."""
+    return jsonify(jobs.metrics())
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's status; `result` holds the endpoint's response body once finished."""
+    row = jobs.get_job(job_id)
+    if row is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(row))
+
+
+@jobs_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events: a `status` event whenever the status changes, ending with
+    `done` or `failed` carrying the full job (or `timeout`, or `error` when the job was
+    deleted meanwhile)."""
+    if jobs.get_job(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    interval = max(0.1, min(request.args.get('interval', jobs.POLL_INTERVAL, type=float), 5.0))
+
+    def generate():
+        deadline = time.monotonic() + EVENTS_TIMEOUT
+        last = None
+        while time.monotonic() < deadline:
+            row = jobs.get_job(job_id)
+            if row is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+            job = job_to_dict(row)
+            if job['status'] in ('done', 'failed'):
+                yield f"event: {job['status']}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+                return
+            if job['status'] != last:
+                last = job['status']
+                yield f"event: status\ndata: {json.dumps({'status': last})}\n\n"
+            time.sleep(interval)
+        yield f"event: timeout\ndata: {json.dumps({'status': last})}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,72 @@
+from flask import Blueprint, Response
+
+from src import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of request, SQL, LLM, cache and job queue metrics."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _llm_cache():
+    from src import llm_cache
+    data = llm_cache.snapshot()
+    counters = ('memory_hits', 'db_hits', 'misses', 'stores', 'evictions', 'expirations', 'db_errors')
+    yield ('llm_cache_events_total', 'counter', 'LLM response cache events',
+           [({'event': name}, data[name]) for name in counters])
+    yield ('llm_cache_memory_entries', 'gauge', 'Entries in the in-process LLM cache',
+           [({}, data['memory_entries'])])
+
+
+def _generate():
+    from src.structured_output import stats
+    data = stats.snapshot()
+    yield ('llm_generate_events_total', 'counter', 'Generate path: structured vs. prompt-only calls and fallbacks',
+           [({'event': name}, value) for name, value in data.items() if not name.endswith('_ms')])
+
+
+def _jobs():
+    from src import jobs
+    data = jobs.metrics()
+    yield ('jobs_queue_depth', 'gauge', 'AI jobs per status',
+           [({'status': status}, count) for status, count in data['depth'].items()])
+    yield ('jobs_workers', 'gauge', 'Job worker threads in this process', [({}, data['workers'])])
+    samples = []
+    for kind, stats in data['latency'].items():
+        for phase in ('queue_ms', 'run_ms'):
+            if stats[phase]:
+                for q in ('p50', 'p95'):
+                    samples.append(({'kind': kind, 'phase': phase[:-3], 'quantile': q}, stats[phase][q] / 1000))
+    yield ('jobs_latency_seconds', 'gauge', 'Recent job queue wait / run time percentiles', samples)
+
+
+def _embeddings():
+    from src import embeddings
+    yield ('embeddings_index_size', 'gauge', 'Note vectors held in memory for semantic search',
+           [({}, len(embeddings.index))])
+
+
+def _db_pool():
+    from src.db_engine import pool_status
+    from src.models.user import db
+    status = pool_status(db.engine)
+    yield ('db_pool_connections', 'gauge', 'Connections of the SQLAlchemy pool by state',
+           [({'state': state}, status[state]) for state in ('checked_out', 'idle', 'overflow') if state in status])
+    yield ('db_pool_size', 'gauge', 'Configured pool size', [({}, status.get('size'))])
+
+
+def _admission():
+    from src import admission
+    data = admission.snapshot()
+    yield ('ai_admission_events_total', 'counter', 'AI requests admitted, rate limited or shed, and coalesced LLM calls',
+           [({'event': name}, data[name]) for name in admission.Stats.FIELDS])
+    if data['in_flight'] is not None:
+        yield ('ai_requests_in_flight', 'gauge', 'AI requests being served (database backend: all workers)',
+               [({}, data['in_flight'])])
+
+
+for _collector in (_llm_cache, _generate, _jobs, _embeddings, _db_pool, _admission):
+    metrics.register_collector(_collector)
@@ -1,13 +1,267 @@
-from flask import Blueprint, jsonify, request
-from src.models.note import Note, db
+import base64
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, make_response, request, stream_with_context
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm.exc import StaleDataError
+from src.models.note import Note, NoteTombstone, db
+from src.models.user import User
+from src.db_engine import read_engine
+from src import accounts, embeddings, note_batch, note_transfer, revisions, search, serialization, text_diff
 
 note_bp = Blueprint('note', __name__)
 
+PREVIEW_CHARS = 120
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SORT_MODES = ('updated_desc', 'title_asc')
+# changes committed up to this long after their updated_at was stamped are still picked up
+SYNC_OVERLAP = timedelta(seconds=5)
+MAX_SYNC_CHANGES = 500
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+@note_bp.before_request
+def _identify():
+    """Resolve the requesting user (X-User-Id, see src/accounts.py) before any note is read."""
+    try:
+        accounts.current_user_id()
+    except accounts.UnknownUser as e:
+        return jsonify({'error': 'Unknown user', 'detail': str(e)}), 401
+    return None
+
+
+def _owned():
+    """Filter for the requesting user's notes; every note query goes through it."""
+    return Note.user_id == accounts.current_user_id()
+
+
+def _owned_note(note_id):
+    return Note.query.filter(Note.id == note_id, _owned()).first()
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor, size=2):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('malformed cursor')
+    return values
+
+
+def _sync_cursor(as_of):
+    """Opaque cursor for GET /api/notes/changes: everything up to `as_of` has been seen."""
+    return _encode_cursor([as_of.isoformat()])
+
+
+def _full_columns():
+    """Columns of a full note, as plain tuples (no ORM instances)."""
+    return (Note.id, Note.title, Note.content, Note.version, Note.created_at, Note.updated_at)
+
+
+def _list_columns():
+    """Columns of the lightweight list view (no full content)."""
+    return (
+        Note.id, Note.title, Note.version, Note.created_at, Note.updated_at,
+        # the plain prefix column, so listing never reads (or decompresses) the content
+        func.substr(func.coalesce(Note.content_prefix, Note.content), 1, PREVIEW_CHARS).label('preview'),
+    )
+
+
+def _collection_version():
+    """Cheap validator for anything derived from the user's notes: one aggregate over
+    the (user_id, updated_at, id) index plus the latest tombstone, no rows loaded."""
+    count, latest = db.session.query(func.count(Note.id), func.max(Note.updated_at)).filter(_owned()).one()
+    last_delete = db.session.query(func.max(NoteTombstone.id)).filter(
+        NoteTombstone.user_id == accounts.current_user_id()).scalar()
+    return f"{count}:{latest.isoformat() if latest else '-'}:{last_delete or 0}"
+
+
+def _note_version(note_id):
+    version = db.session.query(Note.version).filter(Note.id == note_id, _owned()).scalar()
+    return f'{note_id}:{version}' if version is not None else None
+
+
+def _conditional(version):
+    """Answer If-None-Match with 304 before the view runs.
+    `version(**view_kwargs)` must be cheap; None skips validation (e.g. missing note).
+    The query string is part of the ETag since pages, sorts and searches differ, and the
+    user since each sees their own notes (hence Vary: X-User-Id for shared caches).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            raw = f'{accounts.current_user_id()}|{current}|{request.query_string.decode("latin-1")}'
+            etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.vary.add(accounts.USER_HEADER)
+            return response
+        return wrapper
+    return decorator
+
+
+def _sort_key(sort):
+    """Keyset columns for a sort mode; both end with id so the order is total."""
+    if sort == 'title_asc':
+        return func.lower(Note.title), Note.id
+    return Note.updated_at, Note.id
+
+
+# items keep datetimes as-is; serialization.dumps writes them in isoformat
+def _list_item(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'preview': row.preview,
+        'version': row.version,
+        'created_at': row.created_at,
+        'updated_at': row.updated_at,
+        'can_delete': True,
+    }
+
+
+def _full_item(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'content': row.content,
+        'version': row.version,
+        'created_at': row.created_at,
+        'updated_at': row.updated_at,
+        'can_delete': True,
+    }
+
+
 @note_bp.route('/notes', methods=['GET'])
+@_conditional(_collection_version)
 def get_notes():
-    """Get all notes, ordered by most recently updated"""
-    notes = Note.query.order_by(Note.updated_at.desc()).all()
-    return jsonify([note.to_dict() for note in notes])
+    """Get notes, ordered by most recently updated.
+    Without query params this returns every note (legacy behaviour). Passing any of
+    `limit`, `cursor`, `sort` or `view` switches to keyset pagination and returns
+    { items: [...], next_cursor: str|null }.
+      - sort: 'updated_desc' (default) or 'title_asc'
+      - view: 'list' (default; id, title, preview, timestamps) or 'full'
+      - limit: page size (default 50, max 200)
+      - cursor: next_cursor from the previous page
+    """
+    args = request.args
+    # taken before reading so nothing committed during the read is missed by the next sync
+    as_of = datetime.utcnow()
+    if not any(k in args for k in ('limit', 'cursor', 'sort', 'view')):
+        # streamed straight from the cursor, so large collections never sit in memory
+        stmt = select(*_full_columns()).where(_owned()).order_by(Note.updated_at.desc())
+        return serialization.stream_json_array(read_engine(), stmt)
+
+    sort = args.get('sort', 'updated_desc')
+    if sort not in SORT_MODES:
+        return jsonify({'error': f"sort must be one of {', '.join(SORT_MODES)}"}), 400
+    view = args.get('view', 'list')
+    if view not in ('list', 'full'):
+        return jsonify({'error': "view must be 'list' or 'full'"}), 400
+    try:
+        limit = max(1, min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    key = _sort_key(sort)
+    if view == 'list':
+        query = db.session.query(*_list_columns(), key[0].label('sort_key')).filter(_owned())
+    else:
+        query = db.session.query(*_full_columns(), key[0].label('sort_key')).filter(_owned())
+
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            first, last_id = _decode_cursor(cursor)
+            if sort == 'updated_desc':
+                first = datetime.fromisoformat(first)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        bound = tuple_(*key)
+        query = query.filter(bound < (first, last_id) if sort == 'updated_desc' else bound > (first, last_id))
+
+    order = [c.desc() for c in key] if sort == 'updated_desc' else list(key)
+    # fetch one extra row to learn whether another page exists
+    rows = query.order_by(*order).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    to_item = _list_item if view == 'list' else _full_item
+    items = [to_item(r) for r in rows]
+
+    next_cursor = None
+    if has_more:
+        # the cursor carries the sort value exactly as the database computed it
+        last = rows[-1]
+        first = last.sort_key.isoformat() if sort == 'updated_desc' else last.sort_key
+        next_cursor = _encode_cursor([first, last.id])
+    return serialization.json_response({'items': items, 'next_cursor': next_cursor, 'sync_cursor': _sync_cursor(as_of)})
+
+
+@note_bp.route('/notes/changes', methods=['GET'])
+def get_note_changes():
+    """Delta sync for the notes list.
+    Query param: since — a sync_cursor from GET /api/notes (paginated) or a previous call.
+    Returns { changed: [list items], deleted: [ids], cursor, reset }.
+    Apply deletions before changes; both are idempotent, and a small overlap window
+    means the same change may be delivered twice. reset=true means the cursor is too old
+    or too much changed (or notes were imported since): reload the list from scratch.
+    """
+    since_param = request.args.get('since')
+    if not since_param:
+        return jsonify({'error': 'since is required'}), 400
+    try:
+        since = datetime.fromisoformat(_decode_cursor(since_param, size=1)[0])
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    as_of = datetime.utcnow()
+    if since < as_of - TOMBSTONE_RETENTION:
+        return jsonify({'changed': [], 'deleted': [], 'cursor': _sync_cursor(as_of), 'reset': True})
+
+    window_start = since - SYNC_OVERLAP
+    imported_at = db.session.query(User.notes_imported_at).filter(User.id == accounts.current_user_id()).scalar()
+    if imported_at is not None and imported_at > since:
+        # imported notes keep their old updated_at, so the window below would miss them
+        return jsonify({'changed': [], 'deleted': [], 'cursor': _sync_cursor(as_of), 'reset': True})
+    rows = (
+        db.session.query(*_list_columns())
+        .filter(_owned(), Note.updated_at > window_start)
+        .order_by(Note.updated_at, Note.id)
+        .limit(MAX_SYNC_CHANGES + 1)
+        .all()
+    )
+    if len(rows) > MAX_SYNC_CHANGES:
+        return jsonify({'changed': [], 'deleted': [], 'cursor': _sync_cursor(as_of), 'reset': True})
+
+    deleted = [
+        note_id for (note_id,) in db.session.query(NoteTombstone.note_id)
+        .filter(NoteTombstone.user_id == accounts.current_user_id(), NoteTombstone.deleted_at > window_start)
+        .distinct()
+    ]
+    return serialization.json_response({
+        'changed': [_list_item(r) for r in rows],
+        'deleted': deleted,
+        'cursor': _sync_cursor(as_of),
+        'reset': False,
+    })
 
 @note_bp.route('/notes', methods=['POST'])
 def create_note():
@@ -20,7 +274,7 @@ def create_note():
         if len(title) > 30:
             return jsonify({'error': 'Title should be less than 30 characters'}), 400
 
-        note = Note(title=data['title'], content=data['content'])
+        note = Note(title=data['title'], content=data['content'], user_id=accounts.current_user_id())
         db.session.add(note)
         db.session.commit()
         resp = note.to_dict()
@@ -30,19 +284,120 @@ def create_note():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@note_bp.route('/notes/batch', methods=['POST'])
+def batch_notes():
+    """Create, update and delete many notes in one transaction.
+    Body: { mode?: 'atomic' (default) | 'best_effort', ops: [
+        {op: 'create', title, content},
+        {op: 'update', id, title?, content?, base_version?},
+        {op: 'delete', id, base_version?} ] }   (at most 500 ops)
+    Returns { mode, applied, results: [{index, op, ok, status, id?, version?, error?}] }
+    in request order. An atomic batch with any failing op applies nothing and answers
+    with that op's status.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'No data provided'}), 400
+    mode = data.get('mode', 'atomic')
+    try:
+        results, applied = note_batch.apply_batch(db.engine, data.get('ops'), mode, user_id=accounts.current_user_id())
+    except note_batch.BatchError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    body = {'mode': mode, 'applied': applied, 'results': results}
+    failed = [r for r in results if r['status'] is not None and not r['ok']]
+    if mode == 'atomic' and failed:
+        body['error'] = 'Batch rejected'
+        body['detail'] = f"op {failed[0]['index']}: {failed[0]['error']}"
+        return jsonify(body), failed[0]['status']
+    return jsonify(body)
+
+
+@note_bp.route('/notes/semantic', methods=['GET'])
+def semantic_search_notes():
+    """Notes closest in meaning to `q` (embedding cosine similarity), best first.
+    Query params: q (required), limit (optional, default 10, max 50).
+    Results are list items with a `score`; a note becomes searchable once its
+    embedding job has run after save.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return serialization.json_response([])
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), embeddings.MAX_RESULTS))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        hits = embeddings.search(query, limit, user_id=accounts.current_user_id())
+    except Exception as e:
+        return jsonify({'error': 'Semantic search failed', 'detail': str(e)}), 500
+    if not hits:
+        return serialization.json_response([])
+
+    rows = {r.id: r for r in db.session.query(*_list_columns()).filter(_owned(), Note.id.in_([i for i, _ in hits]))}
+    results = []
+    for note_id, score in hits:
+        if note_id in rows:
+            results.append(dict(_list_item(rows[note_id]), score=round(score, 4)))
+    return serialization.json_response(results)
+
+
+@note_bp.route('/notes/export', methods=['GET'])
+def export_notes():
+    """Stream every note as NDJSON (one JSON object per line, id order).
+    `?gzip=1` returns notes.ndjson.gz instead. Rows are read in batches through a
+    server-side cursor, so memory use does not grow with the number of notes.
+    """
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    chunks = note_transfer.iter_ndjson(note_transfer.iter_export(read_engine(), user_id=accounts.current_user_id()))
+    if compress:
+        chunks = serialization.iter_gzip(chunks)
+    filename = 'notes.ndjson.gz' if compress else 'notes.ndjson'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@note_bp.route('/notes/import', methods=['POST'])
+def import_notes():
+    """Bulk-insert notes from an NDJSON body (the export format), keeping timestamps.
+    Gzip bodies are accepted with `Content-Encoding: gzip` or `?gzip=1`; `?keep_ids=1`
+    keeps the exported ids (for restoring into an empty database).
+    Returns {imported, skipped, errors, seconds, notes_per_sec}.
+    """
+    flag = lambda name: request.args.get(name, '').lower() in ('1', 'true', 'yes')
+    stream = request.stream
+    if flag('gzip') or request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream)
+    try:
+        report = note_transfer.import_ndjson(db.engine, stream, keep_ids=flag('keep_ids'),
+                                            user_id=accounts.current_user_id())
+    except (OSError, UnicodeDecodeError) as e:
+        return jsonify({'error': 'Could not read the upload', 'detail': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Import failed', 'detail': str(e)}), 500
+    return jsonify(report)
+
+
 @note_bp.route('/notes/<int:note_id>', methods=['GET'])
+@_conditional(_note_version)
 def get_note(note_id):
     """Get a specific note by ID"""
-    note = Note.query.get_or_404(note_id)
-    d = note.to_dict()
-    d['can_delete'] = True  # existing notes can be deleted
-    return jsonify(d)
+    row = db.session.execute(select(*_full_columns()).where(Note.id == note_id, _owned())).first()
+    if row is None:
+        return jsonify({'error': 'Note not found'}), 404
+    return serialization.json_response(_full_item(row))  # existing notes can be deleted
 
 @note_bp.route('/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     """Update a specific note"""
     try:
-        note = Note.query.get_or_404(note_id)
+        note = _owned_note(note_id)
+        if note is None:
+            return jsonify({'error': 'Note not found'}), 404
         data = request.json
 
         if not data:
@@ -58,16 +413,120 @@ def update_note(note_id):
         d = note.to_dict()
         d['can_delete'] = True
         return jsonify(d)
+    except StaleDataError:
+        # another request updated (or deleted) the note between our read and write
+        db.session.rollback()
+        note = _owned_note(note_id)
+        if note is None:
+            return jsonify({'error': 'Note not found'}), 404
+        return _version_conflict(note)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _version_conflict(note):
+    return jsonify({
+        'error': 'Version conflict',
+        'detail': 'the note changed since base_version; rebase onto `note` and retry',
+        'version': note.version,
+        'note': note.to_dict(),
+    }), 409
+
+
+@note_bp.route('/notes/<int:note_id>', methods=['PATCH'])
+def patch_note(note_id):
+    """Apply a text diff to a note's content.
+    Body: { base_version: int, ops: [[start, delete_count, insert], ...], title?: str }
+    Offsets are UTF-16 code units (see src/text_diff.py). Returns the note without its
+    content (the client already has it), or 409 with the current version and note when
+    base_version is stale.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'No data provided'}), 400
+    base_version = data.get('base_version')
+    if not isinstance(base_version, int) or isinstance(base_version, bool):
+        return jsonify({'error': 'base_version must be an integer'}), 400
+
+    note = _owned_note(note_id)
+    if note is None:
+        return jsonify({'error': 'Note not found'}), 404
+    if note.version != base_version:
+        return _version_conflict(note)
+
+    try:
+        content = text_diff.apply_splices(note.content, data.get('ops', []))
+    except ValueError as e:
+        return jsonify({'error': 'Invalid diff', 'detail': str(e)}), 400
+    if data.get('title') is not None:
+        new_title = str(data['title']).strip()
+        if len(new_title) > 30:
+            return jsonify({'error': 'Title should be less than 30 characters'}), 400
+        if new_title and new_title != note.title:
+            note.title = new_title
+    if content != note.content:
+        note.content = content
+
+    try:
+        # the UPDATE is conditional on the version read above, so concurrent writers
+        # cannot both win; the loser gets the same 409 as a stale base_version
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        note = _owned_note(note_id)
+        if note is None:
+            return jsonify({'error': 'Note not found'}), 404
+        return _version_conflict(note)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    d = note.to_dict(include_content=False)
+    d['can_delete'] = True
+    return jsonify(d)
+
+
+@note_bp.route('/notes/<int:note_id>/revisions', methods=['GET'])
+def list_note_revisions(note_id):
+    """Saved revisions of a note, newest first, without content.
+    Query params: limit (optional, default 50, max 200), before (revision number; pass
+    the returned `next_before` for the next page).
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        before = request.args.get('before', type=int)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if _note_version(note_id) is None:
+        return jsonify({'error': 'Note not found'}), 404
+    rows = revisions.list_revisions(note_id, limit + 1, before)
+    items = [{'number': r.number, 'version': r.version, 'title': r.title, 'full': bool(r.full),
+              'created_at': r.created_at, 'updated_at': r.updated_at} for r in rows[:limit]]
+    next_before = items[-1]['number'] if len(rows) > limit else None
+    return serialization.json_response({'note_id': note_id, 'revisions': items, 'next_before': next_before})
+
+
+@note_bp.route('/notes/<int:note_id>/revisions/<int:number>', methods=['GET'])
+def get_note_revision(note_id, number):
+    """One revision of a note with its title and content as they were then."""
+    revision = revisions.get_revision(note_id, number) if _note_version(note_id) is not None else None
+    if revision is None:
+        return jsonify({'error': 'Revision not found'}), 404
+    return serialization.json_response(dict(revision, note_id=note_id))
+
+
 @note_bp.route('/notes/<int:note_id>', methods=['DELETE'])
 def delete_note(note_id):
     """Delete a specific note"""
     try:
-        note = Note.query.get_or_404(note_id)
+        note = _owned_note(note_id)
+        if note is None:
+            return jsonify({'error': 'Note not found'}), 404
         db.session.delete(note)
+        # leave a tombstone for delta sync, and drop ones no client can still need
+        db.session.add(NoteTombstone(note_id=note_id, user_id=note.user_id))
+        NoteTombstone.query.filter(
+            NoteTombstone.deleted_at < datetime.utcnow() - TOMBSTONE_RETENTION
+        ).delete(synchronize_session=False)
         db.session.commit()
         return '', 204
     except Exception as e:
@@ -75,20 +534,17 @@ def delete_note(note_id):
         return jsonify({'error': str(e)}), 500
 
 @note_bp.route('/notes/search', methods=['GET'])
+@_conditional(_collection_version)
 def search_notes():
-    """Search notes by title or content"""
-    query = request.args.get('q', '')
+    """Search notes by title or content, best matches first.
+    Query params: q (required), limit (optional, default 50, max 200).
+    Each result carries `rank` and a `snippet` with matches wrapped in <mark></mark>.
+    """
+    query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
 
-    notes = Note.query.filter(
-        (Note.title.contains(query)) | (Note.content.contains(query))
-    ).order_by(Note.updated_at.desc()).all()
-
-    results = []
-    for n in notes:
-        d = n.to_dict()
+    results = search.search(db, query, search.clamp_limit(request.args.get('limit')), accounts.current_user_id())
+    for d in results:
         d['can_delete'] = True
-        results.append(d)
-    return jsonify(results)
-
+    return serialization.json_response(results)
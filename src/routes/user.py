@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
-from src.models.user import User, db
+from src.models.note import Note
+from src.models.user import User, db, split_languages
 
 user_bp = Blueprint('user', __name__)
 
@@ -12,7 +13,8 @@ def get_users():
 def create_user():
     
     data = request.json
-    user = User(username=data['username'], email=data['email'])
+    user = User(username=data['username'], email=data['email'],
+                translate_languages=','.join(split_languages(data.get('translate_languages'))) or None)
     db.session.add(user)
     db.session.commit()
     return jsonify(user.to_dict()), 201
@@ -28,12 +30,16 @@ def update_user(user_id):
     data = request.json
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
+    if 'translate_languages' in data:
+        user.translate_languages = ','.join(split_languages(data['translate_languages'])) or None
     db.session.commit()
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
+    if db.session.query(Note.id).filter(Note.user_id == user_id).first() is not None:
+        return jsonify({'error': 'User still owns notes'}), 409
     db.session.delete(user)
     db.session.commit()
     return '', 204
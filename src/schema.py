@@ -0,0 +1,54 @@
+"""Idempotent schema upgrades for databases created before a model change.
+
+`db.create_all()` only creates missing tables; it never touches existing ones.
+Anything added to an existing table (indexes, columns) is applied here instead.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+
+def _index_names(engine, table):
+    if engine.dialect.name == 'sqlite':
+        # the SQLite inspector skips expression indexes such as (user_id, lower(title))
+        with engine.connect() as conn:
+            return set(conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"), {'t': table.name}
+            ).scalars())
+    return {ix['name'] for ix in inspect(engine).get_indexes(table.name)}
+
+
+def _missing_indexes(engine, table):
+    existing = _index_names(engine, table)
+    return [ix for ix in table.indexes if ix.name not in existing]
+
+
+def _missing_columns(engine, table):
+    existing = {col['name'] for col in inspect(engine).get_columns(table.name)}
+    return [col for col in table.columns if col.name not in existing]
+
+
+def _add_column(engine, table, column):
+    """ALTER TABLE ... ADD COLUMN; NOT NULL columns need a server_default to fill existing rows."""
+    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+
+
+def upgrade_schema(engine):
+    """Bring existing tables up to date with the models. Returns a list of applied changes."""
+    from src.models.job import AIJob
+    from src.models.note import Note, NoteTombstone
+    from src.models.user import User
+
+    applied = []
+    for model in (Note, NoteTombstone, AIJob, User):
+        table = model.__table__
+        if not inspect(engine).has_table(table.name):
+            continue
+        for col in _missing_columns(engine, table):
+            _add_column(engine, table, col)
+            applied.append(f'column {table.name}.{col.name}')
+        for ix in _missing_indexes(engine, table):
+            ix.create(engine)
+            applied.append(f'index {ix.name}')
+    return applied
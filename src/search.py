@@ -0,0 +1,295 @@
+"""Full-text search index for notes.
+
+SQLite uses an FTS5 external-content table kept in sync by triggers on `note` and
+reading the `note_fts_source` view for snippets and rebuilds; Postgres uses a generated
+`tsvector` column with a GIN index. Both live in the database itself, so every writer
+(ORM or bulk statements) keeps the index current. With CONTENT_COMPRESSION on, the view
+and triggers read content through note_plain() (src/content_storage.py), which decodes
+compressed values; that SQL function exists only on connections opened by the app, so
+other SQLite clients (the sqlite3 shell, scripts using sqlite3.connect) can then read
+`note` but not write it. With compression off they read the column directly and any
+client can write.
+Other backends (MySQL) fall back to the old LIKE scan. Results are limited to the
+requesting user's notes.
+"""
+import threading
+
+from sqlalchemy import DateTime, func, text
+
+from src.content_storage import CompressedText, compression_enabled
+
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+# trigram tokenizer can only match terms of at least 3 characters
+MIN_TRIGRAM_TERM = 3
+
+_ready = set()
+_lock = threading.Lock()
+
+_SQLITE_TABLE = ("CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5("
+                 "title, content, content='note_fts_source', content_rowid='id', tokenize='{tokenizer}')")
+# the view and triggers feeding it, in one of two forms (see the module docstring)
+_SQLITE_SYNC = [
+    "CREATE VIEW IF NOT EXISTS note_fts_source AS SELECT id, title, {content} AS content FROM note",
+    "CREATE TRIGGER IF NOT EXISTS note_fts_ai AFTER INSERT ON note BEGIN "
+    "INSERT INTO note_fts(rowid, title, content) VALUES (new.id, new.title, {new_content}); END",
+    "CREATE TRIGGER IF NOT EXISTS note_fts_ad AFTER DELETE ON note BEGIN "
+    "INSERT INTO note_fts(note_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, {old_content}); END",
+    "CREATE TRIGGER IF NOT EXISTS note_fts_au AFTER UPDATE OF title, content ON note BEGIN "
+    "INSERT INTO note_fts(note_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, {old_content}); "
+    "INSERT INTO note_fts(rowid, title, content) VALUES (new.id, new.title, {new_content}); END",
+]
+_SQLITE_SYNC_DROP = ["DROP TRIGGER IF EXISTS note_fts_ai", "DROP TRIGGER IF EXISTS note_fts_ad",
+                     "DROP TRIGGER IF EXISTS note_fts_au", "DROP VIEW IF EXISTS note_fts_source"]
+# indexes created before content compression read `note` directly; they are replaced
+_SQLITE_OLD = _SQLITE_SYNC_DROP[:3] + ["DROP TABLE IF EXISTS note_fts"]
+
+_POSTGRES_DDL = [
+    "ALTER TABLE note ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_note_search_vector ON note USING GIN (search_vector)",
+]
+
+
+def backend(engine):
+    """Return 'sqlite', 'postgresql' or None when no native index is supported."""
+    name = engine.dialect.name
+    return name if name in ('sqlite', 'postgresql') else None
+
+
+def _sqlite_tokenizer(conn):
+    # trigram (SQLite >= 3.34) matches substrings, which keeps CJK search working
+    version = tuple(int(p) for p in conn.exec_driver_sql('select sqlite_version()').scalar().split('.'))
+    return 'trigram' if version >= (3, 34, 0) else 'unicode61'
+
+
+def _sqlite_decodes(conn):
+    """Whether the index is fed through note_plain(); a plain one needs no SQL function."""
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type='view' AND name='note_fts_source'").scalar()
+    return sql is not None and 'note_plain' in sql
+
+
+def _sqlite_wants_decoding(conn):
+    # compression off but compressed rows left (not migrated back yet) still need decoding
+    return compression_enabled() or (_sqlite_decodes(conn) and conn.exec_driver_sql(
+        "SELECT 1 FROM note WHERE typeof(content) = 'blob' LIMIT 1").first() is not None)
+
+
+def _sqlite_sync(conn, decode, replace=False):
+    """Create the view and triggers, reading content through note_plain() when `decode`."""
+    if replace:
+        # the indexed text is the same either way, only how it is read changes: no rebuild
+        for ddl in _SQLITE_SYNC_DROP:
+            conn.exec_driver_sql(ddl)
+    column = (lambda c: f'note_plain({c})') if decode else (lambda c: c)
+    for ddl in _SQLITE_SYNC:
+        conn.exec_driver_sql(ddl.format(content=column('content'), new_content=column('new.content'),
+                                        old_content=column('old.content')))
+
+
+def _sqlite_index_exists(conn):
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type='table' AND name='note_fts'").scalar()
+    # one from before content compression indexes stored bytes; it is replaced by DDL only
+    return sql is not None and 'note_fts_source' in sql
+
+
+def _postgres_index_exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM pg_indexes WHERE tablename = 'note' AND indexname = 'ix_note_search_vector'"
+    ).scalar() is not None
+
+
+def index_ready(engine):
+    """The backend of the index if it exists, else None. Only reads the catalog (and only
+    until the index is found): requests never run the DDL of ensure_search_index(), which
+    rewrites or backfills the whole table. Without the index, search falls back to LIKE."""
+    kind = backend(engine)
+    key = str(engine.url)
+    if kind is None or key in _ready:
+        return kind
+    with engine.connect() as conn:
+        exists = _sqlite_index_exists(conn) if kind == 'sqlite' else _postgres_index_exists(conn)
+    if not exists:
+        return None
+    _ready.add(key)
+    return kind
+
+
+def ensure_search_index(engine):
+    """Create the index (and backfill it) if it does not exist yet. Cheap after the first call.
+    Runs at startup with AUTO_CREATE_TABLES, or from scripts/upgrade_db.py and
+    scripts/backfill_search_index.py."""
+    kind = backend(engine)
+    key = str(engine.url)
+    if kind is None or key in _ready:
+        return kind
+    with _lock:
+        if key in _ready:
+            return kind
+        with engine.begin() as conn:
+            if kind == 'sqlite':
+                sql = conn.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type='table' AND name='note_fts'"
+                ).scalar()
+                exists = _sqlite_index_exists(conn)
+                if sql is not None and not exists:
+                    for ddl in _SQLITE_OLD:
+                        conn.exec_driver_sql(ddl)
+                decode = _sqlite_wants_decoding(conn)
+                _sqlite_sync(conn, decode, replace=exists and decode != _sqlite_decodes(conn))
+                conn.exec_driver_sql(_SQLITE_TABLE.format(tokenizer=_sqlite_tokenizer(conn)))
+                if not exists:
+                    conn.exec_driver_sql("INSERT INTO note_fts(note_fts) VALUES ('rebuild')")
+            else:
+                # adding a stored generated column computes it for every existing row
+                for ddl in _POSTGRES_DDL:
+                    conn.exec_driver_sql(ddl)
+        _ready.add(key)
+    return kind
+
+
+def match_content_storage(engine):
+    """SQLite: switch an existing index to reading through note_plain() when compression
+    was turned on since it was created, before any compressed content is written. Only
+    replaces the view and triggers (no rebuild), so it runs at every startup."""
+    if backend(engine) != 'sqlite' or not compression_enabled():
+        return False
+    with engine.begin() as conn:
+        if not _sqlite_index_exists(conn) or _sqlite_decodes(conn):
+            return False
+        _sqlite_sync(conn, decode=True, replace=True)
+    return True
+
+
+def rebuild_search_index(engine):
+    """Backfill the index from the current contents of `note`."""
+    kind = ensure_search_index(engine)
+    if kind == 'sqlite':
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO note_fts(note_fts) VALUES ('rebuild')")
+            conn.exec_driver_sql("INSERT INTO note_fts(note_fts) VALUES ('optimize')")
+    elif kind == 'postgresql':
+        with engine.begin() as conn:
+            conn.exec_driver_sql('REINDEX INDEX ix_note_search_vector')
+    return kind
+
+
+def clamp_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _fts5_query(query):
+    """Turn free text into an FTS5 expression: every term is a quoted phrase, all terms required."""
+    terms = query.split()
+    if not terms or any(len(t) < MIN_TRIGRAM_TERM for t in terms):
+        return None
+    return ' '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _row(r):
+    return {
+        'id': r.id,
+        'title': r.title,
+        'content': r.content,
+        'created_at': r.created_at.isoformat() if r.created_at else None,
+        'updated_at': r.updated_at.isoformat() if r.updated_at else None,
+    }
+
+
+def _search_sqlite(session, query, limit, user_id):
+    match = _fts5_query(query)
+    if match is None:
+        return None
+    rows = session.execute(text(
+        "SELECT n.id, n.title, n.content, n.created_at, n.updated_at, "
+        "bm25(note_fts, 10.0, 1.0) AS rank, "
+        "snippet(note_fts, 1, :open, :close, '…', 24) AS snippet "
+        "FROM note_fts JOIN note n ON n.id = note_fts.rowid "
+        "WHERE note_fts MATCH :q AND n.user_id = :user_id ORDER BY rank LIMIT :limit"
+    ).columns(content=CompressedText, created_at=DateTime, updated_at=DateTime),
+        {'q': match, 'open': HIGHLIGHT_OPEN, 'close': HIGHLIGHT_CLOSE, 'limit': limit, 'user_id': user_id})
+    results = []
+    for r in rows:
+        d = _row(r)
+        d['rank'] = -r.rank  # bm25() is "lower is better"
+        d['snippet'] = r.snippet
+        results.append(d)
+    return results
+
+
+def _search_postgres(session, query, limit, user_id):
+    # rank inside the subquery so ts_headline only runs on the rows we return
+    rows = session.execute(text(
+        "SELECT n.id, n.title, n.content, n.created_at, n.updated_at, hits.rank, "
+        "ts_headline('simple', n.content, websearch_to_tsquery('simple', :q), :opts) AS snippet "
+        "FROM (SELECT id, ts_rank(search_vector, websearch_to_tsquery('simple', :q)) AS rank "
+        "      FROM note WHERE search_vector @@ websearch_to_tsquery('simple', :q) AND user_id = :user_id "
+        "      ORDER BY rank DESC LIMIT :limit) hits "
+        "JOIN note n ON n.id = hits.id ORDER BY hits.rank DESC, n.updated_at DESC"
+    ).columns(created_at=DateTime, updated_at=DateTime), {
+        'q': query,
+        'limit': limit,
+        'user_id': user_id,
+        'opts': f'StartSel={HIGHLIGHT_OPEN}, StopSel={HIGHLIGHT_CLOSE}, MaxWords=30, MinWords=10',
+    })
+    results = []
+    for r in rows:
+        d = _row(r)
+        d['rank'] = float(r.rank)
+        d['snippet'] = r.snippet
+        results.append(d)
+    return results
+
+
+def _like_snippet(content, query, width=60):
+    pos = content.lower().find(query.lower())
+    if pos == -1:
+        return content[:width * 2]
+    start = max(0, pos - width)
+    end = min(len(content), pos + len(query) + width)
+    return (
+        ('…' if start > 0 else '')
+        + content[start:pos] + HIGHLIGHT_OPEN + content[pos:pos + len(query)] + HIGHLIGHT_CLOSE
+        + content[pos + len(query):end]
+        + ('…' if end < len(content) else '')
+    )
+
+
+def _search_like(query, limit, user_id):
+    from src.models.note import Note, db
+    content = Note.content
+    if db.engine.dialect.name == 'sqlite':
+        content = func.note_plain(Note.content)  # compressed rows hold bytes, not text
+    notes = Note.query.filter(
+        Note.user_id == user_id, (Note.title.contains(query)) | (content.contains(query))
+    ).order_by(Note.updated_at.desc()).limit(limit).all()
+    results = []
+    for n in notes:
+        d = n.to_dict()
+        d['rank'] = None
+        d['snippet'] = _like_snippet(n.content or '', query)
+        results.append(d)
+    return results
+
+
+def search(db, query, limit=DEFAULT_LIMIT, user_id=None):
+    """Ranked search of one user's notes with highlighted snippets; falls back to LIKE
+    when no index applies."""
+    kind = index_ready(db.engine)
+    results = None
+    if kind == 'sqlite':
+        results = _search_sqlite(db.session, query, limit, user_id)
+    elif kind == 'postgresql':
+        results = _search_postgres(db.session, query, limit, user_id)
+    if results is None:
+        results = _search_like(query, limit, user_id)
+    return results
@@ -0,0 +1,155 @@
+"""Fast JSON responses for the notes API.
+
+- dumps(): orjson when installed (datetimes encoded natively), else the stdlib encoder
+- json_response(): a Response from plain dicts/lists, skipping jsonify's pretty/sort work
+- stream_json_array(): encode a Core SELECT as a JSON array chunk by chunk
+- compress_response(): gzip/br negotiated from Accept-Encoding, for after_request
+
+Configuration (environment):
+  COMPRESS_MIN_BYTES   smallest body worth compressing (default 1024)
+  COMPRESS_LEVEL       gzip level 1-9 (default 6)
+"""
+import gzip
+import json
+import zlib
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+from src import config
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+COMPRESS_MIN_BYTES = config.get_int('COMPRESS_MIN_BYTES', '1024')
+COMPRESS_LEVEL = config.get_int('COMPRESS_LEVEL', '6')
+STREAM_BATCH = 500
+# gzip output of streamed bodies is flushed every this many chunks so the stream keeps moving
+GZIP_FLUSH_CHUNKS = 200
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                      'application/javascript', 'text/javascript')
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(obj):
+    """Encode to UTF-8 JSON bytes; naive datetimes come out as isoformat() would write them."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def row_dicts(result, **extra):
+    """Dicts from a Core result's column tuples, with `extra` keys added to each."""
+    keys = list(result.keys())
+    for row in result:
+        d = dict(zip(keys, row))
+        d.update(extra)
+        yield d
+
+
+def _array_chunks(engine, stmt, extra, batch):
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch).execute(stmt)
+        yield b'['
+        first = True
+        for partition in result.partitions():
+            keys = list(result.keys())
+            items = [dumps(dict(zip(keys, row), **extra)) for row in partition]
+            yield (b'' if first else b',') + b','.join(items)
+            first = False
+        yield b']'
+
+
+def stream_json_array(engine, stmt, extra=None, batch=STREAM_BATCH):
+    """Response that encodes `stmt`'s rows as a JSON array, `batch` rows at a time."""
+    return Response(stream_with_context(_array_chunks(engine, stmt, extra or {}, batch)),
+                    mimetype='application/json')
+
+
+def iter_gzip(chunks, flush_every=GZIP_FLUSH_CHUNKS, level=COMPRESS_LEVEL):
+    """Gzip a stream of byte chunks incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    try:
+        for i, chunk in enumerate(chunks, 1):
+            out = compressor.compress(chunk)
+            if i % flush_every == 0:
+                out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+    finally:
+        # pass an early close (client went away) on to the wrapped stream
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _brotli():
+    try:
+        import brotli  # optional (gzip is always available); only loaded when a client accepts br
+    except ImportError:
+        return None
+    return brotli
+
+
+def _accepted(accept_encoding):
+    """Encodings the client accepts with q > 0."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def compress_response(response, accept_encoding):
+    """Compress a JSON/text response if the client accepts it and it is worth it.
+    Streamed JSON arrays are gzipped on the fly; other streams (SSE, NDJSON exports)
+    and file passthroughs are left alone.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    accepted = _accepted(accept_encoding)
+    if response.direct_passthrough or not (accepted & {'gzip', 'br'}):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if response.is_streamed:
+        if 'gzip' not in accepted:
+            return response
+        response.response = iter_gzip(response.response)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    brotli = _brotli() if 'br' in accepted else None
+    if brotli is not None:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted:
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
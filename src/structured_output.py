@@ -0,0 +1,176 @@
+"""Helpers for getting structured (JSON) answers out of chat models.
+
+- NOTE_SCHEMA / note_response_format(): JSON-schema response_format for {title, content}
+- JSONObjectExtractor: incremental scanner that pulls JSON objects out of free text
+  (code fences, commentary, streamed chunks) for models without schema support
+- language_mismatch(): cheap script-based check that output is in the requested language
+"""
+import json
+import threading
+import unicodedata
+
+NOTE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string', 'description': 'Short note title, at most 30 characters'},
+        'content': {'type': 'string', 'description': 'Note body, 1-4 sentences'},
+    },
+    'required': ['title', 'content'],
+    'additionalProperties': False,
+}
+
+
+def note_response_format():
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': 'note', 'strict': True, 'schema': NOTE_SCHEMA},
+    }
+
+
+class JSONObjectExtractor:
+    """Find top-level JSON objects in text fed piece by piece.
+
+    Tracks brace depth outside of string literals (honouring escapes), so braces inside
+    strings and text around the object (markdown fences, commentary) are handled.
+    Candidates that fail to parse are skipped and scanning resumes after their '{'.
+    """
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0       # next character to scan
+        self._start = None  # index of the '{' opening the current candidate
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        """Add text; return the list of objects completed by it."""
+        self._buf += chunk
+        found = []
+        while self._pos < len(self._buf):
+            ch = self._buf[self._pos]
+            self._pos += 1
+            if self._start is None:
+                if ch == '{':
+                    self._start = self._pos - 1
+                    self._depth = 1
+                    self._in_string = self._escaped = False
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self._buf[self._start:self._pos]
+                    start, self._start = self._start, None
+                    try:
+                        obj = json.loads(candidate)
+                    except ValueError:
+                        # not JSON after all; rescan from just after this '{'
+                        self._pos = start + 1
+                        continue
+                    if isinstance(obj, dict):
+                        found.append(obj)
+        if self._start is None:
+            # nothing pending; drop text that was already scanned
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        return found
+
+
+def extract_json_object(text, required=('title', 'content')):
+    """Return the first JSON object in text that has all `required` keys (else the first object, else None)."""
+    objects = JSONObjectExtractor().feed(text or '')
+    for obj in objects:
+        if all(k in obj for k in required):
+            return obj
+    return objects[0] if objects else None
+
+
+# Unicode scripts we can tell apart cheaply, and the languages written in them
+_LANGUAGE_SCRIPTS = {
+    'chinese': {'han'},
+    'japanese': {'han', 'kana'},
+    'korean': {'hangul', 'han'},
+    'russian': {'cyrillic'},
+    'ukrainian': {'cyrillic'},
+    'arabic': {'arabic'},
+    'hebrew': {'hebrew'},
+    'thai': {'thai'},
+    'greek': {'greek'},
+    'hindi': {'devanagari'},
+}
+_LATIN_LANGUAGES = {
+    'english', 'french', 'spanish', 'german', 'italian', 'portuguese', 'dutch',
+    'vietnamese', 'indonesian', 'turkish', 'polish', 'swedish',
+}
+
+
+def _script(ch):
+    if '぀' <= ch <= 'ヿ':
+        return 'kana'
+    if '가' <= ch <= '힯' or 'ᄀ' <= ch <= 'ᇿ':
+        return 'hangul'
+    try:
+        name = unicodedata.name(ch)
+    except ValueError:
+        return None
+    if name.startswith('CJK'):
+        return 'han'
+    for script in ('LATIN', 'CYRILLIC', 'ARABIC', 'HEBREW', 'THAI', 'GREEK', 'DEVANAGARI'):
+        if name.startswith(script):
+            return script.lower()
+    return None
+
+
+def dominant_script(text):
+    counts = {}
+    for ch in text:
+        if ch.isalpha():
+            script = _script(ch)
+            if script:
+                counts[script] = counts.get(script, 0) + 1
+    return max(counts, key=counts.get) if counts else None
+
+
+def language_mismatch(text, language):
+    """True when text is clearly not written in `language`.
+    Only the writing system is checked, so e.g. French vs. Spanish is never flagged.
+    Unknown languages and text without letters are never flagged.
+    """
+    lang = (language or '').strip().lower()
+    expected = _LANGUAGE_SCRIPTS.get(lang) or ({'latin'} if lang in _LATIN_LANGUAGES else None)
+    script = dominant_script(text or '')
+    if expected is None or script is None:
+        return False
+    return script not in expected
+
+
+class Stats:
+    """Counters for the generate path (structured vs. prompt-only calls, translate fallbacks)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'schema_calls': 0, 'prompt_calls': 0, 'schema_unsupported': 0,
+                        'language_fallbacks': 0, 'language_fallback_ms': 0.0}
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+stats = Stats()
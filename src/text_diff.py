@@ -0,0 +1,88 @@
+"""Compact text diffs for PATCH /api/notes/<id>.
+
+A diff is a list of splices [start, delete_count, insert], applied in order, each to the
+result of the previous one. Offsets count UTF-16 code units, the same as JavaScript
+string indexes, so the browser can compute them with plain string operations.
+
+diff_splices() computes such a diff on the server (revision history stores them).
+"""
+import difflib
+
+MAX_OPS = 1000
+
+
+def _units(text):
+    return text.encode('utf-16-le', 'surrogatepass')
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def apply_splices(text, ops):
+    """Return `text` with `ops` applied. Raises ValueError for malformed or out-of-range ops."""
+    if not isinstance(ops, list):
+        raise ValueError('ops must be a list')
+    if len(ops) > MAX_OPS:
+        raise ValueError(f'at most {MAX_OPS} ops per diff')
+    if not ops:
+        return text
+    buf = bytearray(_units(text))
+    for op in ops:
+        if not (isinstance(op, list) and len(op) == 3 and _is_count(op[0]) and _is_count(op[1])
+                and isinstance(op[2], str)):
+            raise ValueError('each op must be [start, delete_count, insert]')
+        start, delete, insert = op
+        if start + delete > len(buf) // 2:
+            raise ValueError(f'op [{start}, {delete}] is outside the text')
+        buf[start * 2:(start + delete) * 2] = _units(insert)
+    try:
+        # strict decoding rejects a diff that leaves half of a surrogate pair behind
+        return bytes(buf).decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('diff splits a character') from None
+
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def diff_splices(old, new, max_lines=None):
+    """Splices that turn `old` into `new` (apply_splices(old, ops) == new).
+    Lines are matched with difflib, then each changed block is narrowed to the characters
+    that differ, so an edit inside one long line stays small. Ops run from the end of the
+    text backwards, so every offset is still valid when its op is applied. Diffs of more
+    than MAX_OPS blocks become one splice over the changed span.
+    Lines both texts start or end with are skipped before difflib (quadratic at worst)
+    sees them; returns None instead when more than `max_lines` lines remain on a side."""
+    a, b = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    first = _common_prefix(a, b)
+    last = _common_prefix(a[first:][::-1], b[first:][::-1])
+    if max_lines is not None and max(len(a), len(b)) - first - last > max_lines:
+        return None
+    offsets = [0]
+    for line in a:
+        offsets.append(offsets[-1] + len(_units(line)) // 2)
+    ops = []
+    opcodes = difflib.SequenceMatcher(None, a[first:len(a) - last], b[first:len(b) - last],
+                                      autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == 'equal':
+            continue
+        i1, i2, j1, j2 = i1 + first, i2 + first, j1 + first, j2 + first
+        removed, added = ''.join(a[i1:i2]), ''.join(b[j1:j2])
+        head = _common_prefix(removed, added)
+        tail = _common_prefix(removed[head:][::-1], added[head:][::-1])
+        removed, added = removed[head:len(removed) - tail], added[head:len(added) - tail]
+        start = offsets[i1] + len(_units(''.join(a[i1:i2])[:head])) // 2
+        ops.append([start, len(_units(removed)) // 2, added])
+    if len(ops) > MAX_OPS:
+        head = _common_prefix(old, new)
+        tail = _common_prefix(old[head:][::-1], new[head:][::-1])
+        ops = [[len(_units(old[:head])) // 2, len(_units(old[head:len(old) - tail])) // 2,
+                new[head:len(new) - tail]]]
+    return ops
@@ -0,0 +1,178 @@
+"""Translation pipeline shared by /api/translate and background jobs.
+
+Long texts are split on markdown/paragraph boundaries into chunks that fit a token
+budget, translated concurrently on a bounded thread pool and stitched back together
+in order. Each chunk goes through the LLM cache, so after an edit only the chunks
+whose text changed reach the model again.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TOKENS = config.get_int('TRANSLATE_CHUNK_TOKENS', '1500')
+WORKERS = config.get_int('TRANSLATE_WORKERS', '4')
+
+_FENCE = re.compile(r'^(```|~~~)')
+_HEADING = re.compile(r'^#{1,6}\s')
+_SENTENCE = re.compile(r'.*?(?:[.!?。！？；;]+\s*|$)', re.S)
+_CJK = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PartialTranslation:
+    """Result of a chunked translation; failed chunks keep their original text."""
+
+    def __init__(self, text, chunks, failed):
+        self.text = text
+        self.chunks = chunks
+        self.failed = failed
+
+    @property
+    def partial(self):
+        return bool(self.failed)
+
+
+def translation_messages(text, target):
+    # Build a concise prompt for translation
+    system_prompt = f"You are a helpful translator. Translate the user's text into {target}. Preserve meaning and formatting. Return only the translated text without commentary."
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': text}
+    ]
+
+
+def estimate_tokens(text):
+    """Rough token count: CJK characters are about one token each, other text about four chars per token."""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _blocks(text):
+    """Split text into markdown blocks. Joining the blocks gives back the exact input."""
+    blocks = []
+    current = []
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if _FENCE.match(stripped):
+            if not in_fence and current:
+                blocks.append(''.join(current))
+                current = []
+            in_fence = not in_fence
+            current.append(line)
+            if not in_fence:
+                blocks.append(''.join(current))
+                current = []
+            continue
+        if in_fence:
+            current.append(line)
+            continue
+        if _HEADING.match(stripped) and current and current[-1].strip():
+            blocks.append(''.join(current))
+            current = []
+        current.append(line)
+        # a blank line closes the paragraph; it stays attached as trailing whitespace
+        if not stripped:
+            blocks.append(''.join(current))
+            current = []
+    if current:
+        blocks.append(''.join(current))
+    return blocks
+
+
+def _split_oversized(block, budget):
+    """Break a block that alone exceeds the budget: by lines, then sentences, then hard cuts."""
+    for pieces in (block.splitlines(keepends=True), _SENTENCE.findall(block)):
+        pieces = [p for p in pieces if p]
+        if len(pieces) > 1 and all(estimate_tokens(p) <= budget for p in pieces):
+            return pieces
+    # estimate_tokens counts at most one token per character
+    size = max(1, budget)
+    return [block[i:i + size] for i in range(0, len(block), size)]
+
+
+def split_text(text, budget=None):
+    """Pack markdown blocks into chunks of at most `budget` estimated tokens.
+    ''.join(split_text(text)) == text, so chunk boundaries never lose formatting.
+    """
+    budget = budget or CHUNK_TOKENS
+    chunks = []
+    current = ''
+    for block in _blocks(text):
+        pieces = [block] if estimate_tokens(block) <= budget else _split_oversized(block, budget)
+        for piece in pieces:
+            if current and estimate_tokens(current + piece) > budget:
+                chunks.append(current)
+                current = ''
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='translate')
+    return _pool
+
+
+def _translate_chunk(app, chunk, target, model_name):
+    from src.llm_cache import cached_call_llm_model
+    core = chunk.strip()
+    if not core:
+        return chunk
+    # send only the text; keep the surrounding whitespace (paragraph breaks) ourselves
+    lead = chunk[:len(chunk) - len(chunk.lstrip())]
+    trail = chunk[len(chunk.rstrip()):]
+    with app.app_context():
+        translated = cached_call_llm_model(model_name, translation_messages(core, target))
+    return lead + translated.strip() + trail
+
+
+def iter_translated_chunks(text, target, model_name=None, budget=None):
+    """Translate chunks concurrently and yield (index, text, error) in document order.
+    A failed chunk yields its original text together with the exception.
+    Must be called inside an app context (the cache's database tier needs it).
+    """
+    from flask import current_app
+    from src import llm as llm_module
+    app = current_app._get_current_object()
+    model_name = model_name or llm_module.model
+    chunks = split_text(text, budget)
+    futures = [_executor().submit(_translate_chunk, app, c, target, model_name) for c in chunks]
+    try:
+        for i, future in enumerate(futures):
+            try:
+                yield i, future.result(), None
+            except Exception as e:
+                logger.warning('Translation of chunk %d/%d failed: %s', i + 1, len(chunks), e)
+                yield i, chunks[i], e
+    finally:
+        # the caller stopped early (e.g. a streaming client disconnected)
+        for future in futures:
+            future.cancel()
+
+
+def translate_text(text, target, model_name=None, budget=None):
+    """Translate text of any length. Raises the first error only if every chunk failed."""
+    parts = []
+    failed = []
+    first_error = None
+    for i, piece, error in iter_translated_chunks(text, target, model_name, budget):
+        parts.append(piece)
+        if error is not None:
+            failed.append(i)
+            first_error = first_error or error
+    if failed and len(failed) == len(parts):
+        raise first_error
+    return PartialTranslation(''.join(parts), len(parts), failed)